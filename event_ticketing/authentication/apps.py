@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class AuthenticationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'authentication'
+
+    def ready(self):
+        # pylint: disable-next=import-outside-toplevel,unused-import
+        from . import jwt  # noqa: F401 Connect the user cache invalidation
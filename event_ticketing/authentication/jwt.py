@@ -0,0 +1,136 @@
+"""
+JWT authentication that keeps recently seen users in memory.
+
+Access tokens issued by CustomTokenObtainPairSerializer carry the user's role
+("role") and token version ("ver"). Permission checks read the role from the
+token, and CachedJWTAuthentication serves the user from a per-process cache
+bounded in size and age, so a hot endpoint does not query the user table on
+every request.
+
+User.token_version goes up whenever the password, role or active flag
+changes; a login re-hashing the same password with a newer hasher does not
+count. The user's cache entry is dropped on every save in this process,
+and a token whose "ver" no longer matches the user is refused, so old tokens
+stop working once the change is seen. Other workers see it when their cached
+copy expires, after JWT_USER_CACHE["TTL"] seconds at most.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+
+ROLE_CLAIM = "role"
+VERSION_CLAIM = "ver"
+
+DEFAULTS = {
+    "MAX_SIZE": 10_000,  # Users kept per worker process
+    "TTL": 60,  # Seconds a cached user is trusted without reloading it
+}
+
+
+class UserCache:
+    """
+    Thread-safe LRU cache of users by id, whose entries expire after a TTL.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+        self.clock = time.monotonic
+
+    @property
+    def config(self):
+        return {**DEFAULTS, **getattr(settings, "JWT_USER_CACHE", {})}
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return None
+            user, expires = entry
+            if expires <= self.clock():
+                del self._users[user_id]
+                return None
+            self._users.move_to_end(user_id)
+        # Each request gets its own copy, so changes to it stay in that request
+        return copy.copy(user)
+
+    def set(self, user):
+        config = self.config
+        with self._lock:
+            self._users[user.pk] = (copy.copy(user), self.clock() + config["TTL"])
+            self._users.move_to_end(user.pk)
+            while len(self._users) > config["MAX_SIZE"]:
+                self._users.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+
+user_cache = UserCache()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(instance, **kwargs):
+    user_cache.invalidate(instance.pk)
+
+
+@receiver(setting_changed)
+def reset_user_cache(setting, **kwargs):
+    if setting == "JWT_USER_CACHE":
+        user_cache.clear()
+
+
+def check_token_version(user, validated_token):
+    # Tokens issued before the last password, role or active flag change
+    version = validated_token.get(VERSION_CLAIM)
+    if version is not None and version != user.token_version:
+        raise AuthenticationFailed(_("Token is no longer valid"), code="token_outdated")
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as exc:
+            raise InvalidToken(
+                _("Token contained no recognizable user identification")
+            ) from exc
+
+        user = user_cache.get(user_id)
+        if user is None:
+            # Loads the user and checks that it exists and is active
+            user = super().get_user(validated_token)
+            user_cache.set(user)
+        check_token_version(user, validated_token)
+        return user
+
+
+def request_role(request):
+    """
+    The role of the request's user, from the token claim when there is one,
+    so permission checks do not need the user row.
+    """
+    token = request.auth
+    role = token.get(ROLE_CLAIM) if hasattr(token, "get") else None
+    if role is not None:
+        return role
+    user = request.user
+    return user.role if user and user.is_authenticated else None
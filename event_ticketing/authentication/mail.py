@@ -0,0 +1,201 @@
+"""
+Outbound email queue.
+
+Requests only insert an OutboundEmail row; the send_queued_email worker
+delivers them. Password reset requests queue the submitted address as it is,
+and the worker looks up the account and renders the link, so a request costs
+the same whether or not the address belongs to anyone. Each pass claims a
+batch by pushing its next_attempt_at a lease into the future, so several
+workers can share the queue and a crashed worker's batch is picked up again
+once the lease runs out. The batch is sent
+over one connection to the mail server, paced to EMAIL_QUEUE["RATE"]
+messages per second. Failed messages are retried with exponential backoff up
+to EMAIL_QUEUE["MAX_ATTEMPTS"] times. Password reset bodies are rendered on
+each attempt and never stored, so no row keeps a reset link. Sent, skipped
+and failed rows are deleted EMAIL_QUEUE["RETENTION"] seconds after their last
+attempt.
+"""
+import datetime
+import time
+
+from django.conf import settings
+from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from .models import OutboundEmail, User
+
+DEFAULTS = {
+    "BATCH_SIZE": 100,
+    "RATE": 10,  # Messages per second and worker
+    "MAX_ATTEMPTS": 6,
+    "BACKOFF": 30,  # Seconds before the first retry, doubled for each later one
+    "MAX_BACKOFF": 3600,
+    "LEASE": 300,  # Seconds a claimed batch is reserved for the worker sending it
+    "RETENTION": 7 * 24 * 3600,  # Seconds finished rows are kept
+}
+
+
+def queue_config():
+    return {**DEFAULTS, **getattr(settings, "EMAIL_QUEUE", {})}
+
+
+def enqueue_email(subject, body, to, from_email=None):
+    return OutboundEmail.objects.create(
+        subject=subject,
+        body=body,
+        to=list(to),
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+    )
+
+
+def enqueue_password_reset(email):
+    return OutboundEmail.objects.create(
+        kind=OutboundEmail.PASSWORD_RESET,
+        subject="Password Reset Request",
+        body="",
+        to=[email],
+        from_email=settings.DEFAULT_FROM_EMAIL,
+    )
+
+
+def password_reset_body(user):
+    token = PasswordResetTokenGenerator().make_token(user)
+    uidb64 = urlsafe_base64_encode(force_bytes(user.pk))
+    reset_link = f"{settings.FRONTEND_URL}/reset-password/{uidb64}/{token}/"
+    return render_to_string(
+        "emails/password_reset_email.txt", {"user": user, "reset_link": reset_link}
+    )
+
+
+def build_emails(emails):
+    """
+    Render the bodies of password reset emails, with one user query for the
+    batch. Those for addresses without an account are marked SKIPPED.
+    """
+    resets = [email for email in emails if email.kind == OutboundEmail.PASSWORD_RESET]
+    if not resets:
+        return
+    users = User.objects.in_bulk({email.to[0] for email in resets}, field_name="email")
+    for email in resets:
+        user = users.get(email.to[0])
+        if user is None:
+            email.status, email.body = OutboundEmail.SKIPPED, ""
+        else:
+            email.body = password_reset_body(user)
+
+
+def retry_delay(attempts, config):
+    return min(config["BACKOFF"] * 2 ** (attempts - 1), config["MAX_BACKOFF"])
+
+
+def claim_batch(batch_size, now, lease):
+    with transaction.atomic():
+        pks = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboundEmail.PENDING, next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "id")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        OutboundEmail.objects.filter(pk__in=pks).update(
+            attempts=F("attempts") + 1,
+            next_attempt_at=now + datetime.timedelta(seconds=lease),
+        )
+    return list(OutboundEmail.objects.filter(pk__in=pks).order_by("id"))
+
+
+def deliver(emails, rate, sleep, clock):
+    """
+    Send `emails` over one connection, `rate` per second. Returns the sent
+    emails and (email, exception) pairs for the failed ones.
+    """
+    # Whatever the backend raises fails the message, not the whole pass
+    # pylint: disable=broad-exception-caught
+    sent, failed = [], []
+    try:
+        connection = get_connection()
+        connection.open()
+    except Exception as exc:
+        # Mail server unreachable: the whole batch backs off
+        return sent, [(email, exc) for email in emails]
+    start = clock()
+    for index, email in enumerate(emails):
+        # Pace sends to RATE per second
+        delay = start + index / rate - clock()
+        if delay > 0:
+            sleep(delay)
+        message = EmailMessage(
+            email.subject, email.body, email.from_email, email.to, connection=connection
+        )
+        try:
+            message.send()
+        except Exception as exc:
+            failed.append((email, exc))
+        else:
+            sent.append(email)
+    connection.close()
+    return sent, failed
+
+
+def send_queued_emails(batch_size=None, now=None, sleep=time.sleep, clock=time.monotonic):
+    """
+    Send one batch of due emails. Returns (sent, failed) counts, failed
+    counting messages that will be retried as well as given up ones.
+    """
+    config = queue_config()
+    now = now or timezone.now()
+    claimed = claim_batch(batch_size or config["BATCH_SIZE"], now, config["LEASE"])
+    if not claimed:
+        return 0, 0
+    build_emails(claimed)
+    emails = [email for email in claimed if email.status == OutboundEmail.PENDING]
+    skipped = [email for email in claimed if email.status == OutboundEmail.SKIPPED]
+    sent, failed = deliver(emails, config["RATE"], sleep, clock)
+
+    finished = timezone.now()
+    for email in sent:
+        email.status, email.sent_at, email.body, email.last_error = (
+            OutboundEmail.SENT, finished, "", ""
+        )
+    for email, exc in failed:
+        email.last_error = f"{type(exc).__name__}: {exc}"
+        if email.kind == OutboundEmail.PASSWORD_RESET:
+            # Rendered again on the next attempt, don't keep the reset link
+            email.body = ""
+        if email.attempts >= config["MAX_ATTEMPTS"]:
+            email.status = OutboundEmail.FAILED
+        else:
+            email.next_attempt_at = finished + datetime.timedelta(
+                seconds=retry_delay(email.attempts, config)
+            )
+    OutboundEmail.objects.bulk_update(
+        sent + [email for email, _ in failed] + skipped,
+        ["status", "sent_at", "body", "last_error", "next_attempt_at"],
+    )
+    return len(sent), len(failed)
+
+
+def purge_finished_emails(now=None, batch_size=1000):
+    """
+    Delete sent, skipped and failed emails whose last attempt is older than
+    EMAIL_QUEUE["RETENTION"], `batch_size` rows per query. A finished row
+    keeps the next_attempt_at its last claim set. Returns the number deleted.
+    """
+    cutoff = (now or timezone.now()) - datetime.timedelta(
+        seconds=queue_config()["RETENTION"]
+    )
+    finished = OutboundEmail.objects.filter(
+        status__in=[OutboundEmail.SENT, OutboundEmail.SKIPPED, OutboundEmail.FAILED],
+        next_attempt_at__lte=cutoff,
+    )
+    deleted = 0
+    while True:
+        pks = list(finished.order_by("next_attempt_at").values_list("pk", flat=True)[:batch_size])
+        if not pks:
+            return deleted
+        deleted += OutboundEmail.objects.filter(pk__in=pks).delete()[0]
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from authentication.mail import purge_finished_emails, send_queued_emails
+
+
+class Command(BaseCommand):
+    help = (
+        "Deliver queued outbound emails and delete finished ones older than "
+        "EMAIL_QUEUE['RETENTION']. Run it from cron, or keep it running with "
+        "--interval."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Emails claimed per pass (defaults to EMAIL_QUEUE['BATCH_SIZE']).",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=None,
+            help="Keep polling, sleeping this many seconds when the queue is empty.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_queued_emails(batch_size=options["batch_size"])
+            if sent or failed or options["interval"] is None:
+                self.stdout.write(
+                    self.style.SUCCESS(f"Sent {sent} email(s), {failed} failed.")
+                )
+            if options["interval"] is None or not (sent or failed):
+                # Once per cron run, or whenever the running worker goes idle
+                deleted = purge_finished_emails()
+                if deleted:
+                    self.stdout.write(f"Deleted {deleted} finished email(s).")
+            if options["interval"] is None:
+                return
+            if not (sent or failed):
+                time.sleep(options["interval"])
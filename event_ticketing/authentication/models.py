@@ -3,6 +3,7 @@ from django.db import models
 # Create your models here.
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.utils import timezone
 
 
 class User(AbstractUser):
@@ -12,6 +13,9 @@ class User(AbstractUser):
     )
 
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default="user")
+    # Goes up when the password, role or active flag changes. Access tokens
+    # carry it, so tokens issued before the change are refused
+    token_version = models.PositiveIntegerField(default=0)
     email = models.EmailField(unique=True, blank=False, null=False)
     REQUIRED_FIELDS = []
     # Set email as the USERNAME_FIELD for Django's auth system
@@ -33,8 +37,101 @@ class User(AbstractUser):
         verbose_name="user permissions",
     )
 
+    _loaded_auth_state = None  # As of the last load or save
+    _rehashing = False  # While check_password() runs
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        user.remember_auth_state()
+        return user
+
+    def remember_auth_state(self):
+        self._loaded_auth_state = self._auth_state()
+
+    def _auth_state(self):
+        # From __dict__ so deferred fields are not loaded just for this
+        return tuple(self.__dict__.get(name) for name in ("password", "role", "is_active"))
+
+    def check_password(self, raw_password):
+        # A correct password may be re-hashed with a newer hasher and saved.
+        # The password stays the same, so that does not end other sessions
+        self._rehashing = True
+        try:
+            return super().check_password(raw_password)
+        finally:
+            self._rehashing = False
+
+    async def acheck_password(self, raw_password):
+        self._rehashing = True
+        try:
+            return await super().acheck_password(raw_password)
+        finally:
+            self._rehashing = False
+
+    def auth_state_changed(self):
+        loaded = self._loaded_auth_state
+        if loaded is None:
+            return False
+        current = self._auth_state()
+        if self._rehashing:
+            loaded, current = loaded[1:], current[1:]  # Only the hash changed
+        return loaded != current
+
+    def save(self, *args, **kwargs):
+        if self.auth_state_changed():
+            self.token_version += 1
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "token_version"}
+        super().save(*args, **kwargs)
+        self.remember_auth_state()
+
     def is_organizer(self):
         return self.role == "organizer"
 
     def is_user(self):
         return self.role == "user"
+
+
+class OutboundEmail(models.Model):
+    """
+    An email waiting for, or done with, delivery by the send_queued_email
+    worker, so requests never wait on the mail server.
+    """
+
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    SKIPPED = "skipped"  # Built by the worker, which found nobody to send it to
+    STATUS_CHOICES = (
+        (PENDING, "Pending"),
+        (SENT, "Sent"),
+        (FAILED, "Failed"),
+        (SKIPPED, "Skipped"),
+    )
+
+    PASSWORD_RESET = "password_reset"
+    KIND_CHOICES = ((PASSWORD_RESET, "Password reset"),)
+
+    # Emails of a kind have their body built by the worker at send time
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES, blank=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()  # Cleared once sent, it may hold reset links
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField()  # List of recipient addresses
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Earliest time the worker may (re)try; also the end of a worker's claim
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker's queue scan
+            models.Index(fields=["status", "next_attempt_at"], name="outbound_email_queue_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.to)} ({self.status})"
@@ -1,10 +1,11 @@
 from rest_framework import serializers
-from .models import User
 from django.contrib.auth.hashers import make_password
 from django.utils.encoding import force_str
 from django.utils.http import urlsafe_base64_decode
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .jwt import ROLE_CLAIM, VERSION_CLAIM
+from .models import User
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -23,45 +24,46 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     # Set the username field to 'email'
     username_field = "email"
 
+    @classmethod
+    def get_token(cls, user):
+        # Claims CachedJWTAuthentication and the permission classes rely on
+        token = super().get_token(user)
+        token[ROLE_CLAIM] = user.role
+        token[VERSION_CLAIM] = user.token_version
+        return token
+
 
 class PasswordChangeSerializer(serializers.Serializer):
     old_password = serializers.CharField(write_only=True)
     new_password = serializers.CharField(write_only=True)
+    _user = None
+
+    def get_user(self):
+        # request.user may be CachedJWTAuthentication's copy, up to a minute
+        # old: check and save the password on a fresh row, so neither a stale
+        # hash nor a stale role or active flag is used
+        if self._user is None:
+            self._user = User.objects.get(pk=self.context["request"].user.pk)
+        return self._user
 
     def validate_old_password(self, value):
-        user = self.context["request"].user
-        if not user.check_password(value):
+        if not self.get_user().check_password(value):
             raise serializers.ValidationError("Incorrect old password.")
         return value
 
     def save(self):
-        user = self.context["request"].user
+        user = self.get_user()
         # Set the new password (Django's set_password handles hashing)
         user.password = make_password(self.validated_data["new_password"])
-        user.save()
+        user.save(update_fields=["password"])  # token_version is added by User.save
         return user
 
 
 class PasswordResetRequestSerializer(serializers.Serializer):
+    # Unknown addresses are not an error, so responses do not reveal
+    # whether an email address exists in the system.
     email = serializers.EmailField()
 
-    def validate_email(self, value):
-        try:
-            user = User.objects.get(email=value)
-        except User.DoesNotExist:
-            # We don't raise a ValidationError here to prevent revealing
-            # whether an email address exists in the system.
-            return value
-        return value
-
-    def get_user(self):
-        email = self.validated_data.get('email')
-        try:
-            user = User.objects.get(email=email)
-            return user
-        except User.DoesNotExist:
-            return None
-
 
 class PasswordResetConfirmSerializer(serializers.Serializer):
     uidb64 = serializers.CharField()
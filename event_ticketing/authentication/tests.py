@@ -1,3 +1,258 @@
-from django.test import TestCase
+import datetime
+import smtplib
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import make_password
+from django.core import mail
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .jwt import user_cache
+from .mail import purge_finished_emails, send_queued_emails
+from .models import OutboundEmail, User
+from .serializers import CustomTokenObtainPairSerializer
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.organizer = User.objects.create_user(
+            username="org", email="org@example.com", password="secret-1", role="organizer"
+        )
+
+    def setUp(self):
+        user_cache.clear()
+
+    def client_for(self, user):
+        token = CustomTokenObtainPairSerializer.get_token(user).access_token
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        return client
+
+    def user_queries(self, client, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        # Lookups of the user row, not joins through it
+        user_lookup = f'FROM "{User._meta.db_table}"'
+        return response, sum(user_lookup in query["sql"] for query in queries)
+
+    def test_token_carries_role_and_version(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.organizer).access_token
+
+        self.assertEqual(token["role"], "organizer")
+        self.assertEqual(token["ver"], 0)
+
+    def test_cached_hits_make_no_user_queries(self):
+        client = self.client_for(self.organizer)
+
+        first, first_queries = self.user_queries(client, "/api/events/")
+        second, second_queries = self.user_queries(client, "/api/events/")
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first_queries, 1)
+        self.assertEqual(second_queries, 0)  # IsOrganizer reads the role claim
+
+    def test_cached_users_expire(self):
+        client = self.client_for(self.organizer)
+        self.user_queries(client, "/api/events/")
+
+        clock = user_cache.clock
+        user_cache.clock = lambda: clock() + 3600
+        self.addCleanup(setattr, user_cache, "clock", clock)
+        _, queries = self.user_queries(client, "/api/events/")
+
+        self.assertEqual(queries, 1)
+
+    def test_role_change_invalidates_tokens(self):
+        client = self.client_for(self.organizer)
+        self.user_queries(client, "/api/events/")
+
+        self.organizer.role = "user"
+        self.organizer.save()
+        response, _ = self.user_queries(client, "/api/events/")
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.organizer.token_version, 1)
+        self.assertEqual(
+            self.user_queries(self.client_for(self.organizer), "/api/events/")[0].status_code,
+            403,
+        )
+
+    def test_password_change_invalidates_tokens(self):
+        client = self.client_for(self.organizer)
+
+        response = client.put(
+            "/api/password/change/",
+            {"old_password": "secret-1", "new_password": "secret-2"},
+            format="json",
+        )
+        after, _ = self.user_queries(client, "/api/events/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(after.status_code, 401)
+        self.assertEqual(
+            self.user_queries(self.client_for(User.objects.get()), "/api/events/")[0].status_code,
+            200,
+        )
+
+    def test_password_change_does_not_write_back_a_cached_user(self):
+        client = self.client_for(self.organizer)
+        self.user_queries(client, "/api/events/")  # Cached with the organizer role
+        # Demoted by another worker, whose save does not clear this cache
+        User.objects.filter(pk=self.organizer.pk).update(role="user", token_version=1)
+
+        response = client.put(
+            "/api/password/change/",
+            {"old_password": "secret-1", "new_password": "secret-2"},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        user = User.objects.get()
+        self.assertEqual(user.role, "user")
+        self.assertEqual(user.token_version, 2)
+        self.assertTrue(user.check_password("secret-2"))
+
+    @override_settings(
+        RATE_LIMITS={"ENABLED": False},
+        PASSWORD_HASHERS=[
+            "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+            "django.contrib.auth.hashers.MD5PasswordHasher",
+        ],
+    )
+    def test_login_upgrading_the_password_hash_keeps_tokens_valid(self):
+        # Stored with a hasher that is no longer the preferred one
+        self.organizer.password = make_password("secret-1", hasher="md5")
+        self.organizer.save()
+        client = self.client_for(self.organizer)
+
+        login = APIClient().post(
+            "/api/token/", {"email": "org@example.com", "password": "secret-1"}
+        )
+        response, _ = self.user_queries(client, "/api/events/")
+
+        self.assertEqual(login.status_code, 200)
+        user = User.objects.get()
+        self.assertFalse(user.password.startswith("md5$"))
+        self.assertEqual(user.token_version, 1)  # Only the md5 hash set above
+        self.assertEqual(response.status_code, 200)
+
+    def test_other_saves_keep_tokens_valid(self):
+        client = self.client_for(self.organizer)
+        self.organizer.first_name = "Org"
+        self.organizer.save()
+
+        response, _ = self.user_queries(client, "/api/events/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.organizer.token_version, 0)
+
+
+@override_settings(RATE_LIMITS={"ENABLED": False})
+class PasswordResetQueueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username="buyer", email="buyer@example.com", password="secret-1"
+        )
+
+    def request_reset(self, email):
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().post("/api/password/reset/", {"email": email}, format="json")
+        return response, [query["sql"] for query in queries]
+
+    def test_reset_request_queues_email(self):
+        response, queries = self.request_reset("buyer@example.com")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(mail.outbox, [])
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.to, ["buyer@example.com"])
+
+        self.assertEqual(send_queued_emails(), (1, 0))
+        self.assertIn("/reset-password/", mail.outbox[0].body)
+
+    def test_unknown_email_is_handled_like_a_known_one(self):
+        known, known_queries = self.request_reset("buyer@example.com")
+        unknown, unknown_queries = self.request_reset("nobody@example.com")
+
+        self.assertEqual(unknown.status_code, 200)
+        self.assertEqual(unknown.data, known.data)
+        # The same single INSERT, without looking the address up
+        self.assertEqual(len(unknown_queries), len(known_queries))
+        self.assertNotIn(f'FROM "{User._meta.db_table}"', "".join(unknown_queries))
+
+        self.assertEqual(send_queued_emails(), (1, 0))
+        self.assertEqual([message.to for message in mail.outbox], [["buyer@example.com"]])
+        skipped = OutboundEmail.objects.get(to=["nobody@example.com"])
+        self.assertEqual(skipped.status, OutboundEmail.SKIPPED)
+        self.assertEqual(send_queued_emails(), (0, 0))
+
+    def test_worker_sends_queued_emails(self):
+        self.request_reset("buyer@example.com")
+
+        self.assertEqual(send_queued_emails(), (1, 0))
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["buyer@example.com"])
+        email = OutboundEmail.objects.get()
+        self.assertEqual(email.status, OutboundEmail.SENT)
+        self.assertEqual(email.attempts, 1)
+        self.assertEqual(email.body, "")
+        self.assertEqual(send_queued_emails(), (0, 0))
+
+    @override_settings(EMAIL_QUEUE={"MAX_ATTEMPTS": 2, "BACKOFF": 30})
+    def test_failures_back_off_then_give_up(self):
+        self.request_reset("buyer@example.com")
+        failure = smtplib.SMTPException("Connection refused")
+
+        with mock.patch("authentication.mail.EmailMessage.send", side_effect=failure):
+            self.assertEqual(send_queued_emails(), (0, 1))
+            email = OutboundEmail.objects.get()
+            self.assertEqual(email.status, OutboundEmail.PENDING)
+            self.assertIn("Connection refused", email.last_error)
+            self.assertEqual(email.body, "")
+            # Not due again until the backoff has passed
+            self.assertEqual(send_queued_emails(), (0, 0))
+            later = timezone.now() + datetime.timedelta(seconds=31)
+            self.assertEqual(send_queued_emails(now=later), (0, 1))
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboundEmail.FAILED)
+        self.assertEqual(email.attempts, 2)
+        self.assertEqual(email.body, "")
+        self.assertEqual(mail.outbox, [])
+
+    @override_settings(EMAIL_QUEUE={"RETENTION": 3600})
+    def test_finished_emails_are_purged_after_retention(self):
+        self.request_reset("buyer@example.com")
+        self.request_reset("nobody@example.com")
+        self.assertEqual(send_queued_emails(), (1, 0))
+        self.request_reset("buyer@example.com")
+
+        self.assertEqual(purge_finished_emails(), 0)
+        later = timezone.now() + datetime.timedelta(hours=2)
+        self.assertEqual(purge_finished_emails(now=later, batch_size=1), 2)
+        # Only the email still waiting to be sent is left
+        self.assertEqual(
+            list(OutboundEmail.objects.values_list("status", flat=True)),
+            [OutboundEmail.PENDING],
+        )
+
+    @override_settings(EMAIL_QUEUE={"RATE": 2})
+    def test_sends_are_paced_to_rate(self):
+        for _ in range(4):
+            self.request_reset("buyer@example.com")
+        now, sleeps = [0.0], []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+
+        self.assertEqual(send_queued_emails(sleep=sleep, clock=lambda: now[0]), (4, 0))
+        self.assertEqual(sleeps, [0.5, 0.5, 0.5])
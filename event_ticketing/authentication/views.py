@@ -1,15 +1,11 @@
 from django.shortcuts import render
 from drf_spectacular.utils import extend_schema
 from rest_framework import generics, permissions, status
-from django.utils.http import urlsafe_base64_encode
-from django.utils.encoding import force_bytes
-from django.template.loader import render_to_string
-from django.conf import settings
-from django.core.mail import send_mail
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework_simplejwt.views import TokenObtainPairView
-from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from core.throttling import RateLimitMixin
+from .mail import enqueue_password_reset
 from .models import User
 from .serializers import (
     PasswordChangeSerializer,
@@ -51,39 +47,26 @@ class PasswordChangeView(generics.UpdateAPIView):
         )
 
 
-class CustomTokenObtainPairView(TokenObtainPairView):
+class CustomTokenObtainPairView(RateLimitMixin, TokenObtainPairView):
     # Use your custom serializer for this view
     serializer_class = CustomTokenObtainPairSerializer
+    # Checked before the password hash, the expensive part of this request
+    rate_limit_policy = "token"
 
 
 @extend_schema(tags=['Authentication'])
-class PasswordResetRequestView(generics.GenericAPIView):
+class PasswordResetRequestView(RateLimitMixin, generics.GenericAPIView):
     serializer_class = PasswordResetRequestSerializer
+    rate_limit_policy = "password_reset"
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        user = serializer.get_user()
-
-        if user:
-            # Generate token and send email
-            token_generator = PasswordResetTokenGenerator()
-            token = token_generator.make_token(user)
-            uidb64 = urlsafe_base64_encode(force_bytes(user.pk))
-
-            # Construct the reset link (adjust the domain and frontend URL as needed)
-            reset_link = f"{settings.FRONTEND_URL}/reset-password/{uidb64}/{token}/" # Example frontend URL structure
-
-            subject = 'Password Reset Request'
-            message = render_to_string('emails/password_reset_email.txt', {
-                'user': user,
-                'reset_link': reset_link,
-            })
-            email_from = settings.DEFAULT_FROM_EMAIL
-            recipient_list = [user.email]
-
-            send_mail(subject, message, email_from, recipient_list)
+        # Queued for any address: the send_queued_email worker looks up the
+        # account and builds the reset link, so neither the mail server nor
+        # whether the account exists changes how this request runs
+        enqueue_password_reset(serializer.validated_data["email"])
 
         # Always return a success response to prevent email enumeration
         return Response({'detail': 'Password reset email sent if email is registered.'}, status=status.HTTP_200_OK)
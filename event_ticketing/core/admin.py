@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Event, Ticket, Purchase # Import your models
+from .models import Event, Hold, InventoryBucket, Ticket, Purchase # Import your models
 
 # Register Event model
 @admin.register(Event)
@@ -8,14 +8,33 @@ class EventAdmin(admin.ModelAdmin):
     list_filter = ('date', 'location')
     search_fields = ('event_name', 'location', 'organizer__username')
     raw_id_fields = ('organizer',) # Use a raw ID field for the organizer ForeignKey for large numbers of users
+    list_select_related = ('organizer',)
+
+class InventoryBucketInline(admin.TabularInline):
+    model = InventoryBucket
+    fields = ('index', 'quantity_available', 'quantity_sold')
+    readonly_fields = fields # Buckets are managed by the rebalance_buckets command
+    extra = 0
+    can_delete = False
+
 
 # Register Ticket model
 @admin.register(Ticket)
 class TicketAdmin(admin.ModelAdmin):
-    list_display = ('ticket_type', 'event', 'price', 'quantity_available', 'quantity_sold', 'quantity_remaining')
+    list_display = (
+        'ticket_type', 'event', 'price', 'quantity_available', 'quantity_sold', 'bucket_count',
+        'quantity_remaining',
+    )
     list_filter = ('event', 'ticket_type')
     search_fields = ('ticket_type', 'event__event_name')
     raw_id_fields = ('event',) # Use a raw ID field for the event ForeignKey
+    list_select_related = ('event',) # Ticket.__str__ shows the event name
+    readonly_fields = ('bucket_count',) # Changed through the rebalance_buckets command
+    inlines = (InventoryBucketInline,)
+
+    def get_queryset(self, request):
+        # Sum the inventory buckets of sharded tickets for quantity_remaining
+        return super().get_queryset(request).with_remaining()
 
 # Register Purchase model
 @admin.register(Purchase)
@@ -24,4 +43,16 @@ class PurchaseAdmin(admin.ModelAdmin):
     list_filter = ('purchase_time', 'ticket__event__event_name')
     search_fields = ('user__username', 'ticket__ticket_type', 'ticket__event__event_name')
     raw_id_fields = ('user', 'ticket') # Use raw ID fields for ForeignKeys
+    # Purchase.__str__ and Ticket.__str__ follow these
+    list_select_related = ('user', 'ticket__event')
     readonly_fields = ('total_price', 'purchase_time') # These fields are calculated/set automatically
+
+
+# Register Hold model
+@admin.register(Hold)
+class HoldAdmin(admin.ModelAdmin):
+    list_display = ('user', 'ticket', 'quantity', 'shard', 'expires_at')
+    raw_id_fields = ('user', 'ticket')
+    list_select_related = ('user', 'ticket')
+    # Seats are taken and released by the hold services
+    readonly_fields = ('shard', 'created_at')
@@ -0,0 +1,276 @@
+"""
+Virtual waiting room for on-sale spikes.
+
+Buyers join an event's queue and get a signed token naming the one-second
+admission window they were given. Each window admits at most the event's
+admission rate, so buyers are let through to the endpoints that take stock
+(purchase, checkout and seat holds) at that pace however many arrive at once.
+Attempts are checked against the token signature and the clock before
+authentication, so buyers who are not admitted yet are turned away without
+touching the database.
+
+Window counters live in a pluggable store: CacheQueueStore shares them
+between workers through a Django cache (use Redis in production), while
+LocalQueueStore keeps them in process for tests and single-worker setups.
+"""
+import contextlib
+import math
+import threading
+import time
+from dataclasses import dataclass
+
+from django.core import signing
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework.exceptions import PermissionDenied, Throttled
+
+from .idempotency import IDEMPOTENCY_HEADER
+from .stores import StoreBacked
+
+TOKEN_HEADER = "X-Queue-Token"
+SALT = "core.admission"
+USED_TOKEN_MESSAGE = "This queue token has already been used."
+
+DEFAULTS = {
+    "ENABLED": False,
+    "STORE": "core.admission.CacheQueueStore",
+    "CACHE_ALIAS": "default",
+    "RATE": 50,  # Buyers admitted per second for events without admission_rate
+    "ADMISSION_TTL": 300,  # Seconds an admitted token can be used to buy
+}
+
+
+class LocalQueueStore:
+    """
+    In-process store. Counters are not shared between workers.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def _live(self, key, now):
+        value, expires = self._data.get(key, (None, 0))
+        return value if expires > now else None
+
+    def get(self, key):
+        with self._lock:
+            return self._live(key, time.monotonic())
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + timeout)
+
+    def add(self, key, value, timeout):
+        with self._lock:
+            now = time.monotonic()
+            if self._live(key, now) is not None:
+                return False
+            self._data[key] = (value, now + timeout)
+            return True
+
+    def incr(self, key, timeout):
+        with self._lock:
+            now = time.monotonic()
+            value = (self._live(key, now) or 0) + 1
+            self._data[key] = (value, now + timeout)
+            return value
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class CacheQueueStore:
+    """
+    Store backed by a Django cache, shared by every worker using it.
+    """
+
+    def __init__(self, config):
+        self.cache = caches[config["CACHE_ALIAS"]]
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value, timeout):
+        self.cache.set(key, value, timeout)
+
+    def add(self, key, value, timeout):
+        return self.cache.add(key, value, timeout)
+
+    def incr(self, key, timeout):
+        self.cache.add(key, 0, timeout)
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # Expired between add() and incr()
+            self.cache.add(key, 0, timeout)
+            return self.cache.incr(key)
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+
+@dataclass(frozen=True)
+class QueueTicket:
+    token: str
+    window: int
+    position: int  # Place within the admission window
+
+
+@dataclass(frozen=True)
+class Admission:
+    event_id: int
+    user_id: int
+    key: str  # Store key claimed by the purchase that uses the token
+    used: bool
+
+
+class WaitingRoom(StoreBacked):
+    setting = "WAITING_ROOM"
+    defaults = DEFAULTS
+
+    @property
+    def enabled(self):
+        return self.config["ENABLED"]
+
+    def join(self, event_id, user_id, rate=None):
+        """
+        Give the buyer the earliest admission window that still has room.
+        """
+        config = self.config
+        rate = rate or config["RATE"]
+        now = self.clock()
+        hint_key = f"waiting-room:{event_id}:next"
+        window = max(int(now), self.store.get(hint_key) or 0)
+        while True:
+            timeout = int(window - now) + config["ADMISSION_TTL"]
+            position = self.store.incr(f"waiting-room:{event_id}:{window}", timeout)
+            if position <= rate:
+                break
+            # Full: point later joiners past it so they do not retry it too
+            self.store.set(hint_key, window + 1, timeout)
+            window += 1
+
+        token = signing.dumps(
+            {"e": event_id, "u": user_id, "w": window, "n": position}, salt=SALT
+        )
+        return QueueTicket(token=token, window=window, position=position)
+
+    def status(self, token):
+        data = self._load(token)
+        return {
+            "event_id": data["e"],
+            "admitted": self.clock() >= data["w"],
+            "wait_seconds": max(0, math.ceil(data["w"] - self.clock())),
+        }
+
+    def admit(self, token):
+        """
+        Check a purchase attempt's queue token. Uses no database query, only
+        the signature, the clock and one store lookup; whether the token was
+        already used is left to the caller.
+        """
+        data = self._load(token)
+        wait = data["w"] - self.clock()
+        if wait > 0:
+            raise Throttled(wait=math.ceil(wait), detail="You have not been admitted yet.")
+        if -wait > self.config["ADMISSION_TTL"]:
+            raise PermissionDenied("Your admission has expired, join the queue again.")
+
+        key = f"waiting-room:used:{data['e']}:{data['w']}:{data['n']}"
+        return Admission(
+            event_id=data["e"], user_id=data["u"], key=key, used=bool(self.store.get(key))
+        )
+
+    def check_request(self, headers):
+        """
+        The admission of a purchase request, or None with the waiting room
+        off. Run before authentication.
+        """
+        if not self.enabled:
+            return None
+        admission = self.admit(headers.get(TOKEN_HEADER))
+        # Retries with an Idempotency-Key may replay the purchase the token was
+        # used for, so those are only checked in check_purchase()
+        if admission.used and IDEMPOTENCY_HEADER not in headers:
+            raise PermissionDenied(USED_TOKEN_MESSAGE)
+        return admission
+
+    @staticmethod
+    def check_purchase(admission, event_id, user_id):
+        # Once the ticket and buyer are known
+        if admission is None:
+            return
+        if admission.used:
+            raise PermissionDenied(USED_TOKEN_MESSAGE)
+        if admission.event_id != event_id or admission.user_id != user_id:
+            raise PermissionDenied("This queue token is for another event or buyer.")
+
+    def claim(self, admission):
+        """
+        Take the admission for one purchase, with an atomic add() so that of
+        concurrent requests carrying the same token only one gets it.
+        """
+        if admission is None:
+            return
+        if not self.store.add(admission.key, 1, self.config["ADMISSION_TTL"]):
+            raise PermissionDenied(USED_TOKEN_MESSAGE)
+
+    def release(self, admission):
+        # A failed purchase gives the admission back, so it can be retried
+        if admission is not None:
+            self.store.delete(admission.key)
+
+    def _load(self, token):
+        if not token:
+            raise PermissionDenied("Join the waiting room for this event first.")
+        try:
+            return signing.loads(token, salt=SALT)
+        except signing.BadSignature as exc:
+            raise PermissionDenied("Invalid queue token.") from exc
+
+
+waiting_room = WaitingRoom()
+
+
+@receiver(setting_changed)
+def reset_waiting_room(setting, **kwargs):
+    if setting == "WAITING_ROOM":
+        waiting_room.reset()
+
+
+class WaitingRoomMixin:
+    """
+    Turn away purchase attempts without an admitted queue token before the
+    request is authenticated, i.e. before any database query. The admission
+    is available as `request.admission` (None when the waiting room is off or
+    the request does not need one).
+    """
+
+    def requires_admission(self):
+        return True
+
+    def initial(self, request, *args, **kwargs):
+        request.admission = (
+            waiting_room.check_request(request.headers) if self.requires_admission() else None
+        )
+        super().initial(request, *args, **kwargs)
+
+    @contextlib.contextmanager
+    def admitted(self, *event_ids):
+        """
+        Check the admission against the events and buyer, and hold it for the
+        purchase made in the block. It is given back if the block raises.
+        """
+        admission = self.request.admission
+        for event_id in event_ids:
+            waiting_room.check_purchase(admission, event_id, self.request.user.pk)
+        waiting_room.claim(admission)
+        try:
+            yield
+        except BaseException:
+            waiting_room.release(admission)
+            raise
@@ -0,0 +1,142 @@
+import datetime
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import ExtractHour, TruncDate, TruncWeek
+from django.utils import timezone
+
+from .models import Purchase, SalesRollup
+
+INTERVALS = ("hour", "day", "week")
+
+
+def sales_totals(rollups):
+    totals = rollups.aggregate(
+        total_tickets_sold=Sum("tickets_sold"), total_sales=Sum("sales")
+    )
+    return {
+        "total_tickets_sold": totals["total_tickets_sold"] or 0,
+        "total_sales": totals["total_sales"] or 0,
+    }
+
+
+def sales_by_event(rollups):
+    return list(
+        rollups.values("event", "event__event_name")
+        .annotate(tickets_sold=Sum("tickets_sold"), sales=Sum("sales"))
+        .order_by("event")
+    )
+
+
+def sales_by_ticket_type(rollups):
+    return list(
+        rollups.values("ticket__ticket_type")
+        .annotate(tickets_sold=Sum("tickets_sold"), sales=Sum("sales"))
+        .order_by("ticket__ticket_type")
+    )
+
+
+def sales_series(rollups, interval="day"):
+    # The rollup is kept per hour, so every interval is one grouped query
+    if interval == "hour":
+        group_by = ("day", "hour")
+    elif interval == "day":
+        group_by = ("day",)
+    elif interval == "week":
+        rollups = rollups.annotate(week=TruncWeek("day"))
+        group_by = ("week",)
+    else:
+        raise ValueError(f"Unknown interval: {interval!r}")
+
+    rows = (
+        rollups.values(*group_by)
+        .annotate(tickets_sold=Sum("tickets_sold"), sales=Sum("sales"))
+        .order_by(*group_by)
+    )
+    series = []
+    for row in rows:
+        if interval == "hour":
+            period = timezone.make_aware(
+                datetime.datetime.combine(row["day"], datetime.time(row["hour"]))
+            )
+        else:
+            period = row[group_by[0]]
+        series.append(
+            {"period": period, "tickets_sold": row["tickets_sold"], "sales": row["sales"]}
+        )
+    return series
+
+
+def filter_rollups(rollups, date_from=None, date_to=None, event=None):
+    if date_from:
+        rollups = rollups.filter(day__gte=date_from)
+    if date_to:
+        rollups = rollups.filter(day__lte=date_to)
+    if event:
+        rollups = rollups.filter(event=event)
+    return rollups
+
+
+def purchase_totals_by_ticket_hour():
+    # What the rollup should contain, recomputed from the raw purchases
+    return (
+        Purchase.objects.annotate(
+            day=TruncDate("purchase_time"), hour=ExtractHour("purchase_time")
+        )
+        .values("ticket", "ticket__event", "ticket__event__organizer", "day", "hour")
+        .annotate(tickets_sold=Sum("quantity"), sales=Sum("total_price"))
+        .order_by()
+    )
+
+
+def rollup_totals_by_ticket_hour():
+    return (
+        SalesRollup.objects.values("ticket", "day", "hour")
+        .annotate(tickets_sold=Sum("tickets_sold"), sales=Sum("sales"))
+        .order_by()
+    )
+
+
+def verify_sales_rollup():
+    """
+    Return a list of (ticket_id, day, hour, expected, actual) tuples for every
+    ticket and hour whose rollup does not match its purchases.
+    """
+    actual = {
+        (row["ticket"], row["day"], row["hour"]): (row["tickets_sold"], row["sales"])
+        for row in rollup_totals_by_ticket_hour().iterator()
+    }
+    mismatches = []
+    for row in purchase_totals_by_ticket_hour().iterator():
+        key = (row["ticket"], row["day"], row["hour"])
+        expected = (row["tickets_sold"], row["sales"])
+        found = actual.pop(key, (0, 0))
+        if found != expected:
+            mismatches.append((*key, expected, found))
+    # Rollup rows left over have no purchases behind them at all
+    mismatches.extend((*key, (0, 0), found) for key, found in actual.items())
+    return mismatches
+
+
+@transaction.atomic
+def rebuild_sales_rollup(batch_size=1000):
+    SalesRollup.objects.all().delete()
+
+    rows = (
+        SalesRollup(
+            organizer_id=row["ticket__event__organizer"],
+            event_id=row["ticket__event"],
+            ticket_id=row["ticket"],
+            day=row["day"],
+            hour=row["hour"],
+            tickets_sold=row["tickets_sold"],
+            sales=row["sales"],
+        )
+        for row in purchase_totals_by_ticket_hour().iterator()
+    )
+    created = 0
+    while batch := list(islice(rows, batch_size)):
+        SalesRollup.objects.bulk_create(batch)
+        created += len(batch)
+    return created
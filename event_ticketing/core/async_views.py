@@ -0,0 +1,255 @@
+"""
+Async-native versions of the browse and purchase endpoints, for deployments
+served through event_ticketing.asgi.
+
+DRF views are synchronous, so under ASGI each request to them holds a worker
+thread for its whole duration. These views are plain Django async views:
+authentication, filtering, pagination and serialization run on the event
+loop, and only the database work goes through the async ORM. The purchase
+transaction itself has to be synchronous and runs in a thread of its own via
+sync_to_async, holding it only for the transaction.
+
+Responses match their DRF counterparts in /api/browse/events/ and
+/api/tickets/purchase/, without the browse cache.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings as drf_settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from authentication.jwt import check_token_version, user_cache
+
+from .admission import waiting_room
+from .filters import EventFilter
+from .idempotency import (
+    IDEMPOTENCY_HEADER,
+    MAX_KEY_LENGTH,
+    claim_key,
+    fingerprint,
+    release_key,
+    replayed_outcome,
+    store_outcome,
+)
+from .instrumentation import serializing
+from .live import event_stream
+from .models import Event
+from .pagination import EventKeysetPagination
+from .search import search_events, search_terms
+from .serializers import EventSerializer, TicketPurchaseSerializer
+from .throttling import rate_limiter
+
+
+class AsyncAPIView(View):
+    """
+    Base for async JSON views: JWT authentication with an async user lookup
+    (through the same user cache as CachedJWTAuthentication), and DRF
+    exceptions turned into DRF-style error responses.
+    """
+
+    jwt = JWTAuthentication()
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        # Token-authenticated like the DRF API, so no CSRF check
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    # Django runs views with an async dispatch on the event loop
+    async def dispatch(self, request, *args, **kwargs):  # pylint: disable=invalid-overridden-method
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            return self.error_response(exc)
+        except Http404:
+            return self.error_response(exceptions.NotFound())
+
+    def error_response(self, exc):
+        detail = exc.detail if isinstance(exc.detail, (dict, list)) else {"detail": exc.detail}
+        response = JsonResponse(detail, status=exc.status_code, safe=False)
+        if getattr(exc, "wait", None):
+            response["Retry-After"] = str(exc.wait)
+        if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+            response["WWW-Authenticate"] = self.jwt.authenticate_header(request=None)
+        return response
+
+    def get_raw_token(self, request):
+        header = self.jwt.get_header(request)
+        return self.jwt.get_raw_token(header) if header else None
+
+    async def authenticate(self, request):
+        raw_token = self.get_raw_token(request)
+        if raw_token is None:
+            raise exceptions.NotAuthenticated()
+        # Signature and expiry checks need no I/O; only the user is fetched
+        try:
+            token = self.jwt.get_validated_token(raw_token)
+        except (InvalidToken, TokenError) as exc:
+            raise exceptions.AuthenticationFailed(str(exc)) from exc
+        User = get_user_model()
+        try:
+            user_id = token[jwt_settings.USER_ID_CLAIM]
+        except KeyError as exc:
+            raise exceptions.AuthenticationFailed("User not found") from exc
+        user = user_cache.get(user_id)
+        if user is None:
+            try:
+                user = await User.objects.aget(**{jwt_settings.USER_ID_FIELD: user_id})
+            except User.DoesNotExist as exc:
+                raise exceptions.AuthenticationFailed("User not found") from exc
+            if not user.is_active:
+                raise exceptions.AuthenticationFailed("User is inactive")
+            user_cache.set(user)
+        check_token_version(user, token)
+        request.user = user
+        return user
+
+
+class AsyncEventListView(AsyncAPIView):
+    queryset = Event.objects.with_tickets().order_by("date", "time", "id")
+    pagination_class = EventKeysetPagination
+    keyset_ordering = None  # Set per request when searching
+
+    async def get(self, request):
+        await self.authenticate(request)
+        # DRF's Request wrapper gives the paginator query_params; no I/O
+        request = Request(request)
+
+        filterset = EventFilter(request.query_params, queryset=self.queryset, request=request)
+        if not filterset.is_valid():
+            raise exceptions.ValidationError(filterset.errors)
+        queryset = EventFilter.upcoming_by_default(filterset.qs, request.query_params)
+
+        query = request.query_params.get(drf_settings.SEARCH_PARAM, "")
+        if search_terms(query):
+            # Building the match expression may look up the FTS vocabulary
+            queryset = await sync_to_async(search_events)(queryset, query)
+            self.keyset_ordering = ("-search_rank", "id")
+
+        paginator = self.pagination_class()
+        page = await paginator.apaginate_queryset(queryset, request, view=self)
+        with serializing():
+            data = EventSerializer(page, many=True).data
+        return JsonResponse(paginator.get_paginated_response(data).data)
+
+
+class AsyncEventDetailView(AsyncAPIView):
+    queryset = Event.objects.with_tickets()
+
+    async def get(self, request, pk):
+        await self.authenticate(request)
+        try:
+            event = await self.queryset.aget(pk=pk)
+        except Event.DoesNotExist as exc:
+            raise Http404 from exc
+        with serializing():
+            data = EventSerializer(event).data
+        return JsonResponse(data)
+
+
+class StreamingUnavailable(exceptions.APIException):
+    status_code = status.HTTP_501_NOT_IMPLEMENTED
+    default_detail = "Live updates are only served under ASGI."
+    default_code = "not_implemented"
+
+
+class EventAvailabilityStreamView(AsyncAPIView):
+    """
+    Server-sent events with the quantity_remaining of every ticket tier of an
+    event, sent on connect and again whenever it changes.
+
+    EventSource cannot send an Authorization header, so the access token may
+    come as ?access_token= instead. Opening streams is limited by the "live"
+    rate limit policy. Under WSGI Django reads an async stream to its end
+    before sending anything, which for this endless stream is never, so the
+    view answers 501 there.
+    """
+
+    def get_raw_token(self, request):
+        token = request.GET.get("access_token")
+        return token.encode() if token else super().get_raw_token(request)
+
+    async def get(self, request, pk):
+        if not isinstance(request, ASGIRequest):
+            raise StreamingUnavailable()
+        rate_limiter.check("live", request)
+        await self.authenticate(request)
+        if not await Event.objects.filter(pk=pk).aexists():
+            raise Http404
+        response = StreamingHttpResponse(
+            event_stream(pk), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # Stop nginx from buffering the stream
+        return response
+
+
+class AsyncTicketPurchaseView(AsyncAPIView):
+    async def post(self, request):
+        # Rate limit and waiting room first, before any query, as in
+        # TicketPurchaseView
+        rate_limiter.check("purchase", request)
+        admission = waiting_room.check_request(request.headers)
+
+        user = await self.authenticate(request)
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError as exc:
+            raise exceptions.ParseError() from exc
+
+        status_code, body, headers = await sync_to_async(self.purchase)(
+            request, user, data, admission
+        )
+        return JsonResponse(body, status=status_code, headers=headers)
+
+    def purchase(self, request, user, data, admission):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return self.run_purchase(request, data, admission)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise exceptions.ValidationError(
+                {IDEMPOTENCY_HEADER: [f"Must be 1 to {MAX_KEY_LENGTH} characters."]}
+            )
+
+        request_fingerprint = fingerprint(request.method, request.path, data)
+        record, claimed = claim_key(user, key, request_fingerprint)
+        if not claimed:
+            return replayed_outcome(record, request_fingerprint)
+        try:
+            outcome = self.run_purchase(request, data, admission)
+        except Exception:
+            release_key(record)
+            raise
+        store_outcome(record, outcome[0], outcome[1])
+        return outcome
+
+    def run_purchase(self, request, data, admission):
+        serializer = TicketPurchaseSerializer(data=data, context={"request": request})
+        try:
+            serializer.is_valid(raise_exception=True)
+            waiting_room.check_purchase(
+                admission, serializer.validated_data["ticket_id"].event_id, request.user.pk
+            )
+            waiting_room.claim(admission)
+            try:
+                serializer.save()
+            except BaseException:
+                waiting_room.release(admission)
+                raise
+        except exceptions.APIException as exc:
+            # Client errors are replayed like successes
+            error = self.error_response(exc)
+            return error.status_code, json.loads(error.content), {}
+
+        with serializing():
+            data = serializer.data
+        return status.HTTP_201_CREATED, data, {}
@@ -0,0 +1,237 @@
+"""
+Benchmarks run by the `benchmark` management command against a throwaway test
+database. Each module in this package exposes `DEFAULT_SIZE` and
+`run(size, repeat)`, which builds its own data set and returns a list of
+result rows made with `summarize()`.
+"""
+import contextlib
+import datetime
+import random
+import statistics
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import CommandError
+from django.db.models import IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from authentication.models import User
+from core.analytics import rebuild_sales_rollup
+from core.models import Event, Purchase, Ticket
+
+# Words event names and descriptions are made of, so searches have hits
+EVENT_WORDS = (
+    "jazz rock festival night live acoustic symphony orchestra comedy tour "
+    "summer winter open air theatre expo tech market food wine craft beer "
+    "indie electronic dance hip hop classical opera ballet film poetry art"
+).split()
+
+PURCHASE_BATCH_SIZE = 10_000  # Purchases per bulk_create() query
+
+
+def measure(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(name, samples, **extra):
+    """
+    Latency summary in milliseconds for a list of samples in seconds.
+    """
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    row = {
+        "name": name,
+        "count": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p50_ms": percentile(50) * 1000,
+        "p95_ms": percentile(95) * 1000,
+        "p99_ms": percentile(99) * 1000,
+    }
+    row.update(extra)
+    return row
+
+
+class QueryCounter:  # pylint: disable=too-few-public-methods
+    """
+    Execute wrapper counting database queries.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    # The signature of a Django execute wrapper
+    def __call__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self, execute, sql, params, many, context
+    ):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def client_for(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+def expect_status(response, status_code):
+    """
+    Stop the benchmark when a request got another answer than `status_code`,
+    as it would no longer measure what it claims to.
+    """
+    if response.status_code != status_code:
+        body = response.content.decode(errors="replace")[:500]
+        raise CommandError(f"Expected {status_code}, got {response.status_code}: {body}")
+
+
+def create_users(count, prefix="user", role="user", password=None):
+    # One hash for everyone: hashing a password per user would take minutes
+    hashed = make_password(password) if password else ""
+    return User.objects.bulk_create(
+        User(
+            username=f"{prefix}{i}",
+            email=f"{prefix}{i}@example.com",
+            role=role,
+            password=hashed,
+        )
+        for i in range(count)
+    )
+
+
+def create_catalog(organizers, events_per_organizer, tiers_per_event, stock=1_000_000):
+    today = timezone.localdate()
+    events = Event.objects.bulk_create(
+        Event(
+            organizer=organizer,
+            event_name=f"Event {organizer.pk}-{i}",
+            description="Benchmark event",
+            date=today + datetime.timedelta(days=i % 365),
+            time=datetime.time(18 + i % 4),
+            location=f"City {i % 50}",
+        )
+        for organizer in organizers
+        for i in range(events_per_organizer)
+    )
+    tickets = Ticket.objects.bulk_create(
+        Ticket(
+            event=event,
+            ticket_type=("General Admission", "VIP", "Early Bird", "Backstage")[tier % 4],
+            price=Decimal(10 + 15 * tier),
+            quantity_available=stock,
+        )
+        for event in events
+        for tier in range(tiers_per_event)
+    )
+    return events, tickets
+
+
+@contextlib.contextmanager
+def backdated_purchases():
+    # Let bulk_create keep the purchase_time values the generator picked
+    field = Purchase._meta.get_field("purchase_time")
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def create_purchases(count, users, tickets, days=90, skew=1.2):
+    """
+    Bulk-create `count` purchases spread over the last `days` days. Ticket
+    popularity follows a Zipf-like curve so a few tiers take most sales.
+    """
+    weights = [1 / (rank + 1) ** skew for rank in range(len(tickets))]
+    now = timezone.now()
+    created = 0
+    with backdated_purchases():
+        while created < count:
+            size = min(PURCHASE_BATCH_SIZE, count - created)
+            batch = []
+            for ticket in random.choices(tickets, weights=weights, k=size):
+                quantity = random.randint(1, 4)
+                batch.append(
+                    Purchase(
+                        user=random.choice(users),
+                        ticket=ticket,
+                        quantity=quantity,
+                        total_price=quantity * ticket.price,
+                        purchase_time=now
+                        - datetime.timedelta(seconds=random.randrange(days * 86400)),
+                    )
+                )
+            Purchase.objects.bulk_create(batch)
+            created += size
+    return created
+
+
+def record_sales(tickets):
+    """
+    Set quantity_sold of bulk-created tickets from their purchases.
+    """
+    sold = (
+        Purchase.objects.filter(ticket=OuterRef("pk"))
+        .values("ticket")
+        .annotate(total=Sum("quantity"))
+        .values("total")
+    )
+    Ticket.objects.filter(pk__in=[ticket.pk for ticket in tickets]).update(
+        quantity_sold=Coalesce(Subquery(sold, output_field=IntegerField()), 0)
+    )
+
+
+@dataclass
+class Dataset:
+    organizers: list
+    buyers: list
+    events: list
+    tickets: list
+
+
+def generate_dataset(  # pylint: disable=too-many-arguments
+    *,
+    organizers,
+    events_per_organizer,
+    tiers_per_event,
+    users,
+    purchases,
+    prefix="",
+    password=None,
+    days=90,
+    skew=1.2,
+    seed=None,
+):
+    """
+    A catalogue with searchable event names, buyers and a skewed purchase
+    history, with ticket stock and the sales rollup matching the purchases.
+    The same seed gives the same data.
+    """
+    if seed is not None:
+        random.seed(seed)
+    organizer_users = create_users(
+        organizers, prefix=f"{prefix}organizer", role="organizer", password=password
+    )
+    buyers = create_users(users, prefix=f"{prefix}user", password=password)
+    events, tickets = create_catalog(organizer_users, events_per_organizer, tiers_per_event)
+
+    for event in events:
+        event.event_name = " ".join(random.sample(EVENT_WORDS, 3)).title()
+        event.description = " ".join(random.choices(EVENT_WORDS, k=12))
+    Event.objects.bulk_update(events, ["event_name", "description"], batch_size=5_000)
+
+    if tickets and buyers:
+        create_purchases(purchases, buyers, tickets, days=days, skew=skew)
+    record_sales(tickets)
+    rebuild_sales_rollup()
+    return Dataset(organizers=organizer_users, buyers=buyers, events=events, tickets=tickets)
@@ -0,0 +1,54 @@
+"""
+Organizer analytics latency with a large purchase history: the rollup-backed
+endpoints against the raw Purchase aggregate they replaced.
+"""
+import datetime
+from functools import partial
+
+from django.db.models import Sum
+from django.utils import timezone
+
+from core.analytics import rebuild_sales_rollup
+from core.models import Purchase
+
+from . import (
+    client_for,
+    create_catalog,
+    create_purchases,
+    create_users,
+    measure,
+    summarize,
+)
+
+DEFAULT_SIZE = 1_000_000
+
+
+def run(size, repeat):
+    organizers = create_users(20, prefix="organizer", role="organizer")
+    buyers = create_users(2_000, prefix="buyer")
+    _, tickets = create_catalog(organizers, events_per_organizer=25, tiers_per_event=3)
+    create_purchases(size, buyers, tickets)
+    rebuild_sales_rollup()
+
+    # The organizer owning the most popular tiers, i.e. the worst case
+    organizer = tickets[0].event.organizer
+    client = client_for(organizer)
+    results = []
+
+    week_ago = (timezone.localdate() - datetime.timedelta(days=7)).isoformat()
+    for name, url in (
+        ("totals", "/api/analytics/"),
+        ("breakdown_hour_7d", f"/api/analytics/breakdown/?interval=hour&date_from={week_ago}"),
+        ("breakdown_day", "/api/analytics/breakdown/?interval=day"),
+        ("breakdown_week", "/api/analytics/breakdown/?interval=week"),
+    ):
+        samples = measure(partial(client.get, url), repeat)
+        results.append(summarize(name, samples, purchases=size))
+
+    # What AnalyticsView used to do: aggregate the raw purchases
+    raw = Purchase.objects.filter(ticket__event__organizer=organizer)
+    samples = measure(
+        lambda: raw.aggregate(Sum("quantity"), Sum("total_price")), max(1, repeat // 10)
+    )
+    results.append(summarize("raw_purchase_aggregate", samples, purchases=size))
+    return results
@@ -0,0 +1,93 @@
+"""
+Concurrent-connection throughput of the browse list endpoint: the DRF view
+behind the WSGI handler with one thread per connection, the same view behind
+the ASGI handler, and the async view behind the ASGI handler.
+
+Requests go through Django's own WSGI and ASGI request handlers in process, so
+the numbers leave out the server (gunicorn, uvicorn) but compare the two paths
+on the same hardware and database.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+from django.test import AsyncClient, Client, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import create_catalog, create_users, expect_status, summarize
+
+DEFAULT_SIZE = 2_000  # Events in the catalogue
+CONCURRENCY = (1, 10, 50)
+PAGE = "?page_size=20&location=City%207"
+
+
+def wsgi(url, headers, concurrency, total):
+    def worker(count):
+        client = Client(headers=headers)
+        samples = []
+        for _ in range(count):
+            start = time.perf_counter()
+            response = client.get(url)
+            samples.append(time.perf_counter() - start)
+            expect_status(response, 200)
+        close_old_connections()
+        return samples
+
+    shares = [total // concurrency] * concurrency
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        results = list(pool.map(worker, shares))
+        elapsed = time.perf_counter() - start
+    return [sample for samples in results for sample in samples], elapsed
+
+
+def asgi(url, headers, concurrency, total):
+    async def connection(count):
+        client = AsyncClient()
+        samples = []
+        for _ in range(count):
+            start = time.perf_counter()
+            # AsyncClient only sends headers given per request
+            response = await client.get(url, headers=headers)
+            samples.append(time.perf_counter() - start)
+            expect_status(response, 200)
+        return samples
+
+    async def main():
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(connection(total // concurrency) for _ in range(concurrency))
+        )
+        return [sample for samples in results for sample in samples], time.perf_counter() - start
+
+    return asyncio.run(main())
+
+
+def run(size, repeat):
+    # --repeat is the number of requests per connection
+    organizers = create_users(10, prefix="organizer", role="organizer")
+    buyer = create_users(1, prefix="buyer")[0]
+    create_catalog(organizers, size // len(organizers), tiers_per_event=3)
+    headers = {"Authorization": f"Bearer {AccessToken.for_user(buyer)}"}
+
+    scenarios = (
+        ("wsgi_drf", wsgi, "/api/browse/events/"),
+        ("asgi_drf", asgi, "/api/browse/events/"),
+        ("asgi_async", asgi, "/api/async/browse/events/"),
+    )
+    results = []
+    # Without the browse cache every request reaches the database
+    with override_settings(BROWSE_CACHE={"ENABLED": False}):
+        for concurrency in CONCURRENCY:
+            total = concurrency * repeat
+            for name, driver, url in scenarios:
+                samples, elapsed = driver(url + PAGE, headers, concurrency, total)
+                results.append(
+                    summarize(
+                        f"{name}:c{concurrency}",
+                        samples,
+                        requests_per_s=round(len(samples) / elapsed),
+                    )
+                )
+    return results
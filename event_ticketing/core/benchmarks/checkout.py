@@ -0,0 +1,45 @@
+"""
+Buying several tiers at once: one checkout call against the same items
+bought with sequential single-item purchase calls.
+"""
+import functools
+
+from django.core.management.base import CommandError
+
+from core.serializers import CheckoutSerializer
+
+from . import client_for, create_catalog, create_users, expect_status, measure, summarize
+
+DEFAULT_SIZE = 8  # Largest cart measured, at most CheckoutSerializer.MAX_ITEMS
+
+CHECKOUT_URL = "/api/tickets/checkout/"
+PURCHASE_URL = "/api/tickets/purchase/"
+
+
+def sequential(client, items):
+    for item in items:
+        expect_status(client.post(PURCHASE_URL, item, format="json"), 201)
+
+
+def single_checkout(client, items):
+    expect_status(client.post(CHECKOUT_URL, {"items": items}, format="json"), 201)
+
+
+def run(size, repeat):
+    if size > CheckoutSerializer.MAX_ITEMS:
+        raise CommandError(
+            f"--size is the largest cart, at most {CheckoutSerializer.MAX_ITEMS} items."
+        )
+    organizers = create_users(1, prefix="organizer", role="organizer")
+    buyer, = create_users(1, prefix="buyer")
+    _, tickets = create_catalog(organizers, events_per_organizer=size, tiers_per_event=2)
+    client = client_for(buyer)
+
+    results = []
+    # Doubling cart sizes, up to and including `size`
+    for cart_size in sorted({min(2**n, size) for n in range(size.bit_length() + 1)}):
+        items = [{"ticket_id": ticket.pk, "quantity": 1} for ticket in tickets[:cart_size]]
+        for name, func in (("sequential", sequential), ("checkout", single_checkout)):
+            samples = measure(functools.partial(func, client, items), repeat)
+            results.append(summarize(f"{name}:{cart_size}", samples, items=cart_size))
+    return results
@@ -0,0 +1,83 @@
+"""
+Purchase latency by connection handling: a new connection for every request
+(CONN_MAX_AGE=0), a persistent connection with and without health checks,
+and a psycopg connection pool.
+
+Each request runs between the close_old_connections() calls a server makes
+when a request starts and finishes, which the test client skips. The pool is
+only measured on PostgreSQL with psycopg_pool installed, and the difference
+is largest against a database across a network.
+"""
+import contextlib
+import importlib.util
+
+from django.db import close_old_connections, connection
+
+from . import (
+    client_for,
+    create_catalog,
+    create_users,
+    expect_status,
+    measure,
+    summarize,
+)
+
+DEFAULT_SIZE = 1  # Unused: the data set is one tier and one buyer
+
+MODES = {
+    "new_connection": {"CONN_MAX_AGE": 0},
+    "persistent": {"CONN_MAX_AGE": 600, "CONN_HEALTH_CHECKS": False},
+    "persistent_health_checks": {"CONN_MAX_AGE": 600, "CONN_HEALTH_CHECKS": True},
+    "pool": {"CONN_MAX_AGE": 0, "OPTIONS": {"pool": {"min_size": 1, "max_size": 4}}},
+}
+
+
+def pool_available():
+    if connection.vendor != "postgresql":
+        return False
+    return importlib.util.find_spec("psycopg_pool") is not None
+
+
+@contextlib.contextmanager
+def connection_settings(overrides):
+    # The open connection reads its own settings_dict, which override_settings
+    # does not change
+    saved = {key: connection.settings_dict.get(key) for key in overrides}
+    connection.close()
+    connection.settings_dict.update(
+        {
+            **overrides,
+            "OPTIONS": {**connection.settings_dict["OPTIONS"], **overrides.get("OPTIONS", {})},
+        }
+    )
+    try:
+        yield
+    finally:
+        connection.close()
+        if "pool" in overrides.get("OPTIONS", {}):
+            connection.close_pool()
+        connection.settings_dict.update(saved)
+
+
+def run(size, repeat):  # pylint: disable=unused-argument
+    # One buyer and tier, so --size is not used
+    organizers = create_users(1, prefix="organizer", role="organizer")
+    buyer = create_users(1, prefix="buyer")[0]
+    _, tickets = create_catalog(organizers, events_per_organizer=1, tiers_per_event=1)
+    client = client_for(buyer)
+    data = {"ticket_id": tickets[0].pk, "quantity": 1}
+
+    def purchase():
+        close_old_connections()  # request_started
+        response = client.post("/api/tickets/purchase/", data)
+        close_old_connections()  # request_finished
+        expect_status(response, 201)
+
+    results = []
+    for mode, overrides in MODES.items():
+        if mode == "pool" and not pool_available():
+            continue
+        with connection_settings(overrides):
+            purchase()  # Warm up, and open the pool
+            results.append(summarize(f"purchase:{mode}", measure(purchase, repeat)))
+    return results
@@ -0,0 +1,56 @@
+"""
+Bulk import throughput: rows per second and peak Python memory while
+importing a generated CSV lineup, which should stay flat as the file grows.
+"""
+import time
+import tracemalloc
+
+from core.imports import import_events
+from core.models import Event
+
+from . import create_users, summarize
+
+DEFAULT_SIZE = 20_000
+
+HEADER = "event_name,description,date,time,location,ticket_type,price,quantity_available\n"
+TIERS = (("General Admission", "25.00", 500), ("VIP", "90.00", 50))
+
+
+def generate_csv(events):
+    # Yields lines, so the input itself is never held in memory
+    yield HEADER
+    for i in range(events):
+        for ticket_type, price, quantity in TIERS:
+            yield (
+                f"Show {i},Benchmark lineup,2030-{1 + i % 12:02}-{1 + i % 28:02},"
+                f"{18 + i % 4}:00,City {i % 50},{ticket_type},{price},{quantity}\n"
+            )
+
+
+def run(size, repeat):
+    organizer, = create_users(1, prefix="organizer", role="organizer")
+    results = []
+    for events in (size // 10, size):
+        samples = []
+        for _ in range(max(1, repeat // 25)):
+            Event.objects.all().delete()
+            start = time.perf_counter()
+            report = import_events(generate_csv(events), organizer, "csv", batch_size=500)
+            samples.append(time.perf_counter() - start)
+            assert report.events == events, report.errors[:5]
+
+        # Memory is traced in a separate run, tracemalloc slows imports down
+        Event.objects.all().delete()
+        tracemalloc.start()
+        import_events(generate_csv(events), organizer, "csv", batch_size=500)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results.append(
+            summarize(
+                f"csv_import:{events}",
+                samples,
+                rows_per_s=int(events * len(TIERS) / min(samples)),
+                peak_kib=peak // 1024,
+            )
+        )
+    return results
@@ -0,0 +1,57 @@
+"""
+Overhead of InstrumentationMiddleware: the same requests with it off, on,
+and on with the N+1 debug log (which keeps every request's SQL).
+"""
+import logging
+from functools import partial
+
+from django.test import override_settings
+
+from core.instrumentation import logger
+
+from . import client_for, create_catalog, create_users, measure, summarize
+
+DEFAULT_SIZE = 200  # Events, each with 3 tiers
+
+MODES = {
+    "off": ({"ENABLED": False}, logging.WARNING),
+    "on": ({"ENABLED": True}, logging.WARNING),
+    "n_plus_one_log": ({"ENABLED": True}, logging.DEBUG),
+}
+
+
+def measure_mode(request, buyer, mode, repeat):
+    config, log_level = MODES[mode]
+    level = logger.level
+    logger.setLevel(log_level)
+    try:
+        with override_settings(INSTRUMENTATION=config):
+            # New client, so the middleware stack is loaded with this config
+            client = client_for(buyer)
+            request(client)
+            return measure(partial(request, client), repeat)
+    finally:
+        logger.setLevel(level)
+
+
+def run(size, repeat):
+    organizers = create_users(1, prefix="organizer", role="organizer")
+    buyer = create_users(1, prefix="buyer")[0]
+    events, tickets = create_catalog(organizers, size, tiers_per_event=3)
+
+    requests = {
+        "browse_list": lambda client: client.get("/api/browse/events/?page_size=20"),
+        "browse_detail": lambda client: client.get(f"/api/browse/events/{events[0].pk}/"),
+        "purchase": lambda client: client.post(
+            "/api/tickets/purchase/", {"ticket_id": tickets[0].pk, "quantity": 1}
+        ),
+    }
+
+    results = []
+    # No cached pages, so every request does its full work
+    with override_settings(BROWSE_CACHE={"ENABLED": False}):
+        for name, request in requests.items():
+            for mode in MODES:
+                samples = measure_mode(request, buyer, mode, repeat)
+                results.append(summarize(f"{name}:{mode}", samples))
+    return results
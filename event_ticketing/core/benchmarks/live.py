@@ -0,0 +1,106 @@
+"""
+Fan-out of live availability updates to many idle server-sent event streams
+in one worker: memory held per subscriber, time from a committed change to
+the last subscriber having it, and queries per update.
+"""
+import asyncio
+import time
+import tracemalloc
+
+from asgiref.sync import sync_to_async
+from django.db.models import F
+from django.test import override_settings
+
+from core.live import event_stream, live_publisher
+from core.models import Ticket
+
+from . import create_catalog, create_users, summarize
+
+DEFAULT_SIZE = 5_000  # Subscribers
+INTERVAL = 0.05
+
+
+async def read(stream, received):
+    # Stands in for the ASGI handler sending each chunk to its client
+    async for _ in stream:
+        received.append(time.perf_counter())
+
+
+def sell(ticket_id):
+    Ticket.objects.filter(pk=ticket_id).update(quantity_sold=F("quantity_sold") + 1)
+
+
+async def wait_for(inboxes, count):
+    while any(len(inbox) < count for inbox in inboxes):
+        await asyncio.sleep(0.001)
+
+
+async def measure_burst(event_id, ticket_id, inbox, updates_before):
+    """
+    A burst of sales is coalesced into one update per interval, each one
+    query however many subscribers there are. Returns the burst's duration,
+    the updates `inbox` got and the queries they took.
+    """
+    probe = live_publisher.subscribe(event_id)
+    refreshes = probe.channel.refreshes
+    start = time.perf_counter()
+    for _ in range(100):
+        await sync_to_async(sell)(ticket_id)
+        live_publisher.publish([event_id])
+    burst_seconds = time.perf_counter() - start
+    await asyncio.sleep(INTERVAL * 2)
+    queries = probe.channel.refreshes - refreshes
+    live_publisher.unsubscribe(probe)
+    return burst_seconds, len(inbox) - updates_before, queries
+
+
+async def fan_out(event_id, ticket_id, size, repeat):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    inboxes = [[] for _ in range(size)]
+    readers = [asyncio.create_task(read(event_stream(event_id), inbox)) for inbox in inboxes]
+    await wait_for(inboxes, 2)  # Reconnect delay and first snapshot
+    per_subscriber = (tracemalloc.get_traced_memory()[0] - before) / size
+    tracemalloc.stop()
+
+    last, each = [], []
+    for round_number in range(repeat):
+        await sync_to_async(sell)(ticket_id)
+        start = time.perf_counter()
+        live_publisher.publish([event_id])
+        await wait_for(inboxes, 3 + round_number)
+        arrivals = [inbox[-1] - start for inbox in inboxes]
+        last.append(max(arrivals))
+        each.extend(arrivals)
+        await asyncio.sleep(INTERVAL)
+
+    burst_results = await measure_burst(event_id, ticket_id, inboxes[0], 2 + repeat)
+
+    for reader in readers:
+        reader.cancel()
+    await asyncio.gather(*readers, return_exceptions=True)
+    return per_subscriber, last, each, burst_results
+
+
+def run(size, repeat):
+    organizers = create_users(1, prefix="organizer", role="organizer")
+    events, tickets = create_catalog(organizers, events_per_organizer=1, tiers_per_event=4)
+
+    with override_settings(LIVE_UPDATES={"INTERVAL": INTERVAL, "KEEPALIVE": 60}):
+        per_subscriber, last, each, burst = asyncio.run(
+            fan_out(events[0].pk, tickets[0].pk, size, repeat)
+        )
+    return [
+        summarize(
+            f"last_subscriber:{size}",
+            last,
+            bytes_per_subscriber=round(per_subscriber),
+        ),
+        summarize(
+            f"each_subscriber:{size}",
+            each,
+            burst_of_100_ms=round(burst[0] * 1000),
+            burst_updates=burst[1],
+            burst_queries=burst[2],
+        ),
+    ]
@@ -0,0 +1,80 @@
+"""
+Rows per second through the browse and purchase-history response pipeline:
+fetching, serializing and rendering a page, with ModelSerializer and
+JSONRenderer against the `.values()` projections and FastJSONRenderer.
+"""
+from functools import partial
+
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Event, Purchase
+from core.projections import EventProjection, PurchaseProjection
+from core.renderers import FastJSONRenderer
+from core.serializers import EventSerializer, PurchaseSerializer
+
+from . import create_catalog, create_purchases, create_users, measure, summarize
+
+DEFAULT_SIZE = 1_000  # Events, each with 3 tiers
+PAGE_SIZES = (20, 100)
+
+EVENT_PROJECTION, PURCHASE_PROJECTION = EventProjection(), PurchaseProjection()
+
+
+def serialized_events(events, rows):
+    return JSONRenderer().render(EventSerializer(events.with_tickets()[:rows], many=True).data)
+
+
+def projected_events(events, rows):
+    values = EVENT_PROJECTION.values(events)[:rows]
+    return FastJSONRenderer().render(EVENT_PROJECTION.serialize(values))
+
+
+def serialized_purchases(purchases, rows):
+    page = purchases.select_related("ticket").prefetch_related("ticket__buckets")[:rows]
+    return JSONRenderer().render(PurchaseSerializer(page, many=True).data)
+
+
+def projected_purchases(purchases, rows):
+    values = PURCHASE_PROJECTION.values(purchases)[:rows]
+    return FastJSONRenderer().render(PURCHASE_PROJECTION.serialize(values))
+
+
+def create_data(size):
+    """
+    The events, and the purchases of the one buyer, in page order.
+    """
+    organizers = create_users(10, prefix="organizer", role="organizer")
+    buyers = create_users(1, prefix="buyer")
+    _, tickets = create_catalog(organizers, size // len(organizers), tiers_per_event=3)
+    create_purchases(size, buyers, tickets)
+    return (
+        Event.objects.order_by("date", "time", "id"),
+        Purchase.objects.filter(user=buyers[0]).order_by("-purchase_time", "id"),
+    )
+
+
+def run(size, repeat):
+    events, purchases = create_data(size)
+    paths = {
+        "events": (partial(serialized_events, events), partial(projected_events, events)),
+        "purchases": (
+            partial(serialized_purchases, purchases),
+            partial(projected_purchases, purchases),
+        ),
+    }
+
+    results = []
+    for name, (serializer_path, fast_path) in paths.items():
+        for rows in PAGE_SIZES + (size,):
+            # Same bytes either way, or the comparison means nothing
+            assert serializer_path(rows) == fast_path(rows)
+            for label, path in (("serializer", serializer_path), ("fast", fast_path)):
+                samples = measure(partial(path, rows), repeat)
+                results.append(
+                    summarize(
+                        f"{name}:{label}:{rows}",
+                        samples,
+                        rows_per_s=round(rows * len(samples) / sum(samples)),
+                    )
+                )
+    return results
@@ -0,0 +1,141 @@
+"""
+Scripted load scenarios through the whole URLconf and middleware stack, on a
+generated data set: browsing with filters and search, an on-sale purchase
+storm on one tier, purchase history and organizer analytics. Each scenario
+reports requests per second, latency percentiles, database queries per
+request and response statuses.
+
+--size is the number of purchases in the generated history and --repeat the
+number of requests per scenario. Requests run one after another, so RPS is
+the single-worker rate.
+"""
+import datetime
+import random
+import time
+from collections import Counter
+from decimal import Decimal
+from urllib.parse import urlencode
+
+from django.db import connection
+from django.utils import timezone
+
+from core.models import Ticket
+
+from . import EVENT_WORDS, QueryCounter, client_for, generate_dataset, summarize
+
+DEFAULT_SIZE = 100_000
+SEED = 0
+CLIENTS = 50  # Distinct users sending the browse, history and analytics requests
+
+
+def play(name, requests, expected=(200,)):
+    """
+    Send `requests` (callables returning a response) and summarize them.
+    """
+    counter = QueryCounter()
+    samples, statuses = [], Counter()
+    with connection.execute_wrapper(counter):
+        started = time.perf_counter()
+        for request in requests:
+            start = time.perf_counter()
+            response = request()
+            samples.append(time.perf_counter() - start)
+            statuses[response.status_code] += 1
+        elapsed = time.perf_counter() - started
+    return summarize(
+        name,
+        samples,
+        rps=round(len(samples) / elapsed, 1),
+        queries_per_request=round(counter.count / len(samples), 2),
+        statuses="/".join(f"{status}:{count}" for status, count in sorted(statuses.items())),
+        errors=sum(count for status, count in statuses.items() if status not in expected),
+    )
+
+
+def get(client, url, **params):
+    return lambda: client.get(f"{url}?{urlencode(params)}" if params else url)
+
+
+def browse_requests(rng, clients, dataset, count):
+    today = timezone.localdate()
+    url = "/api/browse/events/"
+    choices = (
+        lambda client: get(client, url),
+        lambda client: get(client, url, upcoming="true", page_size=50),
+        lambda client: get(client, url, location=f"City {rng.randrange(50)}"),
+        lambda client: get(client, url, location_prefix=f"City {rng.randrange(1, 10)}"),
+        lambda client: get(
+            client,
+            url,
+            date_from=today.isoformat(),
+            date_to=(today + datetime.timedelta(days=30)).isoformat(),
+        ),
+        lambda client: get(client, url, search=" ".join(rng.sample(EVENT_WORDS, 2))),
+        lambda client: get(client, f"{url}{rng.choice(dataset.events).pk}/"),
+    )
+    return [rng.choice(choices)(rng.choice(clients)) for _ in range(count)]
+
+
+def purchase_storm_requests(dataset, count):
+    # Every buyer goes for the same tier, which sells out half way through
+    hot = Ticket.objects.create(
+        event=dataset.events[0],
+        ticket_type="On sale",
+        price=Decimal("50.00"),
+        quantity_available=max(1, count // 2),
+    )
+    buyers = [client_for(buyer) for buyer in dataset.buyers[:count]]
+    return [
+        lambda client=buyers[i % len(buyers)]: client.post(
+            "/api/tickets/purchase/", {"ticket_id": hot.pk, "quantity": 1}
+        )
+        for i in range(count)
+    ]
+
+
+def run(size, repeat):
+    dataset = generate_dataset(
+        organizers=20,
+        events_per_organizer=50,
+        tiers_per_event=3,
+        users=2_000,
+        purchases=size,
+        seed=SEED,
+    )
+    rng = random.Random(SEED)
+    buyers = [client_for(buyer) for buyer in rng.sample(dataset.buyers, CLIENTS)]
+    organizers = [client_for(organizer) for organizer in dataset.organizers]
+    week_ago = (timezone.localdate() - datetime.timedelta(days=7)).isoformat()
+
+    scenarios = (
+        ("browse", browse_requests(rng, buyers, dataset, repeat), (200,)),
+        ("purchase_storm", purchase_storm_requests(dataset, repeat), (201, 400)),
+        (
+            "history",
+            [
+                get(rng.choice(buyers), "/api/purchases/history/", page_size=rng.choice((20, 100)))
+                for _ in range(repeat)
+            ],
+            (200,),
+        ),
+        (
+            "analytics",
+            [
+                rng.choice(
+                    (
+                        get(client, "/api/analytics/"),
+                        get(client, "/api/analytics/breakdown/", interval="day"),
+                        get(
+                            client,
+                            "/api/analytics/breakdown/",
+                            interval="hour",
+                            date_from=week_ago,
+                        ),
+                    )
+                )
+                for client in (rng.choice(organizers) for _ in range(repeat))
+            ],
+            (200,),
+        ),
+    )
+    return [play(name, requests, expected) for name, requests, expected in scenarios]
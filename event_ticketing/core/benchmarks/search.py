@@ -0,0 +1,54 @@
+"""
+Event search latency over a large catalogue: the ranked full-text index
+against the icontains filter SearchFilter used to run.
+"""
+import random
+from functools import partial
+
+from core.models import Event
+from core.search import search_events
+
+from . import EVENT_WORDS, create_catalog, create_users, measure, summarize
+
+DEFAULT_SIZE = 100_000
+
+SYLLABLES = "ka lo mi ren sa tu vel dor an is om ri cha pe nu go".split()
+
+# Common words, a rare word, a prefix, a typo and a multi-word query
+QUERIES = ("jazz", "zephyr", "fest", "orchestra night", "electronc", "wine market")
+
+
+def name_events(events):
+    rng = random.Random(0)
+    # A long tail of made-up words keeps common terms at realistic frequencies
+    filler = ["".join(rng.choices(SYLLABLES, k=3)) for _ in range(5_000)]
+    for index, event in enumerate(events):
+        name = rng.sample(EVENT_WORDS, 2) + rng.sample(filler, 1)
+        if index % 10_000 == 0:
+            name.append("zephyr")
+        event.event_name = " ".join(name).title()
+        event.description = " ".join(rng.choices(EVENT_WORDS, k=3) + rng.choices(filler, k=12))
+    Event.objects.bulk_update(events, ["event_name", "description"], batch_size=5_000)
+
+
+def first_page(queryset):
+    return list(queryset[:20])
+
+
+def run(size, repeat):
+    organizers = create_users(10, prefix="organizer", role="organizer")
+    events, _ = create_catalog(organizers, size // len(organizers), tiers_per_event=0)
+    name_events(events)
+
+    results = []
+    for query in QUERIES:
+        term = query.split()[0]
+        icontains = Event.objects.filter(event_name__icontains=term).order_by("date", "time", "id")
+        ranked = search_events(Event.objects.all(), query).order_by("-search_rank", "id")
+
+        for name, queryset in (("icontains", icontains), ("full_text", ranked)):
+            samples = measure(partial(first_page, queryset), repeat)
+            results.append(
+                summarize(f"{name}:{query}", samples, events=size, hits=queryset.count())
+            )
+    return results
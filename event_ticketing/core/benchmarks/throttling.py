@@ -0,0 +1,85 @@
+"""
+Overhead of the rate limiter: the cost of one limit check per store and
+bucket key, a purchase request with limits off and on, and what a throttled
+request costs compared with one that gets through.
+"""
+from functools import partial
+
+from django.test import RequestFactory, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core.throttling import rate_limiter
+
+from . import create_catalog, create_users, expect_status, measure, summarize
+
+DEFAULT_SIZE = 1_000  # Distinct clients in the limiter checks
+
+STORES = ("core.throttling.LocalBucketStore", "core.throttling.CacheBucketStore")
+UNLIMITED = {"RATE": "1000000/s", "BURST": 1_000_000}
+
+
+def limits(store, **policy):
+    return {"STORE": store, "POLICIES": {"bench": {**UNLIMITED, **policy}}}
+
+
+def token_client(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+    return client
+
+
+def check_all(batch):
+    for request in batch:
+        rate_limiter.check("bench", request)
+
+
+def check_overhead(size, repeat):
+    factory = RequestFactory()
+    tokens = [AccessToken.for_user(user) for user in create_users(size, prefix="client")]
+    requests = {
+        "ip": [factory.post("/", REMOTE_ADDR=f"10.0.{i // 256}.{i % 256}") for i in range(size)],
+        "user": [factory.post("/", HTTP_AUTHORIZATION=f"Bearer {token}") for token in tokens],
+    }
+    results = []
+    for store in STORES:
+        for scope, batch in requests.items():
+            with override_settings(RATE_LIMITS=limits(store, KEY=scope)):
+                samples = [
+                    seconds / size for seconds in measure(partial(check_all, batch), repeat)
+                ]
+            results.append(summarize(f"check:{store.rsplit('.', 1)[1]}:{scope}", samples))
+    return results
+
+
+def purchase_overhead(repeat):
+    organizers = create_users(1, prefix="organizer", role="organizer")
+    buyer = create_users(1, prefix="buyer")[0]
+    _, tickets = create_catalog(organizers, events_per_organizer=1, tiers_per_event=1)
+    client = token_client(buyer)
+    data = {"ticket_id": tickets[0].pk, "quantity": 1}
+
+    def purchase():
+        return client.post("/api/tickets/purchase/", data)
+
+    results = []
+    with override_settings(RATE_LIMITS={"ENABLED": False}):
+        results.append(summarize("purchase:no_limits", measure(purchase, repeat)))
+    for store in STORES:
+        policy = {"POLICIES": {"purchase": {**UNLIMITED, "KEY": "user"}}}
+        with override_settings(RATE_LIMITS={"STORE": store, **policy}):
+            name = store.rsplit(".", 1)[1]
+            results.append(summarize(f"purchase:{name}", measure(purchase, repeat)))
+
+    # A client over its limit is turned away before authentication
+    policy = {"POLICIES": {"purchase": {"RATE": "1/d", "BURST": 1, "KEY": "user"}}}
+    with override_settings(RATE_LIMITS={"STORE": STORES[0], **policy}):
+        purchase()
+        samples = measure(purchase, repeat)
+        expect_status(purchase(), 429)
+    results.append(summarize("purchase:throttled", samples))
+    return results
+
+
+def run(size, repeat):
+    return check_overhead(size, repeat) + purchase_overhead(repeat)
@@ -0,0 +1,108 @@
+"""
+On-sale spike through the waiting room: every buyer joins at once, then
+retries the purchase endpoint once per (simulated) second. Database queries
+per second should stay at about RATE purchases' worth whatever the number of
+buyers, because unadmitted attempts are rejected before any query.
+"""
+import contextlib
+import time
+
+from django.db import connection
+from django.test import override_settings
+
+from core.admission import TOKEN_HEADER, waiting_room
+
+from . import QueryCounter, client_for, create_catalog, create_users, summarize
+
+DEFAULT_SIZE = 2_000  # Largest number of buyers
+RATE = 50
+SECONDS = 5
+
+WAITING_ROOM = {
+    "ENABLED": True,
+    "STORE": "core.admission.LocalQueueStore",
+    "RATE": RATE,
+    "ADMISSION_TTL": 60,
+}
+
+
+@contextlib.contextmanager
+def simulated_clock(start):
+    clock = {"now": start}
+    original = waiting_room.clock
+    waiting_room.clock = lambda: clock["now"]
+    try:
+        yield clock
+    finally:
+        waiting_room.clock = original
+
+
+def stampede(buyers, ticket):
+    # Without the waiting room every buyer reaches the database in the same second
+    counter = QueryCounter()
+    samples = []
+    with connection.execute_wrapper(counter):
+        for buyer in buyers:
+            client = client_for(buyer)
+            start = time.perf_counter()
+            client.post("/api/tickets/purchase/", {"ticket_id": ticket.pk, "quantity": 1})
+            samples.append(time.perf_counter() - start)
+    return samples, [counter.count]
+
+
+def spike(buyers, ticket):
+    waiting_room.reset()
+    with simulated_clock(1_000_000.0) as clock:
+        tokens = {}
+        for buyer in buyers:
+            client = client_for(buyer)
+            response = client.post("/api/queue/join/", {"event_id": ticket.event_id})
+            tokens[buyer.pk] = (client, response.data["token"])
+
+        samples, qps, rejected = [], [], 0
+        waiting = list(buyers)
+        for _ in range(SECONDS):
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                still_waiting = []
+                for buyer in waiting:
+                    client, token = tokens[buyer.pk]
+                    start = time.perf_counter()
+                    response = client.post(
+                        "/api/tickets/purchase/",
+                        {"ticket_id": ticket.pk, "quantity": 1},
+                        headers={TOKEN_HEADER: token},
+                    )
+                    samples.append(time.perf_counter() - start)
+                    if response.status_code != 201:
+                        rejected += 1
+                        still_waiting.append(buyer)
+                waiting = still_waiting
+            qps.append(counter.count)
+            clock["now"] += 1
+    return samples, qps, rejected
+
+
+def run(size, repeat):  # pylint: disable=unused-argument
+    # The samples are the buyers' own attempts, so --repeat is not used
+    organizers = create_users(1, prefix="organizer", role="organizer")
+    buyers = create_users(size, prefix="buyer")
+    _, tickets = create_catalog(organizers, events_per_organizer=1, tiers_per_event=1)
+
+    results = []
+    for count in (size // 20, size // 4, size):
+        samples, qps = stampede(buyers[:count], tickets[0])
+        results.append(
+            summarize(f"no_waiting_room:{count}", samples, db_queries_per_s=qps[0])
+        )
+        with override_settings(WAITING_ROOM=WAITING_ROOM):
+            samples, qps, rejected = spike(buyers[:count], tickets[0])
+        results.append(
+            summarize(
+                f"waiting_room:{count}",
+                samples,
+                db_queries_per_s="/".join(map(str, qps)),
+                rejected=rejected,
+            )
+        )
+    return results
@@ -0,0 +1,172 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response
+from rest_framework import status
+from rest_framework.response import Response
+
+from .replicas import read_from_primary
+
+GENERATION_KEY = "browse:generation"
+# Response headers describing the body, stored and replayed with it
+VALIDATOR_HEADERS = ("ETag",)
+
+
+class BrowseCache:
+    """
+    Read-through cache of browse responses.
+
+    Entries are keyed by path and query string (filters, search, cursor) and
+    tagged with a generation that every Event or Ticket change replaces, so
+    catalogue edits show up immediately. Purchases only record when stock last
+    changed: an entry older than that is still served for up to
+    BROWSE_CACHE["STALENESS"] seconds, which bounds how far quantity_remaining
+    can lag without flushing the cache on every sale.
+
+    Size and eviction come from the cache backend: LocMemCache evicts least
+    recently used entries past MAX_ENTRIES, and a Redis backend should run with
+    an allkeys-lru maxmemory policy.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def config(self):
+        return settings.BROWSE_CACHE
+
+    @property
+    def enabled(self):
+        return self.config.get("ENABLED", True)
+
+    @property
+    def cache(self):
+        return caches[self.config.get("ALIAS", "default")]
+
+    def entry_key(self, request, scope):
+        digest = hashlib.sha1(request.build_absolute_uri().encode()).hexdigest()
+        return f"browse:{scope}:{digest}"
+
+    @staticmethod
+    def sold_key(scope):
+        return f"browse:sold:{scope}"
+
+    def get(self, request, scope):
+        key = self.entry_key(request, scope)
+        sold_key = self.sold_key(scope)
+        found = self.cache.get_many([key, GENERATION_KEY, sold_key])
+        entry = found.get(key)
+
+        fresh = (
+            entry is not None
+            and entry["generation"] == found.get(GENERATION_KEY)
+            and (
+                found.get(sold_key, 0) <= entry["stored_at"]
+                or time.time() - entry["stored_at"] <= self.config.get("STALENESS", 0)
+            )
+        )
+        self._count(hit=fresh)
+        return (entry["data"], entry.get("headers", {})) if fresh else None
+
+    def start(self):
+        """
+        The generation and time to store a response under, taken before the
+        view reads the database: a change committed while it runs then makes
+        the entry stale instead of looking older than the entry.
+        """
+        generation = self.cache.get(GENERATION_KEY)
+        if generation is None:
+            self.cache.add(GENERATION_KEY, time.time_ns(), None)
+            generation = self.cache.get(GENERATION_KEY)
+        return generation, time.time()
+
+    def set(self, request, scope, cached, started=None):
+        # `cached` is the (data, headers) pair get() returns
+        data, headers = cached
+        generation, stored_at = started or self.start()
+        entry = {
+            "generation": generation,
+            "stored_at": stored_at,
+            "data": data,
+            "headers": headers or {},
+        }
+        self.cache.set(self.entry_key(request, scope), entry, self.config.get("TIMEOUT"))
+
+    def invalidate(self):
+        # A new generation makes every stored entry a miss
+        self.cache.set(GENERATION_KEY, time.time_ns(), None)
+
+    def mark_sold(self, event_ids):
+        now = time.time()
+        self.cache.set_many(
+            {self.sold_key(f"event:{event_id}"): now for event_id in event_ids}
+            | {self.sold_key("list"): now},
+            None,
+        )
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+browse_cache = BrowseCache()
+
+
+class BrowseCacheMixin:
+    """
+    Serve list and retrieve from the browse cache. Counters are per worker
+    process; the X-Cache header tells clients which path answered.
+
+    ETags are stored with the data they describe, so a hit can answer a
+    conditional request with 304 without any query.
+    """
+
+    def cached_response(self, request, scope, handler, *args, **kwargs):
+        if not browse_cache.enabled:
+            return handler(request, *args, **kwargs)
+
+        cached = browse_cache.get(request, scope)
+        if cached is not None:
+            data, headers = cached
+            if headers:
+                not_modified = get_conditional_response(request, etag=headers.get("ETag"))
+                if not_modified is not None:
+                    for name, value in headers.items():
+                        not_modified[name] = value
+                    not_modified["X-Cache"] = "HIT"
+                    return not_modified
+            return Response(data, headers={**headers, "X-Cache": "HIT"})
+
+        started = browse_cache.start()
+        # Entries outlive replica lag, so they are filled from the primary
+        read_from_primary()
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            headers = {name: response[name] for name in VALIDATOR_HEADERS if name in response}
+            browse_cache.set(request, scope, (response.data, headers), started)
+        response["X-Cache"] = "MISS"
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, "list", super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        scope = f"event:{kwargs[self.lookup_url_kwarg or self.lookup_field]}"
+        return self.cached_response(request, scope, super().retrieve, *args, **kwargs)
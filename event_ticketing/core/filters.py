@@ -0,0 +1,63 @@
+import django_filters
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .models import Event
+
+
+class EventFilter(django_filters.FilterSet):
+    """
+    Browse filters. Every filter maps onto an index on Event: date ranges use
+    (date, time, id), location filters use (lower(location), date, time).
+
+    Lists apply upcoming_by_default(): without a date filter only upcoming
+    events are listed, and upcoming=false lists past ones instead. Detail
+    requests don't, so past events stay reachable by id.
+    """
+
+    DATE_FILTERS = ("date", "date_from", "date_to", "upcoming")
+
+    date_from = django_filters.DateFilter(field_name="date", lookup_expr="gte")
+    date_to = django_filters.DateFilter(field_name="date", lookup_expr="lte")
+    upcoming = django_filters.BooleanFilter(method="filter_upcoming")
+    location = django_filters.CharFilter(method="filter_location")
+    location_prefix = django_filters.CharFilter(method="filter_location_prefix")
+
+    class Meta:
+        model = Event
+        fields = ["date"]
+
+    @classmethod
+    def upcoming_by_default(cls, queryset, data):
+        """
+        Leave out past events unless `data`, the query parameters, has a date
+        filter.
+        """
+        if any(data.get(name) for name in cls.DATE_FILTERS):
+            return queryset
+        return queryset.filter(date__gte=timezone.localdate())
+
+    def filter_upcoming(self, queryset, _name, value):
+        if value is None:
+            return queryset
+        today = timezone.localdate()
+        return queryset.filter(date__gte=today) if value else queryset.filter(date__lt=today)
+
+    def filter_location(self, queryset, _name, value):
+        # Case-insensitive match on the same expression the index is built on
+        return queryset.alias(location_lower=Lower("location")).filter(
+            location_lower=value.lower()
+        )
+
+    def filter_location_prefix(self, queryset, _name, value):
+        prefix = value.lower()
+        if not prefix:
+            return queryset
+        # The range lets the index seek to the prefix; startswith keeps the
+        # match exact whatever the database collation
+        upper_bound = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return queryset.alias(location_lower=Lower("location")).filter(
+            location_lower__gte=prefix,
+            location_lower__lt=upper_bound,
+            location_lower__startswith=prefix,
+        )
@@ -0,0 +1,178 @@
+"""
+Idempotency-Key support for POST endpoints.
+
+The first request with a given key claims it by inserting an IdempotencyKey
+row; the unique (user, key) constraint makes sure only one of several
+concurrent duplicates gets to run. Its response is stored on the row and
+replayed to later requests with the same key until the key expires.
+
+A claim is a lease: when the request holding it has not finished after
+IDEMPOTENCY_KEY_LEASE seconds, say because its worker died, a retry with the
+same request takes the key over. The outcome is only stored, or the key
+released, by the request that holds the current claim.
+"""
+import datetime
+import hashlib
+import json
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+
+def fingerprint(method, path, data):
+    body = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{method} {path}\n{body}".encode()).hexdigest()
+
+
+def request_fingerprint(request):
+    return fingerprint(request.method, request.path, request.data)
+
+
+def claim_key(user, key, request_hash):
+    """
+    Return (record, claimed): the new or taken over row if this request
+    claimed the key, otherwise the existing row of an earlier request.
+    """
+    now = timezone.now()
+    stale = now - datetime.timedelta(seconds=settings.IDEMPOTENCY_KEY_LEASE)
+    for _ in range(2):
+        try:
+            # Savepoint, so a lost race leaves any outer transaction usable
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    user=user,
+                    key=key,
+                    fingerprint=request_hash,
+                    claimed_at=now,
+                    expires_at=now + datetime.timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                )
+            return record, True
+        except IntegrityError:
+            record = IdempotencyKey.objects.filter(user=user, key=key).first()
+            if record is None or record.expires_at <= now:
+                # Released or expired meanwhile: drop it and claim it again
+                IdempotencyKey.objects.filter(user=user, key=key, expires_at__lte=now).delete()
+                continue
+            if (
+                record.status_code is None
+                and record.fingerprint == request_hash
+                and record.claimed_at <= stale
+                # Conditional, so only one of several retries takes over
+                and IdempotencyKey.objects.filter(
+                    pk=record.pk, status_code=None, claimed_at=record.claimed_at
+                ).update(claimed_at=now)
+            ):
+                record.claimed_at = now
+                return record, True
+            return record, False
+    # Still contended after retrying; the caller treats it as in progress
+    return None, False
+
+
+def store_outcome(record, status_code, response):
+    """
+    Store the outcome of the request holding `record`'s claim, unless a retry
+    took the key over meanwhile.
+    """
+    record.status_code, record.response = status_code, response
+    IdempotencyKey.objects.filter(pk=record.pk, claimed_at=record.claimed_at).update(
+        status_code=status_code, response=response
+    )
+
+
+def release_key(record):
+    """
+    Drop the claim so the request can be retried with the same key.
+    """
+    IdempotencyKey.objects.filter(pk=record.pk, claimed_at=record.claimed_at).delete()
+
+
+def purge_idempotency_keys(batch_size=1000):
+    """
+    Delete expired keys, `batch_size` rows per query. Returns the number
+    deleted.
+    """
+    now = timezone.now()
+    deleted = 0
+    while True:
+        pks = list(
+            IdempotencyKey.objects.filter(expires_at__lte=now)
+            .order_by("expires_at")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not pks:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(pk__in=pks).delete()[0]
+
+
+class IdempotencyMixin:
+    """
+    Make `post` idempotent for requests carrying an Idempotency-Key header.
+
+    Repeats of a finished request get its stored response back with an
+    Idempotent-Replayed header, without running the view again. Repeats that
+    arrive while the first request still runs get 409, and reusing a key for
+    a different request gets 422. Server errors are not stored, so the
+    request can be retried with the same key.
+    """
+
+    def post(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return super().post(request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise ValidationError(
+                {IDEMPOTENCY_HEADER: [f"Must be 1 to {MAX_KEY_LENGTH} characters."]}
+            )
+
+        record, claimed = claim_key(request.user, key, request_fingerprint(request))
+        if not claimed:
+            return self.replay(request, record)
+
+        try:
+            response = super().post(request, *args, **kwargs)
+        except APIException as exc:
+            # Client errors are part of the outcome and are replayed too
+            response = self.handle_exception(exc)
+        except Exception:
+            release_key(record)
+            raise
+
+        if response.status_code >= 500:
+            release_key(record)
+        else:
+            store_outcome(record, response.status_code, response.data)
+        return response
+
+    def replay(self, request, record):
+        status_code, data, headers = replayed_outcome(record, request_fingerprint(request))
+        return Response(data, status=status_code, headers=headers)
+
+
+def replayed_outcome(record, request_hash):
+    """
+    (status_code, data, headers) to answer a request whose key was already
+    claimed by `record`.
+    """
+    if record is not None and record.fingerprint != request_hash:
+        return (
+            status.HTTP_422_UNPROCESSABLE_ENTITY,
+            {"detail": "This Idempotency-Key was used for a different request."},
+            {},
+        )
+    if record is None or record.status_code is None:
+        return (
+            status.HTTP_409_CONFLICT,
+            {"detail": "A request with this Idempotency-Key is still in progress."},
+            {"Retry-After": "1"},
+        )
+    return record.status_code, record.response, {"Idempotent-Replayed": "true"}
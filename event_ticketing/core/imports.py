@@ -0,0 +1,161 @@
+"""
+Bulk import of events with nested ticket tiers.
+
+Rows are streamed from a CSV or JSON-lines file, validated a batch at a time
+and written with bulk_create, one transaction per batch. Invalid rows are
+reported with their line number and skipped; the rest of the batch is kept.
+A file that cannot be read further (bad encoding, broken CSV quoting) ends the
+import with an error at the line where reading stopped; batches before it are
+already written.
+"""
+import csv
+import json
+from itertools import islice
+
+from django.db import transaction
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+from .cache import browse_cache
+from .models import Event, Ticket
+from .serializers import EventImportSerializer
+
+FORMATS = ("csv", "jsonl")
+EVENT_COLUMNS = ("event_name", "description", "date", "time", "location", "admission_rate")
+OPTIONAL_COLUMNS = ("admission_rate",)  # Left out when blank in a CSV
+TICKET_COLUMNS = ("ticket_type", "price", "quantity_available")
+MAX_REPORTED_ERRORS = 1000
+READ_ERRORS = (UnicodeDecodeError, csv.Error)
+
+
+class UnreadableFile(Exception):
+    """
+    Reading the file failed; nothing after this point can be imported.
+    """
+
+
+def read_jsonl(lines):
+    """
+    One event per line, with its tiers in a "tickets" list.
+    """
+    line_number = 0
+    try:
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield line_number, exc
+    except READ_ERRORS as exc:
+        yield line_number + 1, UnreadableFile(exc)
+
+
+def read_csv(lines):
+    """
+    One ticket tier per row, with the event columns repeated. Consecutive rows
+    with the same event columns make up one event; a row with an empty
+    ticket_type creates an event without tiers.
+    """
+    reader = csv.DictReader(lines)
+    current_key, current, start = None, None, None
+    try:
+        for row in reader:
+            key = tuple(row.get(column) for column in EVENT_COLUMNS)
+            if key != current_key:
+                if current is not None:
+                    yield start, current
+                current_key, start = key, reader.line_num
+                current = {
+                    column: row.get(column)
+                    for column in EVENT_COLUMNS
+                    if column not in OPTIONAL_COLUMNS or row.get(column)
+                }
+                current["tickets"] = []
+            if row.get("ticket_type"):
+                current["tickets"].append({column: row.get(column) for column in TICKET_COLUMNS})
+    except READ_ERRORS as exc:
+        # The event being read may be missing tiers, so it is dropped too
+        yield (start if current is not None else reader.line_num + 1), UnreadableFile(exc)
+        return
+    if current is not None:
+        yield start, current
+
+
+def detect_format(filename):
+    return "jsonl" if filename.endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+class ImportReport:
+    def __init__(self):
+        self.events = 0
+        self.tickets = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "errors": errors})
+
+    def as_dict(self):
+        return {
+            "created_events": self.events,
+            "created_tickets": self.tickets,
+            "failed_rows": self.failed,
+            "errors": self.errors,
+        }
+
+
+def import_events(lines, organizer, file_format="csv", batch_size=500):
+    """
+    Import events for `organizer` from an iterable of text lines and return an
+    ImportReport. Only one batch is held in memory at a time.
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown import format: {file_format!r}")
+
+    rows = read_jsonl(lines) if file_format == "jsonl" else read_csv(lines)
+    # One serializer validates every row, so its fields are only built once
+    validator = EventImportSerializer()
+    report = ImportReport()
+    while batch := list(islice(rows, batch_size)):
+        valid = []
+        for line, row in batch:
+            if isinstance(row, UnreadableFile):
+                message = f"Could not read the file from this line on: {row}"
+                report.add_error(line, {api_settings.NON_FIELD_ERRORS_KEY: [message]})
+                continue
+            if isinstance(row, Exception):
+                report.add_error(
+                    line, {api_settings.NON_FIELD_ERRORS_KEY: [f"Invalid JSON: {row}"]}
+                )
+                continue
+            try:
+                valid.append(validator.run_validation(row))
+            except serializers.ValidationError as exc:
+                report.add_error(line, exc.detail)
+        if valid:
+            _write_batch(valid, organizer, report)
+    return report
+
+
+def _write_batch(rows, organizer, report):
+    events = [
+        Event(
+            organizer=organizer,
+            **{column: row[column] for column in EVENT_COLUMNS if column in row},
+        )
+        for row in rows
+    ]
+    with transaction.atomic():
+        Event.objects.bulk_create(events)
+        tickets = Ticket.objects.bulk_create(
+            Ticket(event=event, **tier)
+            for event, row in zip(events, rows)
+            for tier in row.get("tickets", ())
+        )
+        # bulk_create sends no post_save, so invalidate the browse cache here
+        transaction.on_commit(browse_cache.invalidate)
+    report.events += len(events)
+    report.tickets += len(tickets)
@@ -0,0 +1,415 @@
+"""
+Per-view request metrics.
+
+InstrumentationMiddleware records, for every request, the wall time, the
+number and total time of database queries, the time spent serializing
+results, the time spent rendering the response body and its size. They are
+kept as Prometheus histograms labelled with the URL route and method, and
+served in Prometheus' text format by metrics_view at /metrics. Metrics are
+per process: scrape every worker, or sum them in Prometheus.
+
+Queries are counted by an execute wrapper added to each database connection,
+which records into the current request's RequestMetrics through a context
+variable, so queries run by async views through sync_to_async count too.
+With the "core.instrumentation" logger at DEBUG, statements a request runs
+N_PLUS_ONE times or more with the same SQL are logged as likely N+1 queries.
+
+Serialization is the time views spend in serializing() blocks, less the
+queries run meanwhile: lazy querysets are often evaluated there. The Timed*
+mixins below, versions of DRF's generic view mixins, wrap serializer.data in
+one; so do ProjectionMixin and the views reading serializer.data themselves.
+Rendering is the time response.render() takes to turn that data into bytes.
+
+Databases configured with a psycopg connection pool also get its statistics
+(size, idle connections, waiting requests, wait time, errors) as gauges and
+counters labelled with the database alias.
+
+The cost per request is a few timer reads and one histogram update per
+metric, and per query a context variable lookup; SQL is only kept when the
+debug log is on. With INSTRUMENTATION["ENABLED"] off the middleware removes
+itself from the stack.
+"""
+import bisect
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+from rest_framework import mixins, status, viewsets
+from rest_framework.response import Response
+
+from .middleware import HybridMiddleware
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "ENABLED": True,
+    "N_PLUS_ONE": 5,  # Runs of one SQL statement in a request logged as N+1
+    "METRICS_IPS": ("127.0.0.1", "::1"),  # Clients allowed to read /metrics
+}
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+# psycopg pool statistics: (get_stats() key, metric, type, help)
+POOL_STATS = (
+    ("pool_size", "db_pool_connections", "gauge", "Connections in the pool, in use or idle."),
+    ("pool_available", "db_pool_idle_connections", "gauge", "Idle connections in the pool."),
+    (
+        "requests_waiting",
+        "db_pool_waiting_requests",
+        "gauge",
+        "Requests waiting for a connection.",
+    ),
+    ("requests_num", "db_pool_requests_total", "counter", "Connections requested from the pool."),
+    (
+        "requests_wait_ms",
+        "db_pool_wait_milliseconds_total",
+        "counter",
+        "Time requests spent waiting for a connection.",
+    ),
+    (
+        "requests_errors",
+        "db_pool_request_errors_total",
+        "counter",
+        "Requests that got no connection, e.g. after the pool timeout.",
+    ),
+    (
+        "connections_lost",
+        "db_pool_connections_lost_total",
+        "counter",
+        "Connections that failed the health check.",
+    ),
+)
+
+
+def instrumentation_config():
+    return {**DEFAULTS, **getattr(settings, "INSTRUMENTATION", {})}
+
+
+class Histogram:
+    def __init__(self, name, description, buckets):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum, count]
+
+    def observe(self, labels, value):
+        # Callers hold the registry lock
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 3)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def exposition(self, label_names):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._series.items()):
+            base = ",".join(
+                f'{name}="{escape(value)}"' for name, value in zip(label_names, labels)
+            )
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{base}}} {series[-2]}")
+            lines.append(f"{self.name}_count{{{base}}} {series[-1]}")
+        return lines
+
+
+def escape(value):
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+class Metrics:
+    label_names = ("view", "method")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self.duration = Histogram(
+                "http_request_duration_seconds", "Request wall time.", DURATION_BUCKETS
+            )
+            self.queries = Histogram(
+                "http_request_db_queries", "Database queries per request.", QUERY_BUCKETS
+            )
+            self.db_duration = Histogram(
+                "http_request_db_duration_seconds",
+                "Time spent in database queries per request.",
+                DURATION_BUCKETS,
+            )
+            self.serialization_duration = Histogram(
+                "http_request_serialization_duration_seconds",
+                "Time spent serializing results, less database queries.",
+                DURATION_BUCKETS,
+            )
+            self.render_duration = Histogram(
+                "http_request_render_duration_seconds",
+                "Time spent rendering serialized data to the response body.",
+                DURATION_BUCKETS,
+            )
+            self.response_size = Histogram(
+                "http_response_size_bytes", "Response body size.", SIZE_BUCKETS
+            )
+
+    def record(self, labels, request_metrics, duration, size):
+        with self._lock:
+            self.duration.observe(labels, duration)
+            self.queries.observe(labels, request_metrics.queries)
+            self.db_duration.observe(labels, request_metrics.db_time)
+            self.serialization_duration.observe(labels, request_metrics.serialization_time)
+            self.render_duration.observe(labels, request_metrics.render_time)
+            if size is not None:  # Unknown for streaming responses
+                self.response_size.observe(labels, size)
+
+    def exposition(self):
+        with self._lock:
+            histograms = (
+                self.duration,
+                self.queries,
+                self.db_duration,
+                self.serialization_duration,
+                self.render_duration,
+                self.response_size,
+            )
+            lines = [
+                line for histogram in histograms
+                for line in histogram.exposition(self.label_names)
+            ]
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+@receiver(setting_changed)
+def reset_metrics(setting, **kwargs):
+    if setting == "INSTRUMENTATION":
+        metrics.clear()
+
+
+@dataclass(slots=True)
+class RequestMetrics:
+    statements: Counter = None  # Runs of each SQL statement, when tracked
+    queries: int = 0
+    db_time: float = 0.0
+    serialization_time: float = 0.0
+    serializing: bool = False  # Nested serializers are timed by the outer one
+    render_time: float = 0.0
+
+
+current_request = contextvars.ContextVar("current_request_metrics", default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    request_metrics = current_request.get()
+    if request_metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        request_metrics.db_time += time.perf_counter() - start
+        request_metrics.queries += 1
+        if request_metrics.statements is not None:
+            request_metrics.statements[sql] += 1
+
+
+def install_query_recorder(connection):
+    if record_query not in connection.execute_wrappers:
+        # First, as connection.execute_wrapper() removes the last one on exit
+        connection.execute_wrappers.insert(0, record_query)
+
+
+@receiver(connection_created)
+def connection_opened(connection, **kwargs):
+    install_query_recorder(connection)
+
+
+@contextlib.contextmanager
+def serializing():
+    """
+    Count the time spent in the block, less its queries, as serialization.
+    """
+    request_metrics = current_request.get()
+    if request_metrics is None or request_metrics.serializing:
+        yield
+        return
+    request_metrics.serializing = True
+    start, db_time = time.perf_counter(), request_metrics.db_time
+    try:
+        yield
+    finally:
+        request_metrics.serializing = False
+        request_metrics.serialization_time += (
+            time.perf_counter() - start - (request_metrics.db_time - db_time)
+        )
+
+
+class TimedCreateModelMixin(mixins.CreateModelMixin):
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        self.perform_create(serializer)
+        with serializing():
+            data = serializer.data
+        headers = self.get_success_headers(data)
+        return Response(data, status=status.HTTP_201_CREATED, headers=headers)
+
+
+class TimedListModelMixin(mixins.ListModelMixin):  # pylint: disable=too-few-public-methods
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(queryset if page is None else page, many=True)
+        with serializing():
+            data = serializer.data
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+class TimedRetrieveModelMixin(  # pylint: disable=too-few-public-methods
+    mixins.RetrieveModelMixin
+):
+    def retrieve(self, request, *args, **kwargs):
+        serializer = self.get_serializer(self.get_object())
+        with serializing():
+            data = serializer.data
+        return Response(data)
+
+
+class TimedUpdateModelMixin(mixins.UpdateModelMixin):
+    def update(self, request, *args, **kwargs):
+        partial = kwargs.pop("partial", False)
+        instance = self.get_object()
+        serializer = self.get_serializer(instance, data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+        if getattr(instance, "_prefetched_objects_cache", None):
+            # Prefetched relations are stale after the update, as in DRF
+            instance._prefetched_objects_cache = {}  # pylint: disable=protected-access
+        with serializing():
+            data = serializer.data
+        return Response(data)
+
+
+class TimedModelViewSet(  # pylint: disable=too-many-ancestors
+    TimedCreateModelMixin,
+    TimedRetrieveModelMixin,
+    TimedUpdateModelMixin,
+    mixins.DestroyModelMixin,
+    TimedListModelMixin,
+    viewsets.GenericViewSet,
+):
+    pass
+
+
+class InstrumentationMiddleware(HybridMiddleware):
+    @staticmethod
+    def enabled():
+        return instrumentation_config()["ENABLED"]
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        # Connections opened before the middleware was loaded
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+        request_metrics, token, start = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.finish(request, response, request_metrics, start)
+        return response
+
+    async def __acall__(self, request):
+        request_metrics, token, start = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.finish(request, response, request_metrics, start)
+        return response
+
+    def start(self):
+        # Statements are only counted for the N+1 log
+        track_statements = logger.isEnabledFor(logging.DEBUG)
+        request_metrics = RequestMetrics(statements=Counter() if track_statements else None)
+        return request_metrics, current_request.set(request_metrics), time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # Called right before a DRF or template response is rendered
+        request_metrics = current_request.get()
+        if request_metrics is not None:
+            start = time.perf_counter()
+
+            def rendered(_response):
+                request_metrics.render_time += time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def finish(self, request, response, request_metrics, start):
+        duration = time.perf_counter() - start
+        match = request.resolver_match
+        # Routes rather than paths keep the number of label values bounded
+        view = match.route if match is not None else "unmatched"
+        method = request.method if request.method in METHODS else "other"
+        size = None if response.streaming else len(response.content)
+        metrics.record((view, method), request_metrics, duration, size)
+
+        if request_metrics.statements:
+            threshold = instrumentation_config()["N_PLUS_ONE"]
+            for sql, count in request_metrics.statements.items():
+                if count >= threshold:
+                    logger.debug(
+                        "Possible N+1 in %s %s: %d runs of %s", method, view, count, sql
+                    )
+
+
+def connection_pools():
+    # (alias, pool) of the databases using psycopg's connection pool
+    for alias in connections:
+        connection = connections[alias]
+        if connection.vendor == "postgresql" and connection.settings_dict["OPTIONS"].get("pool"):
+            yield alias, connection.pool
+
+
+def pool_exposition():
+    stats = [(alias, pool.get_stats()) for alias, pool in connection_pools()]
+    if not stats:
+        return ""
+    lines = []
+    for key, name, kind, description in POOL_STATS:
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+        # Counters are left out of get_stats() until they are first incremented
+        lines += [
+            f'{name}{{alias="{escape(alias)}"}} {values.get(key, 0)}' for alias, values in stats
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    if request.META.get("REMOTE_ADDR") not in instrumentation_config()["METRICS_IPS"]:
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics.exposition() + pool_exposition(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
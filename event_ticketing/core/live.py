@@ -0,0 +1,249 @@
+"""
+Live ticket availability pushed to browsers as server-sent events.
+
+Committed stock changes reach the publisher through the inventory_changed
+signal, by way of a broker: LocalBroker hands them straight to the publisher
+of this process, while a broker backed by Redis pub/sub or similar would
+forward them to every worker. The publisher keeps one channel per event with
+subscribers. A channel reads the event's stock with a single query however
+many subscribers it has, at most once per LIVE_UPDATES["INTERVAL"] seconds,
+so a burst of purchases becomes one update. A failed read is logged and
+retried with exponential backoff, up to MAX_BACKOFF seconds apart.
+
+Idle subscribers cost one small object and a suspended coroutine each, so a
+worker can hold thousands of them. Streams are only served under ASGI: WSGI
+would read the endless stream to its end before sending a byte, holding a
+worker thread forever, so EventAvailabilityStreamView answers 501 there.
+"""
+import asyncio
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .models import Ticket
+
+DEFAULTS = {
+    "BROKER": "core.live.LocalBroker",
+    "INTERVAL": 1.0,  # Seconds between two updates of the same event
+    "KEEPALIVE": 15,  # Seconds of silence before a keep-alive comment is sent
+    "MAX_BACKOFF": 30,  # Seconds between retries of a channel whose reads fail
+}
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBroker:
+    """
+    In-process broker: changes only reach subscribers of the same worker.
+
+    A broker has `start(callback)`, called once with the function receiving
+    lists of event ids, and `publish(event_ids)`, called after every committed
+    stock change.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.callback = None
+
+    def start(self, callback):
+        self.callback = callback
+
+    def publish(self, event_ids):
+        if self.callback is not None:
+            self.callback(event_ids)
+
+
+async def fetch_availability(event_id):
+    tickets = Ticket.objects.with_remaining().filter(event_id=event_id).order_by("id")
+    return {
+        "event_id": event_id,
+        "tickets": [
+            {"id": ticket.id, "quantity_remaining": ticket.quantity_remaining}
+            async for ticket in tickets
+        ],
+    }
+
+
+class Subscriber:
+    def __init__(self, channel):
+        self.channel = channel
+        self.latest = channel.snapshot
+        self.version = channel.version
+        self._changed = asyncio.Event()
+        if self.latest is not None:
+            self._changed.set()
+
+    def push(self, snapshot, version):
+        # Only the newest snapshot is kept, so slow readers skip stale ones
+        self.latest, self.version = snapshot, version
+        self._changed.set()
+
+    async def next(self, timeout):
+        """
+        The next (version, snapshot), or None after `timeout` seconds without
+        a change.
+        """
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self._changed.clear()
+        return self.version, self.latest
+
+
+class Channel:  # pylint: disable=too-many-instance-attributes
+    """
+    Subscribers to one event on one event loop, and the task refreshing them.
+    """
+
+    def __init__(self, event_id, loop, interval, max_backoff):
+        self.event_id = event_id
+        self.loop = loop
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.subscribers = set()
+        self.snapshot = None
+        self.version = 0
+        self.refreshes = 0
+        self._dirty = asyncio.Event()
+        self._dirty.set()  # First subscriber gets the current stock
+        self._task = loop.create_task(self._run())
+
+    def mark_dirty(self):
+        self._dirty.set()
+
+    async def _run(self):
+        failures = 0
+        while True:
+            await self._dirty.wait()
+            self._dirty.clear()
+            try:
+                snapshot = await fetch_availability(self.event_id)
+            except Exception:  # pylint: disable=broad-exception-caught
+                failures += 1
+                delay = min(self.interval * 2**failures, self.max_backoff)
+                logger.exception(
+                    "Reading availability of event %s failed, retrying in %.1fs",
+                    self.event_id,
+                    delay,
+                )
+                self._dirty.set()
+                await asyncio.sleep(delay)
+                continue
+            failures = 0
+            self.refreshes += 1
+            if snapshot != self.snapshot:
+                self.snapshot = snapshot
+                self.version += 1
+                for subscriber in self.subscribers:
+                    subscriber.push(snapshot, self.version)
+            # Changes during the pause are sent together afterwards
+            await asyncio.sleep(self.interval)
+
+    def close(self):
+        self._task.cancel()
+
+
+class LivePublisher:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = {}  # (event_id, loop) -> Channel
+        self._broker = None
+
+    @property
+    def config(self):
+        return {**DEFAULTS, **getattr(settings, "LIVE_UPDATES", {})}
+
+    def get_broker(self):
+        # Started on first use, then kept until the settings change
+        if self._broker is None:
+            config = self.config
+            self._broker = import_string(config["BROKER"])(config)
+            self._broker.start(self.dispatch)
+        return self._broker
+
+    def reset(self):
+        self._broker = None
+
+    def publish(self, event_ids):
+        """
+        Announce committed stock changes. Safe to call from any thread.
+        """
+        self.get_broker().publish(list(event_ids))
+
+    def dispatch(self, event_ids):
+        # Called by the broker, usually from a thread other than the loops'
+        with self._lock:
+            channels = [
+                channel
+                for (event_id, _), channel in self._channels.items()
+                if event_id in event_ids
+            ]
+        for channel in channels:
+            try:
+                channel.loop.call_soon_threadsafe(channel.mark_dirty)
+            except RuntimeError:
+                pass  # Loop closed; its subscribers are gone
+
+    def subscribe(self, event_id):
+        self.get_broker()  # Start listening before the first snapshot is read
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            channel = self._channels.get((event_id, loop))
+            if channel is None:
+                config = self.config
+                channel = Channel(event_id, loop, config["INTERVAL"], config["MAX_BACKOFF"])
+                self._channels[event_id, loop] = channel
+            subscriber = Subscriber(channel)
+            channel.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        channel = subscriber.channel
+        with self._lock:
+            channel.subscribers.discard(subscriber)
+            if not channel.subscribers:
+                del self._channels[channel.event_id, channel.loop]
+                channel.close()
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(channel.subscribers) for channel in self._channels.values())
+
+
+live_publisher = LivePublisher()
+
+
+@receiver(setting_changed)
+def reset_live_publisher(setting, **kwargs):
+    if setting == "LIVE_UPDATES":
+        live_publisher.reset()
+
+
+def format_event(version, snapshot):
+    return f"id: {version}\nevent: availability\ndata: {json.dumps(snapshot)}\n\n"
+
+
+async def event_stream(event_id):
+    """
+    Server-sent events for one event until the client disconnects, which
+    cancels the generator.
+    """
+    keepalive = live_publisher.config["KEEPALIVE"]
+    subscriber = live_publisher.subscribe(event_id)
+    try:
+        # Tell EventSource how long to wait before reconnecting
+        yield "retry: 3000\n\n"
+        while True:
+            update = await subscriber.next(keepalive)
+            if update is None:
+                yield ": keepalive\n\n"
+            else:
+                yield format_event(*update)
+    finally:
+        live_publisher.unsubscribe(subscriber)
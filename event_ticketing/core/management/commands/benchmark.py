@@ -0,0 +1,152 @@
+import json
+import pkgutil
+import platform
+import subprocess
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from django.test.utils import (
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+
+from core import benchmarks
+
+BENCHMARKS = sorted(module.name for module in pkgutil.iter_modules(benchmarks.__path__))
+# Compared between runs by --compare
+COMPARED = ("mean_ms", "p95_ms", "p99_ms", "rps", "queries_per_request")
+
+
+def git(*args):
+    try:
+        result = subprocess.run(
+            ["git", *args], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a benchmark from core.benchmarks against a throwaway test database "
+        "and print its latency percentiles."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("benchmark", choices=BENCHMARKS)
+        parser.add_argument(
+            "--size",
+            type=int,
+            default=None,
+            help="Size of the generated data set (defaults to the benchmark's own).",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=50, help="Samples taken per measurement."
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="Reuse and keep the benchmark database between runs.",
+        )
+        parser.add_argument(
+            "--output",
+            metavar="PATH",
+            help="Also write the results, with the git commit they were run on, as JSON.",
+        )
+        parser.add_argument(
+            "--compare",
+            metavar="PATH",
+            help="Show the change from the results in a file written by --output.",
+        )
+
+    def handle(self, *args, **options):
+        module = import_module(f"core.benchmarks.{options['benchmark']}")
+        size = options["size"] or module.DEFAULT_SIZE
+        baseline = self.load(options["compare"]) if options["compare"] else None
+
+        setup_test_environment(debug=False)  # No query log, as in production
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options["keepdb"]
+        )
+        try:
+            # Generated load comes from a handful of clients, which rate limits
+            # would throttle; the throttling benchmark sets its own
+            with override_settings(RATE_LIMITS={"ENABLED": False}):
+                results = module.run(size=size, repeat=options["repeat"])
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options["keepdb"]
+            )
+            teardown_test_environment()
+
+        self.report(results)
+        run = {
+            "benchmark": options["benchmark"],
+            "size": size,
+            "repeat": options["repeat"],
+            "commit": git("rev-parse", "HEAD"),
+            # Uncommitted changes make the commit an incomplete description
+            "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "created_at": timezone.now().isoformat(),
+            "results": results,
+        }
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                json.dump(run, file, indent=2)
+        if baseline is not None:
+            self.compare(baseline, run)
+
+    def load(self, path):
+        try:
+            with open(path, encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Cannot read {path}: {exc}") from exc
+
+    def report(self, results):
+        columns = ("count", "mean_ms", "p50_ms", "p95_ms", "p99_ms")
+        width = max(len(row["name"]) for row in results)
+        self.stdout.write(f"{'name':<{width}}  " + "  ".join(f"{c:>9}" for c in columns))
+        for row in results:
+            values = "  ".join(
+                f"{row[c]:>9.2f}" if isinstance(row[c], float) else f"{row[c]:>9}"
+                for c in columns
+            )
+            extra = ", ".join(
+                f"{key}={value}" for key, value in row.items()
+                if key not in columns and key != "name"
+            )
+            self.stdout.write(f"{row['name']:<{width}}  {values}  {extra}")
+
+    def compare(self, baseline, run):
+        for key in ("benchmark", "size", "repeat", "database"):
+            if baseline.get(key) != run[key]:
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"Baseline {key} was {baseline.get(key)!r}, this run {run[key]!r}."
+                    )
+                )
+        commit = (baseline.get("commit") or "unknown")[:12]
+        self.stdout.write(f"\nChange from {commit} ({baseline.get('created_at')}):")
+
+        previous = {row["name"]: row for row in baseline.get("results", [])}
+        width = max(len(row["name"]) for row in run["results"])
+        for row in run["results"]:
+            before = previous.get(row["name"])
+            if before is None:
+                self.stdout.write(f"{row['name']:<{width}}  (not in baseline)")
+                continue
+            changes = []
+            for column in COMPARED:
+                old, new = before.get(column), row.get(column)
+                if isinstance(old, (int, float)) and isinstance(new, (int, float)) and old:
+                    changes.append(f"{column} {old:.2f} -> {new:.2f} ({(new - old) / old:+.1%})")
+            self.stdout.write(f"{row['name']:<{width}}  " + ", ".join(changes))
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.services import expire_holds
+
+
+class Command(BaseCommand):
+    help = (
+        "Give the seats of expired holds back to their tickets. Run it from cron, "
+        "or keep it running with --interval."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Holds released per transaction.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=None,
+            help="Keep sweeping, sleeping this many seconds between passes.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            released = expire_holds(batch_size=options["batch_size"])
+            if released or options["interval"] is None:
+                self.stdout.write(self.style.SUCCESS(f"Released {released} expired hold(s)."))
+            if options["interval"] is None:
+                return
+            time.sleep(options["interval"])
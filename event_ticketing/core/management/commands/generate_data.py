@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from authentication.models import User
+from core.benchmarks import generate_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with generated organizers, events, ticket tiers, "
+        "users and purchases for load testing. Purchases are spread over the "
+        "last --days days, with a few tiers taking most sales. Users are named "
+        "<prefix>organizer<n> and <prefix>user<n>, all with the same password."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--organizers", type=int, default=20)
+        parser.add_argument("--events", type=int, default=50, help="Events per organizer.")
+        parser.add_argument("--tiers", type=int, default=3, help="Ticket tiers per event.")
+        parser.add_argument("--users", type=int, default=2_000)
+        parser.add_argument("--purchases", type=int, default=100_000)
+        parser.add_argument("--days", type=int, default=90)
+        parser.add_argument(
+            "--skew",
+            type=float,
+            default=1.2,
+            help="Zipf exponent of tier popularity; 0 spreads sales evenly.",
+        )
+        parser.add_argument(
+            "--seed", type=int, default=None, help="Generate the same data on every run."
+        )
+        parser.add_argument("--prefix", default="loadtest-")
+        parser.add_argument("--password", default="loadtest-password")
+
+    def handle(self, *args, **options):
+        prefix = options["prefix"]
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(
+                f"Users named {prefix}* already exist; use another --prefix."
+            )
+
+        with transaction.atomic():
+            dataset = generate_dataset(
+                organizers=options["organizers"],
+                events_per_organizer=options["events"],
+                tiers_per_event=options["tiers"],
+                users=options["users"],
+                purchases=options["purchases"],
+                prefix=prefix,
+                password=options["password"],
+                days=options["days"],
+                skew=options["skew"],
+                seed=options["seed"],
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {len(dataset.organizers)} organizer(s), {len(dataset.events)} "
+                f"event(s), {len(dataset.tickets)} ticket tier(s), {len(dataset.buyers)} "
+                f"user(s) and {options['purchases'] if dataset.tickets else 0} purchase(s)."
+            )
+        )
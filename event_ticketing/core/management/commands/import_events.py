@@ -0,0 +1,60 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from core.imports import FORMATS, detect_format, import_events
+
+
+class Command(BaseCommand):
+    help = (
+        "Import events with their ticket tiers from a CSV or JSON-lines file. "
+        "CSV files have one row per ticket tier with the event columns repeated; "
+        "JSON-lines files have one event per line with a \"tickets\" list. "
+        "Invalid rows are reported and skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help='File to import, or "-" for standard input.')
+        parser.add_argument(
+            "--organizer", required=True, help="Username of the organizer who owns the events."
+        )
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="File format (defaults to the file extension, else CSV).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Rows validated and written per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            organizer = User.objects.get(username=options["organizer"])
+        except User.DoesNotExist as exc:
+            raise CommandError(f"No user named {options['organizer']!r}.") from exc
+        if not organizer.is_organizer():
+            raise CommandError(f"{organizer.username} is not an organizer.")
+
+        path = options["path"]
+        file_format = options["format"] or detect_format(path)
+        if path == "-":
+            report = import_events(sys.stdin, organizer, file_format, options["batch_size"])
+        else:
+            with open(path, encoding="utf-8-sig", newline="") as lines:
+                report = import_events(lines, organizer, file_format, options["batch_size"])
+
+        for error in report.errors:
+            self.stderr.write(f"Line {error['line']}: {error['errors']}")
+        if report.failed > len(report.errors):
+            self.stderr.write(f"... and {report.failed - len(report.errors)} more.")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {report.events} event(s) and {report.tickets} ticket tier(s); "
+                f"{report.failed} row(s) failed."
+            )
+        )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core.idempotency import purge_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete stored Idempotency-Key responses older than "
+        "settings.IDEMPOTENCY_KEY_TTL. Run it from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="Keys deleted per query."
+        )
+
+    def handle(self, *args, **options):
+        deleted = purge_idempotency_keys(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired key(s)."))
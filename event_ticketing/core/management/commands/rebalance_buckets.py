@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Ticket
+from core.services import rebalance_buckets
+
+
+class Command(BaseCommand):
+    help = (
+        "Split the remaining stock of ticket tiers evenly across inventory "
+        "buckets. Use --buckets 0 to fold a tier back into a single row."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("ticket_ids", nargs="+", type=int)
+        parser.add_argument(
+            "--buckets",
+            type=int,
+            default=None,
+            help="Number of buckets to use (defaults to the tier's current count).",
+        )
+
+    def handle(self, *args, **options):
+        bucket_count = options["buckets"]
+        if bucket_count is not None and not 0 <= bucket_count <= 1000:
+            raise CommandError("--buckets must be between 0 and 1000.")
+
+        for ticket_id in options["ticket_ids"]:
+            try:
+                ticket = Ticket.objects.get(pk=ticket_id)
+            except Ticket.DoesNotExist as exc:
+                raise CommandError(f"Ticket {ticket_id} does not exist.") from exc
+
+            ticket = rebalance_buckets(ticket, bucket_count)
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Ticket {ticket.pk}: {ticket.quantity_remaining} remaining "
+                    f"across {ticket.bucket_count} bucket(s)."
+                )
+            )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.analytics import rebuild_sales_rollup, verify_sales_rollup
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the sales rollup used by the analytics endpoint from the raw "
+        "purchases, or check it with --verify. Rebuilding replaces the whole "
+        "table in one transaction, so run it outside on-sale peaks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only report ticket/hour rows that do not match their purchases.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["verify"]:
+            created = rebuild_sales_rollup()
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {created} rollup row(s)."))
+            return
+
+        mismatches = verify_sales_rollup()
+        for ticket_id, day, hour, expected, actual in mismatches:
+            self.stdout.write(
+                f"Ticket {ticket_id} on {day} {hour:02}:00: expected {expected[0]} sold / "
+                f"{expected[1]}, rollup has {actual[0]} sold / {actual[1]}"
+            )
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} rollup row(s) out of date.")
+        self.stdout.write(self.style.SUCCESS("Sales rollup matches purchases."))
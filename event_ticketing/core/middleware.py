@@ -0,0 +1,25 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import MiddlewareNotUsed
+
+
+class HybridMiddleware:  # pylint: disable=too-few-public-methods
+    """
+    Base for middleware that runs in sync and async stacks alike. Subclasses
+    call `__acall__` from `__call__` when `async_mode` is set, and return
+    False from `enabled()` to leave the stack.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not self.enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def enabled():
+        return True
@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-18 17:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_ticket_quantity_sold_purchase'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='bucket_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='InventoryBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveSmallIntegerField()),
+                ('quantity_available', models.PositiveIntegerField(default=0)),
+                ('quantity_sold', models.PositiveIntegerField(default=0)),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='core.ticket')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('ticket', 'index'), name='unique_inventory_bucket_index')],
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2 on 2026-10-18 18:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_sales_rollup(apps, schema_editor):
+    Purchase = apps.get_model("core", "Purchase")
+    SalesRollup = apps.get_model("core", "SalesRollup")
+    rows = (
+        Purchase.objects.annotate(day=TruncDate("purchase_time"))
+        .values("ticket", "ticket__event", "ticket__event__organizer", "day")
+        .annotate(tickets_sold=Sum("quantity"), sales=Sum("total_price"))
+        .order_by()
+    )
+    SalesRollup.objects.bulk_create(
+        (
+            SalesRollup(
+                organizer_id=row["ticket__event__organizer"],
+                event_id=row["ticket__event"],
+                ticket_id=row["ticket"],
+                day=row["day"],
+                tickets_sold=row["tickets_sold"],
+                sales=row["sales"],
+            )
+            for row in rows
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_event_purchase_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('shard', models.PositiveSmallIntegerField(default=0)),
+                ('tickets_sold', models.PositiveIntegerField(default=0)),
+                ('sales', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.event')),
+                ('organizer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('ticket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_rollups', to='core.ticket')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['organizer', 'day'], name='rollup_organizer_day_idx'), models.Index(fields=['event', 'day'], name='rollup_event_day_idx'), models.Index(fields=['day'], name='rollup_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ticket', 'day', 'shard'), name='unique_sales_rollup_bucket')],
+            },
+        ),
+        migrations.RunPython(backfill_sales_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-18 18:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_salesrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='salesrollup',
+            name='unique_sales_rollup_bucket',
+        ),
+        migrations.AddField(
+            model_name='salesrollup',
+            name='hour',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name='salesrollup',
+            constraint=models.UniqueConstraint(fields=('ticket', 'day', 'hour', 'shard'), name='unique_sales_rollup_hour_bucket'),
+        ),
+    ]
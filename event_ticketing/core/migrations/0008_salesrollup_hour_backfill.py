@@ -0,0 +1,48 @@
+# The backfill runs in its own migration: on PostgreSQL, altering a table
+# in the same transaction as the rows written to it fails with "pending
+# trigger events"
+
+from django.db import migrations
+from django.db.models import Sum
+from django.db.models.functions import ExtractHour, TruncDate
+
+
+def rebuild_hourly_sales_rollup(apps, schema_editor):
+    # Existing rows were daily; recompute them per hour from the purchases
+    Purchase = apps.get_model("core", "Purchase")
+    SalesRollup = apps.get_model("core", "SalesRollup")
+    SalesRollup.objects.all().delete()
+    rows = (
+        Purchase.objects.annotate(
+            day=TruncDate("purchase_time"), hour=ExtractHour("purchase_time")
+        )
+        .values("ticket", "ticket__event", "ticket__event__organizer", "day", "hour")
+        .annotate(tickets_sold=Sum("quantity"), sales=Sum("total_price"))
+        .order_by()
+    )
+    SalesRollup.objects.bulk_create(
+        (
+            SalesRollup(
+                organizer_id=row["ticket__event__organizer"],
+                event_id=row["ticket__event"],
+                ticket_id=row["ticket"],
+                day=row["day"],
+                hour=row["hour"],
+                tickets_sold=row["tickets_sold"],
+                sales=row["sales"],
+            )
+            for row in rows
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_salesrollup_hour'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_hourly_sales_rollup, migrations.RunPython.noop),
+    ]
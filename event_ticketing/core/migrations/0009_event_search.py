@@ -0,0 +1,112 @@
+from django.db import migrations
+
+POSTGRESQL_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "ALTER TABLE core_event ADD COLUMN search_vector tsvector",
+    """
+    CREATE FUNCTION core_event_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.event_name, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.location, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER core_event_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF event_name, location, description ON core_event
+    FOR EACH ROW EXECUTE FUNCTION core_event_search_vector_update()
+    """,
+    # Fire the trigger once for the existing rows
+    "UPDATE core_event SET event_name = event_name",
+    "CREATE INDEX core_event_search_vector_idx ON core_event USING gin (search_vector)",
+    "CREATE INDEX core_event_name_trgm_idx ON core_event USING gin (event_name gin_trgm_ops)",
+]
+
+POSTGRESQL_BACKWARD = [
+    "DROP TRIGGER IF EXISTS core_event_search_vector_trigger ON core_event",
+    "DROP FUNCTION IF EXISTS core_event_search_vector_update()",
+    "DROP INDEX IF EXISTS core_event_name_trgm_idx",
+    "ALTER TABLE core_event DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE core_event_fts USING fts5(
+        event_name, description, location,
+        content='core_event', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    "CREATE VIRTUAL TABLE core_event_fts_vocab USING fts5vocab(core_event_fts, 'row')",
+    """
+    CREATE TRIGGER core_event_fts_insert AFTER INSERT ON core_event BEGIN
+        INSERT INTO core_event_fts (rowid, event_name, description, location)
+        VALUES (new.id, new.event_name, new.description, new.location);
+    END
+    """,
+    """
+    CREATE TRIGGER core_event_fts_delete AFTER DELETE ON core_event BEGIN
+        INSERT INTO core_event_fts (core_event_fts, rowid, event_name, description, location)
+        VALUES ('delete', old.id, old.event_name, old.description, old.location);
+    END
+    """,
+    """
+    CREATE TRIGGER core_event_fts_update AFTER UPDATE ON core_event BEGIN
+        INSERT INTO core_event_fts (core_event_fts, rowid, event_name, description, location)
+        VALUES ('delete', old.id, old.event_name, old.description, old.location);
+        INSERT INTO core_event_fts (rowid, event_name, description, location)
+        VALUES (new.id, new.event_name, new.description, new.location);
+    END
+    """,
+    "INSERT INTO core_event_fts (core_event_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS core_event_fts_insert",
+    "DROP TRIGGER IF EXISTS core_event_fts_delete",
+    "DROP TRIGGER IF EXISTS core_event_fts_update",
+    "DROP TABLE IF EXISTS core_event_fts_vocab",
+    "DROP TABLE IF EXISTS core_event_fts",
+]
+
+
+def _sqlite_has_fts5(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        return bool(cursor.fetchone()[0])
+
+
+def create_search_index(apps, schema_editor):
+    # The search index is maintained by the database itself, so bulk_create
+    # and raw SQL writes are indexed too. Other databases fall back to
+    # icontains filtering in core.search.
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        statements = POSTGRESQL_FORWARD
+    elif vendor == "sqlite" and _sqlite_has_fts5(schema_editor):
+        statements = SQLITE_FORWARD
+    else:
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {"postgresql": POSTGRESQL_BACKWARD, "sqlite": SQLITE_BACKWARD}
+    for statement in statements.get(vendor, []):
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_salesrollup_hour_backfill'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2 on 2026-10-18 18:27
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_event_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(django.db.models.functions.text.Lower('location'), models.F('date'), models.F('time'), name='event_location_date_idx'),
+        ),
+    ]
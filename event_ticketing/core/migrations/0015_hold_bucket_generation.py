@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 19:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_replicationheartbeat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hold',
+            name='bucket_generation',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='bucket_generation',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
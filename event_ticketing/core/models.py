@@ -1,5 +1,17 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import F, OuterRef, Prefetch, Subquery, Sum
+from django.db.models.functions import Lower
 from django.conf import settings
+from django.utils import timezone
+
+
+class EventQuerySet(models.QuerySet):
+    def with_tickets(self):
+        # Everything EventSerializer touches, in a bounded number of queries
+        return self.select_related("organizer").prefetch_related(
+            Prefetch("tickets", queryset=Ticket.objects.with_remaining())
+        )
 
 
 class Event(models.Model):
@@ -11,28 +23,103 @@ class Event(models.Model):
     date = models.DateField()
     time = models.TimeField()
     location = models.CharField(max_length=255)
+    # Buyers let through the waiting room per second (None: the default rate)
+    admission_rate = models.PositiveIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = EventQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Sort key of the browse endpoint's keyset pagination, also used by
+            # the date range and upcoming filters
+            models.Index(fields=["date", "time", "id"], name="event_date_time_id_idx"),
+            # Case-insensitive location filters, in upcoming order
+            models.Index(
+                Lower("location"), "date", "time", name="event_location_date_idx"
+            ),
+        ]
+
     def __str__(self) -> str:
         return str(self.event_name)
 
 
+def bucket_remaining(ticket):
+    """
+    Subquery summing the unsold stock in the inventory buckets of the ticket
+    `ticket` (an OuterRef) points to.
+    """
+    return Subquery(
+        InventoryBucket.objects.filter(ticket=ticket)
+        .values("ticket")
+        .annotate(remaining=Sum(F("quantity_available") - F("quantity_sold")))
+        .values("remaining")
+    )
+
+
+class TicketQuerySet(models.QuerySet):
+    def with_remaining(self):
+        # Sum the inventory buckets of sharded tickets in the same query
+        return self.annotate(bucket_remaining=bucket_remaining(OuterRef("pk")))
+
+
 class Ticket(models.Model):
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="tickets")
     ticket_type = models.CharField(max_length=100)  # e.g., 'General Admission', 'VIP'
     price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity_available = models.PositiveIntegerField(default=0)
     quantity_sold = models.PositiveIntegerField(default=0)
+    # Number of inventory buckets the remaining stock is split across (0 = not sharded)
+    bucket_count = models.PositiveSmallIntegerField(default=0)
+    # Rebalances so far; each folds the buckets' sales into quantity_sold
+    bucket_generation = models.PositiveIntegerField(default=0)
+
+    objects = TicketQuerySet.as_manager()
 
     @property
     def quantity_remaining(self):
-        return self.quantity_available - self.quantity_sold
+        if not self.bucket_count:
+            return self.quantity_available - self.quantity_sold
+        # Sharded tickets keep their unsold stock in the buckets
+        if hasattr(self, "bucket_remaining"):
+            return self.bucket_remaining or 0
+        if "buckets" in getattr(self, "_prefetched_objects_cache", {}):
+            return sum(bucket.quantity_remaining for bucket in self.buckets.all())
+        remaining = self.buckets.aggregate(
+            remaining=Sum(F("quantity_available") - F("quantity_sold"))
+        )["remaining"]
+        return remaining or 0
 
     def __str__(self):
         return f"{self.ticket_type} for {self.event.event_name}"
 
 
+class InventoryBucket(models.Model):
+    """
+    A slice of a hot ticket tier's stock, so concurrent purchases can be spread
+    across several rows instead of all waiting on the ticket row lock.
+    """
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name="buckets")
+    index = models.PositiveSmallIntegerField()
+    quantity_available = models.PositiveIntegerField(default=0)
+    quantity_sold = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["ticket", "index"], name="unique_inventory_bucket_index"
+            )
+        ]
+
+    @property
+    def quantity_remaining(self):
+        return self.quantity_available - self.quantity_sold
+
+    def __str__(self):
+        return f"Bucket {self.index} of ticket {self.ticket_id}"
+
+
 class Purchase(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="purchases"
@@ -44,9 +131,114 @@ class Purchase(models.Model):
     purchase_time = models.DateTimeField(auto_now_add=True)
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        indexes = [
+            # A user's purchase history in keyset pagination order
+            models.Index(
+                fields=["user", "-purchase_time", "id"],
+                name="purchase_user_time_id_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.quantity} x {self.ticket.ticket_type} for {self.user.email}"
 
     def save(self, *args, **kwargs):
         self.total_price = self.quantity * self.ticket.price
         super().save(*args, **kwargs)
+
+
+class Hold(models.Model):
+    """
+    Seats set aside while a buyer pays. The seats are taken from the ticket
+    (or one of its buckets) when the hold is made, so they already count
+    against quantity_remaining. Confirming turns the hold into a Purchase;
+    the expire_holds sweeper gives expired holds' seats back.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="holds"
+    )
+    ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name="holds")
+    quantity = models.PositiveIntegerField()
+    # Inventory bucket the seats came from (None for unsharded tickets), and
+    # the ticket's bucket_generation at the time
+    shard = models.PositiveSmallIntegerField(null=True, blank=True)
+    bucket_generation = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)  # Range-scanned by the sweeper
+
+    def __str__(self):
+        return f"Hold of {self.quantity} x ticket {self.ticket_id} until {self.expires_at}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    The outcome of a request sent with an Idempotency-Key header, replayed
+    when a client retries it. A row without a status code is still running,
+    or crashed if claimed more than IDEMPOTENCY_KEY_LEASE seconds ago.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)  # Hash of method, path and body
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(default=timezone.now)  # Renewed when a retry takes over
+    expires_at = models.DateTimeField(db_index=True)  # Range-scanned by the purge
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="unique_idempotency_key")
+        ]
+
+    def __str__(self):
+        return f"Idempotency key {self.key!r} of user {self.user_id}"
+
+
+class SalesRollup(models.Model):
+    """
+    Tickets sold and sales per ticket tier and hour, updated by every purchase
+    in the purchase's transaction. Hot sharded tiers write one row per
+    inventory bucket (`shard`) so the rollup does not become a new hot row.
+    """
+    organizer = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+"
+    )
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="+")
+    ticket = models.ForeignKey(
+        Ticket, on_delete=models.CASCADE, related_name="sales_rollups"
+    )
+    day = models.DateField()
+    hour = models.PositiveSmallIntegerField(default=0)
+    shard = models.PositiveSmallIntegerField(default=0)
+    tickets_sold = models.PositiveIntegerField(default=0)
+    sales = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["ticket", "day", "hour", "shard"],
+                name="unique_sales_rollup_hour_bucket",
+            )
+        ]
+        indexes = [
+            models.Index(fields=["organizer", "day"], name="rollup_organizer_day_idx"),
+            models.Index(fields=["event", "day"], name="rollup_event_day_idx"),
+            models.Index(fields=["day"], name="rollup_day_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.tickets_sold} x ticket {self.ticket_id} on {self.day} {self.hour}:00"
+
+
+class ReplicationHeartbeat(models.Model):
+    """
+    A single row core.replicas rewrites on the primary every few seconds. How
+    old the copy on a replica is tells how far that replica lags behind.
+    """
+    beat = models.DateTimeField()
+
+    def __str__(self):
+        return f"Heartbeat at {self.beat}"
@@ -0,0 +1,260 @@
+import base64
+import binascii
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    BasePagination,
+    LimitOffsetPagination,
+    PageNumberPagination,
+)
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a composite sort key. The cursor holds the key of the
+    last row served and the next page is fetched with a WHERE clause on that
+    key, so with a matching index every page costs the same as the first one.
+    """
+
+    ordering = ()  # e.g. ("date", "time", "id"); the last field must be unique
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def __init__(self):
+        # Set per page by prepare_page() and finish_page()
+        self.request = None
+        self.reverse = False
+        self.has_next = self.has_previous = False
+        self.page = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset, position = self.prepare_page(queryset, request, view)
+        return self.finish_page(list(page_queryset), position)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # Same as paginate_queryset, fetching the page with the async ORM
+        page_queryset, position = self.prepare_page(queryset, request, view)
+        return self.finish_page([row async for row in page_queryset], position)
+
+    def prepare_page(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        # Views may swap the sort key per request, e.g. to order by search rank
+        self.ordering = getattr(view, "keyset_ordering", None) or type(self).ordering
+        position, self.reverse = self.decode_cursor(request, queryset.model)
+        return self.get_page_queryset(queryset, position, self.reverse), position
+
+    def finish_page(self, page, position):
+        has_more = len(page) > self.page_size
+        page = page[: self.page_size]
+        if self.reverse:
+            page.reverse()
+
+        # Moving backwards, "more" rows lie before the page; forwards, after it
+        if self.reverse:
+            self.has_next, self.has_previous = bool(page), has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.page = page
+        return page
+
+    def get_page_queryset(self, queryset, position, reverse=False):
+        ordering = self.get_ordering(reverse)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(ordering, position))
+        return queryset[: self.page_size + 1]
+
+    def get_ordering(self, reverse=False):
+        if not reverse:
+            return self.ordering
+        return tuple(
+            field[1:] if field.startswith("-") else f"-{field}" for field in self.ordering
+        )
+
+    def get_position_filter(self, ordering, position):
+        # (a, b, c) after (x, y, z) expands to
+        #   a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        # plus a redundant a >= x bound so the index scan starts at the cursor.
+        clauses = []
+        for index, field in enumerate(ordering):
+            name, lookup = self._field_lookup(field)
+            equal = {
+                previous.lstrip("-"): position[i]
+                for i, previous in enumerate(ordering[:index])
+            }
+            clauses.append(Q(**equal, **{f"{name}__{lookup}": position[index]}))
+
+        name, lookup = self._field_lookup(ordering[0], inclusive=True)
+        return Q(**{f"{name}__{lookup}": position[0]}) & reduce(or_, clauses)
+
+    @staticmethod
+    def _field_lookup(field, inclusive=False):
+        descending = field.startswith("-")
+        lookup = "lt" if descending else "gt"
+        return field.lstrip("-"), f"{lookup}e" if inclusive else lookup
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            values = data["p"]
+            if len(values) != len(self.ordering):
+                raise ValueError
+            position = [
+                self.decode_position_value(model, field.lstrip("-"), value)
+                for field, value in zip(self.ordering, values)
+            ]
+            return position, bool(data.get("r"))
+        except (
+            TypeError,
+            ValueError,
+            KeyError,
+            binascii.Error,
+            UnicodeEncodeError,
+            DjangoValidationError,
+        ) as exc:
+            raise NotFound(self.invalid_cursor_message) from exc
+
+    @staticmethod
+    def decode_position_value(model, field, value):
+        try:
+            return model._meta.get_field(field).to_python(value)
+        except FieldDoesNotExist:
+            # Annotations such as a search rank are numbers
+            return float(value)
+
+    def encode_cursor(self, item, reverse=False):
+        values = [
+            self.get_position_value(item, field.lstrip("-")) for field in self.ordering
+        ]
+        data = {
+            "p": [
+                value.isoformat() if hasattr(value, "isoformat") else value
+                for value in values
+            ]
+        }
+        if reverse:
+            data["r"] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(data, separators=(",", ":")).encode())
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded.decode("ascii"))
+
+    @staticmethod
+    def get_position_value(item, field):
+        if isinstance(item, dict):
+            return item[field]
+        return getattr(item, field)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # Walked past the end: go back to the start of the list
+            url = self.request.build_absolute_uri()
+            return remove_query_param(url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def to_html(self):
+        # The browsable API shows no page controls, the links are in the body
+        return ""
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results to return per page.",
+                "schema": {"type": "integer"},
+            },
+        ]
+
+
+class EventKeysetPagination(KeysetPagination):
+    ordering = ("date", "time", "id")
+
+
+class PurchaseKeysetPagination(KeysetPagination):
+    ordering = ("-purchase_time", "id")
+
+
+class PageSizePagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class LimitPagination(LimitOffsetPagination):
+    default_limit = 20
+    max_limit = 100
+
+
+def get_pagination_class(mode, keyset_class):
+    """
+    Map a pagination mode from settings ("keyset", "page", "limit" or None)
+    to the paginator class a view should use.
+    """
+    if mode is None:
+        return None
+    if mode == "keyset":
+        return keyset_class
+    if mode == "page":
+        return PageSizePagination
+    if mode == "limit":
+        return LimitPagination
+    raise ValueError(f"Unknown pagination mode: {mode!r}")
@@ -1,18 +1,21 @@
 from rest_framework import permissions
 
+from authentication.jwt import request_role
+
+
 class IsOrganizer(permissions.BasePermission):
     """
     Custom permission to only allow organizers to access a view.
     """
     def has_permission(self, request, view):
-        return request.user and request.user.is_authenticated and request.user.is_organizer()
+        return request_role(request) == "organizer"
 
 class IsUser(permissions.BasePermission):
     """
     Custom permission to only allow regular users to access a view.
     """
     def has_permission(self, request, view):
-        return request.user and request.user.is_authenticated and request.user.is_user()
+        return request_role(request) == "user"
 
 class IsOrganizerOrReadOnly(permissions.BasePermission):
     """
@@ -21,4 +24,4 @@ class IsOrganizerOrReadOnly(permissions.BasePermission):
     def has_permission(self, request, view):
         if request.method in permissions.SAFE_METHODS:
             return True
-        return request.user and request.user.is_authenticated and request.user.is_organizer()
\ No newline at end of file
+        return request_role(request) == "organizer"
\ No newline at end of file
@@ -0,0 +1,180 @@
+"""
+Fast path for the hot read endpoints: rows are fetched as `.values()` dicts
+and turned into the response with plain dict building, instead of model
+instances going through ModelSerializer field by field.
+
+The output is the same, value for value and key for key, as EventSerializer
+and PurchaseSerializer, which stay the documented schema of these endpoints.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db.models import OuterRef
+from django.http import Http404
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .instrumentation import serializing
+from .models import Ticket, bucket_remaining
+
+CENTS = Decimal("0.01")
+
+
+def decimal_string(value):
+    # As serializers.DecimalField(decimal_places=2) renders it
+    return format(value.quantize(CENTS), "f")
+
+
+def datetime_string(value):
+    # As serializers.DateTimeField renders it: current time zone, "Z" for UTC
+    value = timezone.localtime(value).isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+def remaining(available, sold, bucket_count, bucket_total):
+    # Ticket.quantity_remaining for a row
+    if not bucket_count:
+        return available - sold
+    return bucket_total or 0
+
+
+class EventProjection:
+    # What EventSerializer renders, with the organizer as its username
+    fields = ("id", "event_name", "description", "date", "time", "location", "organizer__username")
+    ticket_fields = (
+        "id",
+        "event_id",
+        "ticket_type",
+        "price",
+        "quantity_available",
+        "quantity_sold",
+        "bucket_count",
+        "bucket_remaining",
+    )
+
+    def values(self, queryset, extra=()):
+        # `extra` carries sort keys the paginator reads, e.g. search_rank
+        fields = self.fields + tuple(name for name in extra if name not in self.fields)
+        return queryset.select_related(None).prefetch_related(None).values(*fields)
+
+    def serialize(self, rows):
+        rows = list(rows)
+        tickets = defaultdict(list)
+        if rows:
+            ticket_rows = (
+                Ticket.objects.with_remaining()
+                .filter(event_id__in=[row["id"] for row in rows])
+                .values_list(*self.ticket_fields)
+            )
+            for pk, event_id, ticket_type, price, available, sold, count, total in ticket_rows:
+                tickets[event_id].append(
+                    {
+                        "id": pk,
+                        "ticket_type": ticket_type,
+                        "price": decimal_string(price),
+                        "quantity_remaining": remaining(available, sold, count, total),
+                    }
+                )
+        return [
+            {
+                "id": row["id"],
+                "event_name": row["event_name"],
+                "description": row["description"],
+                "date": row["date"].isoformat(),
+                "time": row["time"].isoformat(),
+                "location": row["location"],
+                "organizer": row["organizer__username"],
+                "tickets": tickets[row["id"]],
+            }
+            for row in rows
+        ]
+
+
+class PurchaseProjection:
+    fields = (
+        "id",
+        "quantity",
+        "total_price",
+        "purchase_time",
+        "ticket_id",
+        "ticket__ticket_type",
+        "ticket__price",
+        "ticket__quantity_available",
+        "ticket__quantity_sold",
+        "ticket__bucket_count",
+        "ticket_bucket_remaining",
+    )
+
+    def values(self, queryset, extra=()):
+        fields = self.fields + tuple(name for name in extra if name not in self.fields)
+        return (
+            queryset.select_related(None)
+            .prefetch_related(None)
+            .annotate(ticket_bucket_remaining=bucket_remaining(OuterRef("ticket_id")))
+            .values(*fields)
+        )
+
+    def serialize(self, rows):
+        return [
+            {
+                "id": row["id"],
+                "ticket": {
+                    "id": row["ticket_id"],
+                    "ticket_type": row["ticket__ticket_type"],
+                    "price": decimal_string(row["ticket__price"]),
+                    "quantity_remaining": remaining(
+                        row["ticket__quantity_available"],
+                        row["ticket__quantity_sold"],
+                        row["ticket__bucket_count"],
+                        row["ticket_bucket_remaining"],
+                    ),
+                },
+                "quantity": row["quantity"],
+                "total_price": decimal_string(row["total_price"]),
+                "purchase_time": datetime_string(row["purchase_time"]),
+            }
+            for row in rows
+        ]
+
+
+class ProjectionMixin:
+    """
+    Answer list() (and retrieve() on viewsets) from `projection` rather than
+    the serializer. The serializer class still describes the schema.
+    """
+
+    projection = None
+
+    def get_projection_values(self, queryset):
+        # The paginator reads its sort key from the rows
+        ordering = getattr(self, "keyset_ordering", None) or getattr(
+            self.paginator, "ordering", ()
+        )
+        return self.projection.values(queryset, [field.lstrip("-") for field in ordering])
+
+    def list(self, request, *args, **kwargs):
+        rows = self.get_projection_values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        with serializing():
+            data = self.projection.serialize(rows if page is None else page)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: kwargs[lookup_url_kwarg]}
+            )
+        except (TypeError, ValueError, ValidationError) as exc:
+            # Malformed lookup values are a 404, as in get_object()
+            raise Http404 from exc
+        with serializing():
+            data = self.projection.serialize(self.projection.values(queryset)[:1])
+        if not data:
+            raise Http404
+        return Response(data[0])
@@ -0,0 +1,256 @@
+"""
+Read-replica routing for the read-only endpoints.
+
+Views with ReplicaReadMixin (browsing, purchase history, analytics) read from
+one of the READ_REPLICAS["ALIASES"] databases on GET, HEAD and OPTIONS
+requests; everything else, writes always, goes to the primary. The choice is
+made per request and kept in a context variable set by ReplicaMiddleware,
+which ReplicaRouter consults.
+
+Two things send a read back to the primary:
+
+- Read-your-writes: a request that wrote anything pins its user to the
+  primary for STICKY_SECONDS, through a shared cache, so the purchase history
+  fetched right after a purchase contains it. Within a request, reads after
+  a write go to the primary as well.
+- Lag: every CHECK_INTERVAL seconds each process compares the
+  ReplicationHeartbeat row on every replica with the one on the primary, then
+  rewrites the primary's. Replicas more than MAX_LAG seconds behind, or not
+  reachable, are left out until a later check finds them caught up; with none
+  left, reads use the primary.
+
+Results kept longer than a replica may lag, like browse cache entries, are
+read from the primary with read_from_primary(): a replica could still return
+rows from before the change that invalidated the previous entry.
+
+Pins must live in a cache shared by every worker (Redis in production); with
+a per-process cache such as LocMemCache a user's next request may reach a
+worker that does not know about the write.
+
+Under test, point replica aliases at the primary with TEST["MIRROR"] so they
+see the test's data.
+"""
+import contextvars
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import DEFAULT_DB_ALIAS, DatabaseError
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.permissions import SAFE_METHODS
+
+from .middleware import HybridMiddleware
+from .models import ReplicationHeartbeat
+
+PRIMARY = DEFAULT_DB_ALIAS
+
+DEFAULTS = {
+    "ALIASES": [],
+    "STICKY_SECONDS": 10,  # Seconds a user who wrote reads from the primary
+    "MAX_LAG": 5,  # Seconds a replica may be behind the primary
+    "CHECK_INTERVAL": 2,  # Seconds between two lag checks of a process
+    "CACHE_ALIAS": "default",  # Pins; shared between workers in production
+}
+
+logger = logging.getLogger(__name__)
+
+
+def replica_config():
+    return {**DEFAULTS, **getattr(settings, "READ_REPLICAS", {})}
+
+
+@dataclass
+class RouteState:
+    """
+    Where the current request reads from, and whether it wrote.
+    """
+
+    read_db: str = None  # The primary until a view picks a replica
+    wrote: bool = False
+
+
+current_route = contextvars.ContextVar("current_route", default=None)
+
+
+def read_from_primary():
+    """
+    Send the rest of the current request's reads to the primary.
+    """
+    state = current_route.get()
+    if state is not None:
+        state.read_db = None
+
+
+class ReplicaRouter:
+    # Every model is routed alike, so the model and hints go unused
+    # pylint: disable=unused-argument
+
+    def db_for_read(self, model, **hints):
+        state = current_route.get()
+        if state is None or state.wrote or state.read_db is None:
+            return PRIMARY
+        return state.read_db
+
+    def db_for_write(self, model, **hints):
+        state = current_route.get()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {PRIMARY, *replica_config()["ALIASES"]}
+        # pylint: disable-next=protected-access
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaSet:
+    def __init__(self):
+        self.clock = time.monotonic
+        self._lock = threading.Lock()
+        self._healthy = []
+        self._checked_at = None
+
+    def reset(self):
+        self._healthy = []
+        self._checked_at = None
+
+    @property
+    def cache(self):
+        return caches[replica_config()["CACHE_ALIAS"]]
+
+    def healthy(self):
+        """
+        Replicas that were caught up at the last check, checking again when
+        CHECK_INTERVAL has passed.
+        """
+        config = replica_config()
+        if not config["ALIASES"]:
+            return []
+        with self._lock:
+            now = self.clock()
+            if self._checked_at is None or now - self._checked_at >= config["CHECK_INTERVAL"]:
+                self._healthy = self.check(config)
+                self._checked_at = now
+            return self._healthy
+
+    def check(self, config):
+        def beat(alias):
+            return (
+                ReplicationHeartbeat.objects.using(alias)
+                .filter(pk=1)
+                .values_list("beat", flat=True)
+                .first()
+            )
+
+        latest = beat(PRIMARY)
+        healthy = []
+        for alias in config["ALIASES"]:
+            try:
+                replica_beat = beat(alias)
+            except DatabaseError:
+                logger.warning("Replica %s is unreachable", alias, exc_info=True)
+                continue
+            if latest is None:
+                lag = 0  # Nothing written yet, so nothing to be behind on
+            elif replica_beat is None:
+                lag = None
+            else:
+                lag = (latest - replica_beat).total_seconds()
+            if lag is not None and lag <= config["MAX_LAG"]:
+                healthy.append(alias)
+            else:
+                logger.warning("Replica %s is lagging (%s seconds)", alias, lag)
+        ReplicationHeartbeat.objects.using(PRIMARY).update_or_create(
+            pk=1, defaults={"beat": timezone.now()}
+        )
+        return healthy
+
+    def pin_key(self, user):
+        return f"replica-pin:{user.pk}"
+
+    def pin(self, user):
+        self.cache.set(self.pin_key(user), True, replica_config()["STICKY_SECONDS"])
+
+    def pinned(self, user):
+        return bool(user.is_authenticated and self.cache.get(self.pin_key(user)))
+
+    def choose(self, user):
+        """
+        The database a read-only request by `user` reads from.
+        """
+        if self.pinned(user):
+            return PRIMARY
+        healthy = self.healthy()
+        return random.choice(healthy) if healthy else PRIMARY
+
+
+replicas = ReplicaSet()
+
+
+@receiver(setting_changed)
+def reset_replicas(setting, **kwargs):
+    if setting == "READ_REPLICAS":
+        replicas.reset()
+
+
+class ReplicaMiddleware(HybridMiddleware):
+    """
+    Keep a RouteState per request, and pin users whose request wrote to the
+    primary. Removes itself when no replicas are configured.
+    """
+
+    @staticmethod
+    def enabled():
+        return bool(replica_config()["ALIASES"])
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = RouteState()
+        token = current_route.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_route.reset(token)
+        if state.wrote:
+            self.pin(request)
+        return response
+
+    async def __acall__(self, request):
+        state = RouteState()
+        token = current_route.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_route.reset(token)
+        if state.wrote:
+            await sync_to_async(self.pin)(request)
+        return response
+
+    def pin(self, request):
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            replicas.pin(user)
+
+
+class ReplicaReadMixin:  # pylint: disable=too-few-public-methods
+    """
+    Read safe requests from a caught up replica, unless the user recently
+    wrote. Only the view's own queries move; authentication has already run.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        state = current_route.get()
+        if state is not None and request.method in SAFE_METHODS:
+            state.read_db = replicas.choose(request.user)
@@ -0,0 +1,118 @@
+import difflib
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+MAX_TERMS = 8
+
+
+def search_terms(query):
+    return re.findall(r"\w+", query.lower())[:MAX_TERMS]
+
+
+def search_events(queryset, query):
+    """
+    Full-text search over event name, location and description, with prefix
+    matching and typo tolerance. Matches are annotated with `search_rank`
+    (higher is better).
+
+    PostgreSQL uses the trigger-maintained core_event.search_vector column
+    (GIN) plus pg_trgm word similarity (`<%`) on the name; SQLite uses the
+    core_event_fts FTS5 index. Both are created by migration 0008.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset
+
+    vendor = connections[queryset.db].vendor
+    if vendor == "postgresql":
+        return _search_postgresql(queryset, terms)
+    if vendor == "sqlite" and _has_fts_table(queryset.db):
+        return _search_sqlite(queryset, terms, queryset.db)
+    return _search_fallback(queryset, terms)
+
+
+def _search_postgresql(queryset, terms):
+    tsquery = " & ".join(f"{term}:*" for term in terms)
+    phrase = " ".join(terms)
+    matches = RawSQL(
+        "core_event.search_vector @@ to_tsquery('english', %s)"
+        " OR %s <%% core_event.event_name",
+        [tsquery, phrase],
+        output_field=BooleanField(),
+    )
+    rank = RawSQL(
+        "ts_rank(core_event.search_vector, to_tsquery('english', %s))"
+        " + word_similarity(%s, core_event.event_name)",
+        [tsquery, phrase],
+        output_field=FloatField(),
+    )
+    return queryset.filter(matches).annotate(search_rank=rank)
+
+
+def _search_sqlite(queryset, terms, using):
+    match = " AND ".join(_fts_term(term, using) for term in terms)
+    # Join the FTS5 table so MATCH runs once per query rather than per row.
+    # bm25() is lower-is-better; weights favour the name, then the location
+    return queryset.extra(
+        tables=["core_event_fts"],
+        where=["core_event_fts.rowid = core_event.id", "core_event_fts MATCH %s"],
+        params=[match],
+    ).annotate(
+        search_rank=RawSQL(
+            "-bm25(core_event_fts, 10.0, 1.0, 5.0)", [], output_field=FloatField()
+        )
+    )
+
+
+def _fts_term(term, using):
+    # Prefix match, plus indexed words within a small edit distance of the term
+    alternatives = [f'"{term}"*']
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT term FROM core_event_fts_vocab WHERE term >= %s AND term < %s",
+            [term[:1], term[:1] + "\uffff"],
+        )
+        vocabulary = [row[0] for row in cursor.fetchall()]
+    if term not in vocabulary:
+        alternatives += [
+            f'"{word}"' for word in difflib.get_close_matches(term, vocabulary, n=3, cutoff=0.75)
+        ]
+    return "(" + " OR ".join(alternatives) + ")"
+
+
+_fts_tables = {}
+
+
+def _has_fts_table(using):
+    # The FTS5 index is only created where SQLite was built with FTS5
+    if using not in _fts_tables:
+        tables = connections[using].introspection.table_names()
+        _fts_tables[using] = "core_event_fts" in tables
+    return _fts_tables[using]
+
+
+def _search_fallback(queryset, terms):
+    for term in terms:
+        queryset = queryset.filter(
+            Q(event_name__icontains=term)
+            | Q(location__icontains=term)
+            | Q(description__icontains=term)
+        )
+    return queryset.annotate(search_rank=RawSQL("0", [], output_field=FloatField()))
+
+
+class EventSearchFilter(filters.SearchFilter):
+    """
+    Drop-in replacement for SearchFilter on the `search` parameter that uses
+    the ranked full-text index instead of ILIKE '%term%' scans.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, "")
+        if not search_terms(query):
+            return queryset
+        return search_events(queryset, query).order_by("-search_rank", "id")
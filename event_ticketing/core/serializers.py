@@ -1,5 +1,17 @@
+import datetime
+import math
+
 from rest_framework import serializers
-from .models import Event, Ticket, Purchase
+from rest_framework.settings import api_settings
+
+from .admission import waiting_room
+from .analytics import INTERVALS
+from .models import Event, Hold, Ticket, Purchase
+from .services import InsufficientInventory, checkout, hold_tickets, purchase_tickets
+
+# The plain Serializers below only validate input or shape output, none of
+# them saves through create() or update()
+# pylint: disable=abstract-method
 
 
 # ================ Ticket Serializers ================ #
@@ -17,6 +29,14 @@ class TicketCreateUpdateSerializer(serializers.ModelSerializer):
         # 'event' will be set based on the URL or view logic
         fields = ("ticket_type", "price", "quantity_available")
 
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        # Only write the edited columns so concurrent sales to quantity_sold
+        # are not overwritten with the value read at the start of the request
+        instance.save(update_fields=list(validated_data))
+        return instance
+
 
 # =============== Event Serializers =============== #
 class EventSerializer(serializers.ModelSerializer):
@@ -43,7 +63,32 @@ class EventCreateUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Event
         # Organizer will be automatically set based on the logged-in user
-        fields = ("event_name", "description", "date", "time", "location")
+        fields = ("event_name", "description", "date", "time", "location", "admission_rate")
+
+
+class EventImportSerializer(EventCreateUpdateSerializer):
+    # One row of a bulk import: an event with its ticket tiers
+    tickets = TicketCreateUpdateSerializer(many=True, required=False)
+
+    class Meta(EventCreateUpdateSerializer.Meta):
+        fields = EventCreateUpdateSerializer.Meta.fields + ("tickets",)
+
+
+class EventImportUploadSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    format = serializers.ChoiceField(
+        choices=("csv", "jsonl"),
+        required=False,
+        help_text="Defaults to the file extension: .jsonl/.ndjson for JSON lines, else CSV.",
+    )
+    batch_size = serializers.IntegerField(required=False, min_value=1, max_value=5000)
+
+
+class EventImportReportSerializer(serializers.Serializer):
+    created_events = serializers.IntegerField()
+    created_tickets = serializers.IntegerField()
+    failed_rows = serializers.IntegerField()
+    errors = serializers.ListField(child=serializers.DictField())
 
 
 # =============== Purchase Serializers =============== #
@@ -69,19 +114,124 @@ class TicketPurchaseSerializer(serializers.Serializer):
         quantity = self.validated_data["quantity"]
         user = self.context["request"].user  # Get the current user from the request
 
-        # Create the Purchase record
-        purchase = Purchase.objects.create(
-            user=user,
-            ticket=ticket,
-            quantity=quantity,
-            total_price=quantity * ticket.price,
+        # The check in validate() is only an early reject; the purchase engine
+        # re-checks the stock atomically while decrementing it
+        try:
+            purchase = purchase_tickets(user, ticket, quantity)
+        except InsufficientInventory as exc:
+            raise serializers.ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: ["Not enough tickets available."]}
+            ) from exc
+
+        return purchase
+
+
+class QueueJoinSerializer(serializers.Serializer):
+    event_id = serializers.PrimaryKeyRelatedField(
+        queryset=Event.objects.only("id", "admission_rate"), write_only=True
+    )
+    token = serializers.CharField(read_only=True)
+    wait_seconds = serializers.IntegerField(read_only=True)
+
+    def create(self, validated_data):
+        event = validated_data["event_id"]
+        queued = waiting_room.join(
+            event.pk, self.context["request"].user.pk, rate=event.admission_rate
         )
+        return {
+            "token": queued.token,
+            "wait_seconds": max(0, math.ceil(queued.window - waiting_room.clock())),
+        }
 
-        # Update the ticket's quantity sold
-        ticket.quantity_sold += quantity
-        ticket.save()
 
-        return purchase
+class QueueStatusSerializer(serializers.Serializer):
+    event_id = serializers.IntegerField()
+    admitted = serializers.BooleanField()
+    wait_seconds = serializers.IntegerField()
+
+
+class CheckoutItemSerializer(serializers.Serializer):
+    ticket_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class CheckoutPurchaseSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Purchase
+        fields = ("id", "ticket", "quantity", "total_price", "purchase_time")
+
+
+class CheckoutSerializer(serializers.Serializer):
+    MAX_ITEMS = 20
+
+    items = CheckoutItemSerializer(many=True, allow_empty=False, max_length=MAX_ITEMS)
+    purchases = CheckoutPurchaseSerializer(many=True, read_only=True)
+    total_price = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+    def validate_items(self, items):
+        # Every tier of the cart in one query, instead of one per line item
+        ids = {item["ticket_id"] for item in items}
+        tickets = Ticket.objects.select_related("event").in_bulk(ids)
+        missing = sorted(ids - tickets.keys())
+        if missing:
+            raise serializers.ValidationError(f"Invalid ticket ids: {missing}.")
+
+        requested = {}
+        for item in items:
+            item["ticket"] = tickets[item["ticket_id"]]
+            requested[item["ticket_id"]] = requested.get(item["ticket_id"], 0) + item["quantity"]
+        # Early reject only; checkout() re-checks the stock atomically. Sharded
+        # tiers are left to it rather than summing their buckets here
+        for ticket_id, quantity in requested.items():
+            ticket = tickets[ticket_id]
+            if not ticket.bucket_count and quantity > ticket.quantity_remaining:
+                raise serializers.ValidationError(
+                    f"Not enough tickets available for ticket {ticket_id}."
+                )
+        return items
+
+    def create(self, validated_data):
+        user = self.context["request"].user
+        items = [(item["ticket"], item["quantity"]) for item in validated_data["items"]]
+        try:
+            purchases = checkout(user, items)
+        except InsufficientInventory as exc:
+            raise serializers.ValidationError(
+                {
+                    api_settings.NON_FIELD_ERRORS_KEY: [
+                        f"Not enough tickets available for ticket {exc.args[0]}."
+                    ]
+                }
+            )
+        return {
+            "items": validated_data["items"],
+            "purchases": purchases,
+            "total_price": sum(purchase.total_price for purchase in purchases),
+        }
+
+
+class HoldSerializer(serializers.ModelSerializer):
+    ticket_id = serializers.PrimaryKeyRelatedField(
+        source="ticket", queryset=Ticket.objects.select_related("event")
+    )
+    quantity = serializers.IntegerField(min_value=1)
+
+    class Meta:
+        model = Hold
+        fields = ("id", "ticket_id", "quantity", "expires_at")
+        read_only_fields = ("expires_at",)
+
+    def create(self, validated_data):
+        try:
+            return hold_tickets(
+                self.context["request"].user,
+                validated_data["ticket"],
+                validated_data["quantity"],
+            )
+        except InsufficientInventory as exc:
+            raise serializers.ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: ["Not enough tickets available."]}
+            ) from exc
 
 
 class PurchaseSerializer(serializers.ModelSerializer):
@@ -97,3 +247,51 @@ class AnalyticsSerializer(serializers.Serializer):
     total_tickets_sold = serializers.IntegerField()
     total_sales = serializers.DecimalField(max_digits=10, decimal_places=2)
     number_of_events = serializers.IntegerField()
+
+
+class EventSalesSerializer(serializers.Serializer):
+    event_id = serializers.IntegerField(source="event")
+    event_name = serializers.CharField(source="event__event_name")
+    tickets_sold = serializers.IntegerField()
+    sales = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class TicketTypeSalesSerializer(serializers.Serializer):
+    ticket_type = serializers.CharField(source="ticket__ticket_type")
+    tickets_sold = serializers.IntegerField()
+    sales = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class SalesPeriodSerializer(serializers.Serializer):
+    period = serializers.SerializerMethodField()
+    tickets_sold = serializers.IntegerField()
+    sales = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+    def get_period(self, obj) -> str:
+        # Hourly periods are datetimes, daily and weekly ones are dates
+        if isinstance(obj["period"], datetime.datetime):
+            return serializers.DateTimeField().to_representation(obj["period"])
+        return serializers.DateField().to_representation(obj["period"])
+
+
+class AnalyticsBreakdownSerializer(AnalyticsSerializer):
+    interval = serializers.CharField()
+    by_event = EventSalesSerializer(many=True)
+    by_ticket_type = TicketTypeSalesSerializer(many=True)
+    series = SalesPeriodSerializer(many=True)
+
+
+class AnalyticsFilterSerializer(serializers.Serializer):
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    event = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, attrs):
+        if attrs.get("date_from") and attrs.get("date_to"):
+            if attrs["date_from"] > attrs["date_to"]:
+                raise serializers.ValidationError("date_from must not be after date_to.")
+        return attrs
+
+
+class AnalyticsBreakdownFilterSerializer(AnalyticsFilterSerializer):
+    interval = serializers.ChoiceField(choices=INTERVALS, default="day")
@@ -0,0 +1,328 @@
+import datetime
+import random
+from collections import Counter
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Hold, InventoryBucket, Purchase, SalesRollup, Ticket
+from .signals import send_inventory_changed
+
+
+class InsufficientInventory(Exception):
+    """
+    Raised when a ticket tier cannot cover the requested quantity.
+    """
+
+
+class HoldExpired(Exception):
+    """
+    Raised when confirming a hold that has expired or was already released.
+    """
+
+
+def reserve_tickets(ticket, quantity):
+    """
+    Take `quantity` from the ticket's stock. Returns the bucket index used for
+    a sharded tier, None otherwise.
+
+    `ticket` may have been loaded before rebalance_buckets sharded or
+    un-sharded the tier. Each UPDATE only matches the layout it expects, and
+    when it finds no stock the current layout is read and tried once more.
+    """
+    bucket_count = ticket.bucket_count
+    for _ in range(2):
+        if bucket_count:
+            index = _reserve_from_buckets(ticket.pk, bucket_count, quantity)
+            if index is not None:
+                return index
+        # A single conditional UPDATE: the database checks the remaining stock
+        # and increments quantity_sold atomically, so concurrent buyers can
+        # never oversell and only the quantity_sold column is written. Once
+        # sharded, the row's remaining stock belongs to the buckets.
+        elif Ticket.objects.filter(
+            pk=ticket.pk,
+            bucket_count=0,
+            quantity_available__gte=F("quantity_sold") + quantity,
+        ).update(quantity_sold=F("quantity_sold") + quantity):
+            return None
+
+        current = Ticket.objects.filter(pk=ticket.pk).values_list("bucket_count", flat=True)
+        current = current.first()
+        if current is None or current == bucket_count:
+            break
+        bucket_count = current
+
+    raise InsufficientInventory(ticket.pk)
+
+
+def _reserve_from_buckets(ticket_id, bucket_count, quantity):
+    # Start at a random bucket so concurrent buyers land on different rows,
+    # then fall back to the others in turn. Returns the bucket index used, or
+    # None when no bucket has enough left.
+    start = random.randrange(bucket_count)
+    for offset in range(bucket_count):
+        index = (start + offset) % bucket_count
+        updated = InventoryBucket.objects.filter(
+            ticket_id=ticket_id,
+            index=index,
+            quantity_available__gte=F("quantity_sold") + quantity,
+        ).update(quantity_sold=F("quantity_sold") + quantity)
+        if updated:
+            return index
+    return None
+
+
+def purchase_tickets(user, ticket, quantity):
+    purchase = Purchase(
+        user=user,
+        ticket=ticket,
+        quantity=quantity,
+        total_price=quantity * ticket.price,
+    )
+
+    with transaction.atomic():
+        # Insert first so the hot ticket row is only locked for the
+        # conditional UPDATE, the rollup increment and the COMMIT.
+        purchase.save()
+        shard = reserve_tickets(ticket, quantity)
+        record_sale(purchase, shard or 0)
+
+    return purchase
+
+
+def checkout(user, items):
+    """
+    Buy several ticket tiers at once: `items` is a list of (ticket, quantity)
+    pairs. Either every line is bought or, if any tier runs out, none is.
+    Returns the created purchases in ticket id order.
+    """
+    quantities = {}
+    tickets = {}
+    for ticket, quantity in items:
+        quantities[ticket.pk] = quantities.get(ticket.pk, 0) + quantity
+        tickets[ticket.pk] = ticket
+
+    # Always take the ticket rows in id order, so two carts sharing tiers wait
+    # on each other instead of deadlocking
+    purchases = [
+        Purchase(
+            user=user,
+            ticket=tickets[pk],
+            quantity=quantities[pk],
+            total_price=quantities[pk] * tickets[pk].price,
+        )
+        for pk in sorted(quantities)
+    ]
+
+    with transaction.atomic():
+        # As in purchase_tickets, insert before taking any ticket row lock
+        Purchase.objects.bulk_create(purchases)
+        shards = [reserve_tickets(p.ticket, p.quantity) for p in purchases]
+        for purchase, shard in zip(purchases, shards):
+            record_sale(purchase, shard or 0)
+        # bulk_create sends no post_save
+        send_inventory_changed(p.ticket.event_id for p in purchases)
+
+    return purchases
+
+
+def release_tickets(ticket_id, quantity, shard=None, generation=None):
+    # Give reserved seats back to the bucket they were taken from, as long as
+    # no rebalance (a new bucket_generation) has folded that bucket's sales
+    # into the ticket row since. Otherwise give them back there; the next
+    # rebalance spreads them over the buckets again.
+    if shard is not None:
+        released = InventoryBucket.objects.filter(
+            ticket_id=ticket_id,
+            ticket__bucket_generation=generation,
+            index=shard,
+            quantity_sold__gte=quantity,
+        ).update(quantity_sold=F("quantity_sold") - quantity)
+        if released:
+            return
+    Ticket.objects.filter(pk=ticket_id).update(quantity_sold=F("quantity_sold") - quantity)
+
+
+def hold_tickets(user, ticket, quantity, ttl=None):
+    """
+    Take `quantity` seats off sale for `ttl` seconds (settings.HOLD_TTL by
+    default) while the buyer pays.
+    """
+    ttl = settings.HOLD_TTL if ttl is None else ttl
+    with transaction.atomic():
+        shard = reserve_tickets(ticket, quantity)
+        generation = None
+        if shard is not None:
+            # A rebalance needs the bucket row this transaction now holds, so
+            # the generation cannot move before the hold is saved
+            generation = (
+                Ticket.objects.filter(pk=ticket.pk)
+                .values_list("bucket_generation", flat=True)
+                .get()
+            )
+        hold = Hold.objects.create(
+            user=user,
+            ticket=ticket,
+            quantity=quantity,
+            shard=shard,
+            bucket_generation=generation,
+            expires_at=timezone.now() + datetime.timedelta(seconds=ttl),
+        )
+        send_inventory_changed([ticket.event_id])
+    return hold
+
+
+def confirm_hold(hold):
+    """
+    Turn a hold into a Purchase. The seats were taken when the hold was made,
+    so only the purchase and its rollup entry are written.
+    """
+    with transaction.atomic():
+        # The row lock keeps the sweeper from releasing the hold meanwhile
+        locked = (
+            Hold.objects.select_for_update()
+            .filter(pk=hold.pk, expires_at__gt=timezone.now())
+            .first()
+        )
+        if locked is None:
+            raise HoldExpired(hold.pk)
+
+        purchase = Purchase.objects.create(
+            user_id=locked.user_id, ticket=hold.ticket, quantity=locked.quantity
+        )
+        record_sale(purchase, locked.shard or 0)
+        locked.delete()
+    return purchase
+
+
+@transaction.atomic
+def release_hold(hold):
+    deleted, _ = Hold.objects.filter(pk=hold.pk).delete()
+    if deleted:
+        release_tickets(hold.ticket_id, hold.quantity, hold.shard, hold.bucket_generation)
+        send_inventory_changed([hold.ticket.event_id])
+    return bool(deleted)
+
+
+def expire_holds(batch_size=1000, now=None):
+    """
+    Release every hold that expired before `now`, `batch_size` holds per
+    transaction. Returns the number of holds released.
+    """
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            # Holds being confirmed are locked and skipped; the expiry index
+            # turns this into a range scan from the oldest hold
+            batch = list(
+                Hold.objects.filter(expires_at__lte=now)
+                .order_by("expires_at")
+                .select_for_update(skip_locked=True, of=("self",))
+                .values_list(
+                    "pk",
+                    "ticket_id",
+                    "shard",
+                    "bucket_generation",
+                    "quantity",
+                    "ticket__event_id",
+                )
+                [:batch_size]
+            )
+            if not batch:
+                break
+
+            # One UPDATE per ticket (or bucket) rather than one per hold, in
+            # ticket id order like every other writer
+            totals = Counter()
+            for _, ticket_id, shard, generation, quantity, _ in batch:
+                totals[ticket_id, shard, generation] += quantity
+            for ticket_id, shard, generation in sorted(
+                totals, key=lambda key: tuple(-1 if part is None else part for part in key)
+            ):
+                release_tickets(
+                    ticket_id, totals[ticket_id, shard, generation], shard, generation
+                )
+
+            Hold.objects.filter(pk__in=[row[0] for row in batch]).delete()
+            send_inventory_changed(row[5] for row in batch)
+        released += len(batch)
+        if len(batch) < batch_size:
+            break
+    return released
+
+
+def record_sale(purchase, shard=0):
+    # Must run inside the purchase's transaction so the rollup never drifts
+    # from the Purchase rows it summarises
+    ticket = purchase.ticket
+    purchase_time = timezone.localtime(purchase.purchase_time)
+    day, hour = purchase_time.date(), purchase_time.hour
+    rollup = SalesRollup.objects.filter(
+        ticket_id=ticket.pk, day=day, hour=hour, shard=shard
+    )
+    increment = {
+        "tickets_sold": F("tickets_sold") + purchase.quantity,
+        "sales": F("sales") + purchase.total_price,
+    }
+
+    if rollup.update(**increment):
+        return
+    try:
+        # Savepoint, so losing the race to create the row keeps the purchase
+        with transaction.atomic():
+            SalesRollup.objects.create(
+                organizer_id=ticket.event.organizer_id,
+                event_id=ticket.event_id,
+                ticket_id=ticket.pk,
+                day=day,
+                hour=hour,
+                shard=shard,
+                tickets_sold=purchase.quantity,
+                sales=purchase.total_price,
+            )
+    except IntegrityError:
+        rollup.update(**increment)
+
+
+@transaction.atomic
+def rebalance_buckets(ticket, bucket_count=None):
+    """
+    Fold the sales recorded in a ticket's buckets back into the ticket row and
+    split what is left evenly across `bucket_count` buckets (0 un-shards it).
+    """
+    ticket = Ticket.objects.select_for_update().get(pk=ticket.pk)
+    if bucket_count is None:
+        bucket_count = ticket.bucket_count
+
+    buckets = list(ticket.buckets.select_for_update().order_by("index"))
+    sold = ticket.quantity_sold + sum(bucket.quantity_sold for bucket in buckets)
+    remaining = max(ticket.quantity_available - sold, 0)
+
+    ticket.quantity_sold = sold
+    ticket.bucket_count = bucket_count
+    # Holds taken from the old buckets are now released to the ticket row
+    ticket.bucket_generation += 1
+    ticket.save(update_fields=["quantity_sold", "bucket_count", "bucket_generation"])
+
+    # Existing buckets are updated in place so purchases waiting on their row
+    # locks retry against the new stock instead of a deleted row
+    share, extra = divmod(remaining, bucket_count) if bucket_count else (0, 0)
+    existing = {bucket.index: bucket for bucket in buckets}
+    to_create = []
+    for index in range(bucket_count):
+        bucket = existing.pop(index, None) or InventoryBucket(ticket=ticket, index=index)
+        bucket.quantity_available = share + (1 if index < extra else 0)
+        bucket.quantity_sold = 0
+        if bucket.pk:
+            bucket.save(update_fields=["quantity_available", "quantity_sold"])
+        else:
+            to_create.append(bucket)
+
+    InventoryBucket.objects.bulk_create(to_create)
+    InventoryBucket.objects.filter(pk__in=[b.pk for b in existing.values()]).delete()
+
+    return ticket
@@ -0,0 +1,50 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from .cache import browse_cache
+from .live import live_publisher
+from .models import Event, Purchase, Ticket
+
+# Sent once the stock of the given events' ticket tiers has changed and the
+# change is committed. Arguments: event_ids
+inventory_changed = Signal()
+
+
+def send_inventory_changed(event_ids):
+    event_ids = sorted(set(event_ids))
+    transaction.on_commit(
+        lambda: inventory_changed.send(sender=Ticket, event_ids=event_ids)
+    )
+
+
+@receiver(post_save, sender=Purchase)
+def purchase_saved(instance, created, **kwargs):
+    if created:
+        send_inventory_changed([instance.ticket.event_id])
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(post_save, sender=Ticket)
+@receiver(post_delete, sender=Ticket)
+def catalogue_changed(**kwargs):
+    transaction.on_commit(browse_cache.invalidate)
+
+
+@receiver(post_save, sender=Ticket)
+@receiver(post_delete, sender=Ticket)
+def ticket_changed(instance, **kwargs):
+    # Tiers are part of the event resource, so they change its ETag
+    Event.objects.filter(pk=instance.event_id).update(updated_at=timezone.now())
+
+
+@receiver(inventory_changed)
+def mark_browse_cache_sold(event_ids, **kwargs):
+    browse_cache.mark_sold(event_ids)
+
+
+@receiver(inventory_changed)
+def publish_live_updates(event_ids, **kwargs):
+    live_publisher.publish(event_ids)
@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class StoreBacked:
+    """
+    Base for services keeping their state in a pluggable store. `config` is
+    `defaults` updated with the `setting` dict, and `store` an instance of
+    config["STORE"], made on first use and dropped by reset().
+    """
+
+    setting = None
+    defaults = {}
+
+    def __init__(self):
+        self.clock = time.time
+        self._store = None
+
+    @property
+    def config(self):
+        return {**self.defaults, **getattr(settings, self.setting, {})}
+
+    @property
+    def store(self):
+        if self._store is None:
+            config = self.config
+            self._store = import_string(config["STORE"])(config)
+        return self._store
+
+    def reset(self):
+        self._store = None
@@ -1,3 +1,1994 @@
-from django.test import TestCase
+# pylint: disable=too-many-lines
+import asyncio
+import datetime
+import json
+import os
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from authentication.models import User
+from .admission import waiting_room
+from .analytics import verify_sales_rollup
+from .cache import browse_cache
+from .filters import EventFilter
+from .idempotency import claim_key, release_key, store_outcome
+from .instrumentation import InstrumentationMiddleware, metrics
+from . import live
+from .live import format_event, live_publisher
+from .projections import EventProjection, PurchaseProjection
+from .renderers import FastJSONRenderer
+from .serializers import EventSerializer, PurchaseSerializer
+from .models import (
+    Event,
+    Hold,
+    IdempotencyKey,
+    Purchase,
+    ReplicationHeartbeat,
+    SalesRollup,
+    Ticket,
+)
+from .replicas import (
+    PRIMARY,
+    ReplicaMiddleware,
+    ReplicaRouter,
+    RouteState,
+    current_route,
+    replicas,
+)
+from .throttling import CacheBucketStore, LocalBucketStore, rate_limiter
+from .services import (
+    HoldExpired,
+    InsufficientInventory,
+    confirm_hold,
+    hold_tickets,
+    purchase_tickets,
+    rebalance_buckets,
+    release_hold,
+)
+
+
+NO_BROWSE_CACHE = {"ENABLED": False}
+# Buckets outlive a test and ids are reused, so tests that are not about rate
+# limits turn them off
+NO_RATE_LIMITS = {"ENABLED": False}
+
+
+def make_event(organizer, **kwargs):
+    fields = {
+        "event_name": "Concert",
+        "description": "Live music",
+        "date": datetime.date(2030, 1, 1),
+        "time": datetime.time(20, 0),
+        "location": "Yangon",
+    }
+    fields.update(kwargs)
+    return Event.objects.create(organizer=organizer, **fields)
+
+
+@override_settings(RATE_LIMITS=NO_RATE_LIMITS)
+class PurchaseEngineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.organizer = User.objects.create_user(
+            username="org", email="org@example.com", role="organizer"
+        )
+        cls.buyer = User.objects.create_user(username="buyer", email="buyer@example.com")
+        cls.ticket = Ticket.objects.create(
+            event=make_event(cls.organizer),
+            ticket_type="General Admission",
+            price=Decimal("10.00"),
+            quantity_available=5,
+        )
+
+    def test_purchase_decrements_stock(self):
+        purchase = purchase_tickets(self.buyer, self.ticket, 3)
+
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.quantity_sold, 3)
+        self.assertEqual(purchase.total_price, Decimal("30.00"))
+
+    def test_purchase_never_oversells(self):
+        purchase_tickets(self.buyer, self.ticket, 4)
+
+        with self.assertRaises(InsufficientInventory):
+            purchase_tickets(self.buyer, self.ticket, 2)
+
+        self.ticket.refresh_from_db()
+        self.assertEqual(self.ticket.quantity_sold, 4)
+        self.assertEqual(Purchase.objects.count(), 1)
+
+    def test_purchase_endpoint_rejects_stale_stock(self):
+        client = APIClient()
+        client.force_authenticate(self.buyer)
+        # Another buyer takes the stock after validation has already passed
+        Ticket.objects.filter(pk=self.ticket.pk).update(quantity_sold=5)
+
+        response = client.post(
+            reverse("ticket_purchase"),
+            {"ticket_id": self.ticket.pk, "quantity": 1},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Purchase.objects.count(), 0)
+
+
+class CheckoutTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        organizer = User.objects.create_user(
+            username="org", email="org@example.com", role="organizer"
+        )
+        cls.buyer = User.objects.create_user(username="buyer", email="buyer@example.com")
+        event = make_event(organizer)
+        cls.general = Ticket.objects.create(
+            event=event, ticket_type="General", price=Decimal("10.00"), quantity_available=10
+        )
+        cls.vip = Ticket.objects.create(
+            event=make_event(organizer, event_name="After party"),
+            ticket_type="VIP",
+            price=Decimal("50.00"),
+            quantity_available=2,
+            bucket_count=2,
+        )
+        rebalance_buckets(cls.vip)
+
+    def checkout(self, items):
+        client = APIClient()
+        client.force_authenticate(self.buyer)
+        return client.post(reverse("ticket_checkout"), {"items": items}, format="json")
+
+    def test_checkout_buys_every_line(self):
+        response = self.checkout([
+            {"ticket_id": self.vip.pk, "quantity": 1},
+            {"ticket_id": self.general.pk, "quantity": 2},
+            {"ticket_id": self.general.pk, "quantity": 1},
+        ])
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data["total_price"], "80.00")
+        # Repeated tiers are merged into one purchase, in ticket id order
+        self.assertEqual(
+            [(p["ticket"], p["quantity"]) for p in response.data["purchases"]],
+            [(self.general.pk, 3), (self.vip.pk, 1)],
+        )
+        self.assertEqual(Ticket.objects.get(pk=self.general.pk).quantity_remaining, 7)
+        self.assertEqual(Ticket.objects.get(pk=self.vip.pk).quantity_remaining, 1)
+        self.assertEqual(verify_sales_rollup(), [])
+
+    def test_checkout_is_all_or_nothing(self):
+        # Sharded tiers are only checked by the engine, after General is taken
+        self.vip.buckets.update(quantity_sold=1)
+        response = self.checkout([
+            {"ticket_id": self.general.pk, "quantity": 2},
+            {"ticket_id": self.vip.pk, "quantity": 2},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Purchase.objects.count(), 0)
+        self.assertEqual(Ticket.objects.get(pk=self.general.pk).quantity_sold, 0)
+        self.assertFalse(SalesRollup.objects.exists())
+
+    def test_checkout_rejects_unknown_tickets(self):
+        response = self.checkout([{"ticket_id": 999_999, "quantity": 1}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("items", response.data)
+
+
+class HoldTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        organizer = User.objects.create_user(
+            username="org", email="org@example.com", role="organizer"
+        )
+        cls.buyer = User.objects.create_user(username="buyer", email="buyer@example.com")
+        cls.ticket = Ticket.objects.create(
+            event=make_event(organizer),
+            ticket_type="General Admission",
+            price=Decimal("10.00"),
+            quantity_available=5,
+        )
+        cls.sharded = Ticket.objects.create(
+            event=make_event(organizer),
+            ticket_type="VIP",
+            price=Decimal("40.00"),
+            quantity_available=4,
+            bucket_count=2,
+        )
+        rebalance_buckets(cls.sharded)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def remaining(self, ticket):
+        return Ticket.objects.get(pk=ticket.pk).quantity_remaining
+
+    def test_hold_counts_against_stock_until_confirmed(self):
+        response = self.client.post(
+            reverse("hold-list"), {"ticket_id": self.ticket.pk, "quantity": 3}, format="json"
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(self.remaining(self.ticket), 2)
+        with self.assertRaises(InsufficientInventory):
+            purchase_tickets(self.buyer, self.ticket, 3)
+
+        response = self.client.post(reverse("hold-confirm", args=[response.data["id"]]))
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data["total_price"], "30.00")
+        self.assertEqual(self.remaining(self.ticket), 2)
+        self.assertFalse(Hold.objects.exists())
+        self.assertEqual(verify_sales_rollup(), [])
+
+    def test_expired_holds_are_released_and_cannot_be_confirmed(self):
+        holds = [
+            hold_tickets(self.buyer, self.ticket, 2, ttl=-1),
+            hold_tickets(self.buyer, self.ticket, 1, ttl=-1),
+            hold_tickets(self.buyer, self.sharded, 1, ttl=-1),
+            hold_tickets(self.buyer, self.sharded, 1, ttl=-1),
+        ]
+        active = hold_tickets(self.buyer, self.ticket, 1)
+        self.assertEqual(self.remaining(self.ticket), 1)
+        self.assertEqual(self.remaining(self.sharded), 2)
+
+        with self.assertRaises(HoldExpired):
+            confirm_hold(holds[0])
+        out = StringIO()
+        call_command("expire_holds", batch_size=3, stdout=out)
+
+        self.assertIn("Released 4", out.getvalue())
+        self.assertEqual(list(Hold.objects.all()), [active])
+        self.assertEqual(self.remaining(self.ticket), 4)
+        self.assertEqual(self.remaining(self.sharded), 4)
+
+    def test_tickets_loaded_before_a_rebalance_never_oversell(self):
+        stale = Ticket.objects.get(pk=self.ticket.pk)
+        rebalance_buckets(self.ticket, 2)  # Shards the tier after it was loaded
+
+        purchase_tickets(self.buyer, stale, 3)
+        purchase_tickets(self.buyer, stale, 2)
+        with self.assertRaises(InsufficientInventory):
+            purchase_tickets(self.buyer, stale, 1)
+        self.assertEqual(self.remaining(self.ticket), 0)
+
+        stale = Ticket.objects.get(pk=self.sharded.pk)
+        rebalance_buckets(self.sharded, 0)
+        purchase_tickets(self.buyer, stale, 4)
+        self.assertEqual(self.remaining(self.sharded), 0)
+        self.assertEqual(verify_sales_rollup(), [])
+
+    def test_release_after_rebalance_returns_seats_to_the_ticket(self):
+        hold = hold_tickets(self.buyer, self.sharded, 2)
+        rebalance_buckets(self.sharded)  # Folds the held seats into quantity_sold
+
+        response = self.client.delete(reverse("hold-detail", args=[hold.pk]))
+        self.assertEqual(response.status_code, 204)
+        rebalance_buckets(self.sharded)
+
+        self.assertEqual(self.remaining(self.sharded), 4)
+
+    def test_release_after_rebalance_and_new_sales_never_oversells(self):
+        hold = hold_tickets(self.buyer, self.sharded, 1)
+        rebalance_buckets(self.sharded)
+        # The rebalanced buckets sell out, including the hold's old bucket
+        for _ in range(3):
+            purchase_tickets(self.buyer, self.sharded, 1)
+
+        self.assertTrue(release_hold(hold))
+
+        # The seat went back to the ticket row, not to a bucket
+        self.assertEqual(self.remaining(self.sharded), 0)
+        with self.assertRaises(InsufficientInventory):
+            purchase_tickets(self.buyer, self.sharded, 1)
+        ticket = rebalance_buckets(self.sharded)
+        self.assertEqual(ticket.quantity_sold, 3)
+        self.assertEqual(self.remaining(self.sharded), 1)
+
+
+@override_settings(RATE_LIMITS=NO_RATE_LIMITS)
+class IdempotencyKeyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        organizer = User.objects.create_user(
+            username="org", email="org@example.com", role="organizer"
+        )
+        cls.buyer = User.objects.create_user(username="buyer", email="buyer@example.com")
+        cls.ticket = Ticket.objects.create(
+            event=make_event(organizer),
+            ticket_type="General Admission",
+            price=Decimal("10.00"),
+            quantity_available=3,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def purchase(self, key, quantity=1):
+        return self.client.post(
+            reverse("ticket_purchase"),
+            {"ticket_id": self.ticket.pk, "quantity": quantity},
+            format="json",
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_retries_replay_the_stored_response(self):
+        first = self.purchase("retry-1", quantity=2)
+        with CaptureQueriesContext(connection) as queries:
+            retry = self.purchase("retry-1", quantity=2)
+
+        # The purchase itself does not run again
+        self.assertFalse(
+            [q for q in queries if "core_ticket" in q["sql"] or "core_purchase" in q["sql"]]
+        )
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((retry.status_code, retry.data), (201, first.data))
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Purchase.objects.count(), 1)
+        # Client errors are outcomes too
+        self.assertEqual(self.purchase("retry-2", quantity=2).status_code, 400)
+        Ticket.objects.filter(pk=self.ticket.pk).update(quantity_available=10)
+        self.assertEqual(self.purchase("retry-2", quantity=2).status_code, 400)
+
+    def test_key_in_progress_or_reused_for_another_request(self):
+        self.assertEqual(self.purchase("key").status_code, 201)
+        self.assertEqual(self.purchase("key", quantity=2).status_code, 422)
+
+        # A duplicate arriving while the first request still runs
+        IdempotencyKey.objects.filter(key="key").update(status_code=None)
+        response = self.purchase("key")
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Purchase.objects.count(), 1)
+
+    def test_server_errors_release_the_key(self):
+        with mock.patch("core.serializers.purchase_tickets", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.purchase("crash")
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.purchase("crash").status_code, 201)
+
+    def test_retry_takes_over_a_key_whose_request_crashed(self):
+        self.assertEqual(self.purchase("lost").status_code, 201)
+        # The worker died after claiming the key
+        IdempotencyKey.objects.filter(key="lost").update(status_code=None, response=None)
+        self.assertEqual(self.purchase("lost").status_code, 409)
+
+        IdempotencyKey.objects.filter(key="lost").update(
+            claimed_at=timezone.now() - datetime.timedelta(seconds=61)
+        )
+        # Another request may not take it over
+        self.assertEqual(self.purchase("lost", quantity=2).status_code, 422)
+        retry = self.purchase("lost")
+
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(self.purchase("lost").data, retry.data)
+        self.assertEqual(Purchase.objects.count(), 2)
+
+    def test_stale_request_does_not_overwrite_the_retry(self):
+        record, claimed = claim_key(self.buyer, "slow", "fingerprint")
+        IdempotencyKey.objects.filter(pk=record.pk).update(
+            claimed_at=timezone.now() - datetime.timedelta(seconds=61)
+        )
+        retry, retry_claimed = claim_key(self.buyer, "slow", "fingerprint")
+
+        self.assertTrue(claimed and retry_claimed)
+        self.assertFalse(claim_key(self.buyer, "slow", "fingerprint")[1])
+        # The first request finishes late, then fails
+        store_outcome(record, 201, {"id": 1})
+        release_key(record)
+        store_outcome(retry, 201, {"id": 2})
+        self.assertEqual(IdempotencyKey.objects.get(key="slow").response, {"id": 2})
+
+    def test_purge_deletes_expired_keys(self):
+        self.purchase("old")
+        self.purchase("new")
+        IdempotencyKey.objects.filter(key="old").update(expires_at=timezone.now())
+
+        call_command("purge_idempotency_keys", stdout=StringIO())
+
+        self.assertEqual(list(IdempotencyKey.objects.values_list("key", flat=True)), ["new"])
+
+
+@override_settings(
+    WAITING_ROOM={
+        "ENABLED": True,
+        "STORE": "core.admission.LocalQueueStore",
+        "RATE": 2,
+        "ADMISSION_TTL": 60,
+    },
+    RATE_LIMITS=NO_RATE_LIMITS,
+)
+class WaitingRoomTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        organizer = User.objects.create_user(
+            username="org", email="org@example.com", role="organizer"
+        )
+        cls.buyers = [
+            User.objects.create_user(username=f"buyer{i}", email=f"buyer{i}@example.com")
+            for i in range(5)
+        ]
+        cls.ticket = Ticket.objects.create(
+            event=make_event(organizer),
+            ticket_type="General Admission",
+            price=Decimal("10.00"),
+            quantity_available=100,
+        )
+        cls.other_event = make_event(organizer, event_name="Other", admission_rate=10)
+
+    def setUp(self):
+        waiting_room.reset()  # Fresh LocalQueueStore
+        self.now = 1_000_000.5
+        clock = mock.patch.object(waiting_room, "clock", lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+        return client
+
+    def join(self, user, event_id=None):
+        response = self.client_for(user).post(
+            reverse("queue_join"), {"event_id": event_id or self.ticket.event_id}
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data
+
+    def purchase(self, user, token):
+        return self.client_for(user).post(
+            reverse("ticket_purchase"),
+            {"ticket_id": self.ticket.pk, "quantity": 1},
+            HTTP_X_QUEUE_TOKEN=token,
+        )
+
+    def test_buyers_are_admitted_at_the_event_rate(self):
+        waits = [self.join(buyer)["wait_seconds"] for buyer in self.buyers]
+        self.assertEqual(waits, [0, 0, 1, 1, 2])
+        # Events can set their own rate
+        waits = [self.join(buyer, self.other_event.pk)["wait_seconds"] for buyer in self.buyers]
+        self.assertEqual(waits, [0] * 5)
+
+    def test_unadmitted_purchases_are_rejected_before_any_query(self):
+        tokens = [self.join(buyer)["token"] for buyer in self.buyers]
+
+        with self.assertNumQueries(0):
+            waiting = self.purchase(self.buyers[4], tokens[4])
+            missing = self.purchase(self.buyers[0], None)
+            forged = self.purchase(self.buyers[0], tokens[0] + "x")
+        self.assertEqual(waiting.status_code, 429)
+        self.assertEqual(waiting["Retry-After"], "2")
+        self.assertEqual(missing.status_code, 403)
+        self.assertEqual(forged.status_code, 403)
+
+        status_response = APIClient().get(reverse("queue_status"), HTTP_X_QUEUE_TOKEN=tokens[4])
+        self.assertEqual(status_response.data["wait_seconds"], 2)
+        self.now += 2
+        self.assertEqual(self.purchase(self.buyers[4], tokens[4]).status_code, 201)
+
+    def test_retry_with_idempotency_key_replays_a_used_admission(self):
+        token = self.join(self.buyers[0])["token"]
+        client = self.client_for(self.buyers[0])
+        for _ in range(2):
+            response = client.post(
+                reverse("ticket_purchase"),
+                {"ticket_id": self.ticket.pk, "quantity": 1},
+                HTTP_X_QUEUE_TOKEN=token,
+                HTTP_IDEMPOTENCY_KEY="order-1",
+            )
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(Purchase.objects.count(), 1)
+
+    def test_admission_is_single_use_and_bound_to_the_buyer(self):
+        token = self.join(self.buyers[0])["token"]
+
+        self.assertEqual(self.purchase(self.buyers[1], token).status_code, 403)
+        self.assertEqual(self.purchase(self.buyers[0], token).status_code, 201)
+        self.assertEqual(self.purchase(self.buyers[0], token).status_code, 403)
+        self.now += 61
+        self.assertEqual(
+            self.purchase(self.buyers[2], self.join(self.buyers[2])["token"]).status_code, 201
+        )
+
+    def test_checkout_and_holds_need_an_admission(self):
+        client = self.client_for(self.buyers[0])
+        items = {"items": [{"ticket_id": self.ticket.pk, "quantity": 1}]}
+        hold = {"ticket_id": self.ticket.pk, "quantity": 1}
+
+        response = client.post(reverse("ticket_checkout"), items, format="json")
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(client.post(reverse("hold-list"), hold).status_code, 403)
+
+        token = self.join(self.buyers[0])["token"]
+        response = client.post(
+            reverse("ticket_checkout"), items, format="json", HTTP_X_QUEUE_TOKEN=token
+        )
+        self.assertEqual(response.status_code, 201)
+        # The token is spent, on any of the endpoints
+        response = client.post(reverse("hold-list"), hold, HTTP_X_QUEUE_TOKEN=token)
+        self.assertEqual(response.status_code, 403)
+
+        token = self.join(self.buyers[0])["token"]
+        response = client.post(reverse("hold-list"), hold, HTTP_X_QUEUE_TOKEN=token)
+        self.assertEqual(response.status_code, 201)
+        # Holds taken are listed and confirmed without a token
+        self.assertEqual(client.get(reverse("hold-list")).status_code, 200)
+        confirm = client.post(reverse("hold-confirm", args=[response.data["id"]]))
+        self.assertEqual(confirm.status_code, 201)
+
+    def test_checkout_cannot_add_events_the_token_is_not_for(self):
+        other = Ticket.objects.create(
+            event=self.other_event,
+            ticket_type="General Admission",
+            price=Decimal("10.00"),
+            quantity_available=10,
+        )
+        token = self.join(self.buyers[0])["token"]
+        response = self.client_for(self.buyers[0]).post(
+            reverse("ticket_checkout"),
+            {
+                "items": [
+                    {"ticket_id": self.ticket.pk, "quantity": 1},
+                    {"ticket_id": other.pk, "quantity": 1},
+                ]
+            },
+            format="json",
+            HTTP_X_QUEUE_TOKEN=token,
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Purchase.objects.exists())
+
+    def test_concurrent_purchases_with_one_admission_buy_once(self):
+        token = self.join(self.buyers[0])["token"]
+        purchase = purchase_tickets
+        concurrent = []
+
+        def purchase_with_a_second_request(*args):
+            # Arrives while the first purchase is still running
+            if not concurrent:
+                concurrent.append(self.purchase(self.buyers[0], token))
+            return purchase(*args)
+
+        with mock.patch("core.serializers.purchase_tickets", purchase_with_a_second_request):
+            self.assertEqual(self.purchase(self.buyers[0], token).status_code, 201)
+
+        self.assertEqual(concurrent[0].status_code, 403)
+        self.assertEqual(Purchase.objects.count(), 1)
+
+    def test_failed_purchase_gives_the_admission_back(self):
+        token = self.join(self.buyers[0])["token"]
+        # Sold out between validation and the purchase
+        with mock.patch(
+            "core.serializers.purchase_tickets", side_effect=InsufficientInventory(self.ticket.pk)
+        ):
+            self.assertEqual(self.purchase(self.buyers[0], token).status_code, 400)
+
+        self.assertEqual(self.purchase(self.buyers[0], token).status_code, 201)
+
+
+@override_settings(
+    RATE_LIMITS={
+        "STORE": "core.throttling.LocalBucketStore",
+        "POLICIES": {
+            "purchase": {"RATE": "1/s", "BURST": 2, "KEY": "user"},
+            "token": {"RATE": "1/min", "BURST": 1, "KEY": "ip"},
+        },
+    }
+)
+class RateLimitTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        organizer = User.objects.create_user(
+            username="org", email="org@example.com", role="organizer"
+        )
+        cls.buyers = [
+            User.objects.create_user(username=f"buyer{i}", email=f"buyer{i}@example.com")
+            for i in range(2)
+        ]
+        cls.ticket = Ticket.objects.create(
+            event=make_event(organizer),
+            ticket_type="General Admission",
+            price=Decimal("10.00"),
+            quantity_available=100,
+        )
+
+    def setUp(self):
+        rate_limiter.reset()  # Fresh LocalBucketStore
+        self.now = 1_000_000.0
+        clock = mock.patch.object(rate_limiter, "clock", lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def purchase(self, user=None, **extra):
+        client = APIClient()
+        if user is not None:
+            client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+        return client.post(
+            reverse("ticket_purchase"), {"ticket_id": self.ticket.pk, "quantity": 1}, **extra
+        )
+
+    def test_bursts_are_throttled_before_any_query(self):
+        self.assertEqual(self.purchase(self.buyers[0]).status_code, 201)
+        self.assertEqual(self.purchase(self.buyers[0]).status_code, 201)
+
+        with self.assertNumQueries(0):
+            throttled = self.purchase(self.buyers[0])
+        self.assertEqual(throttled.status_code, 429)
+        self.assertEqual(throttled["Retry-After"], "1")
+
+        self.now += 1
+        self.assertEqual(self.purchase(self.buyers[0]).status_code, 201)
+
+    def test_buckets_are_per_user_or_per_ip(self):
+        for _ in range(2):
+            self.purchase(self.buyers[0])
+
+        self.assertEqual(self.purchase(self.buyers[1]).status_code, 201)
+        # Without a token the bucket is the client's IP
+        self.assertEqual(self.purchase().status_code, 401)
+        self.assertEqual(self.purchase().status_code, 401)
+        self.assertEqual(self.purchase().status_code, 429)
+        self.assertEqual(self.purchase(REMOTE_ADDR="10.0.0.2").status_code, 401)
+
+    def test_forwarded_for_header_does_not_pick_the_bucket(self):
+        for number in range(3):
+            response = self.purchase(HTTP_X_FORWARDED_FOR=f"10.1.0.{number}")
+        self.assertEqual(response.status_code, 429)
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "NUM_PROXIES": 1})
+    def test_forwarded_for_is_read_behind_a_proxy(self):
+        for _ in range(2):
+            self.purchase(HTTP_X_FORWARDED_FOR="10.1.0.1, 10.9.9.9")
+        # Only the entry the proxy added counts
+        throttled = self.purchase(HTTP_X_FORWARDED_FOR="10.1.0.2, 10.9.9.9")
+        self.assertEqual(throttled.status_code, 429)
+        response = self.purchase(HTTP_X_FORWARDED_FOR="10.1.0.2, 10.9.9.8")
+        self.assertEqual(response.status_code, 401)
+
+    def test_checkout_and_holds_share_the_purchase_limit(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.buyers[0])}")
+        hold = {"ticket_id": self.ticket.pk, "quantity": 1}
+
+        self.assertEqual(self.purchase(self.buyers[0]).status_code, 201)
+        self.assertEqual(client.post(reverse("hold-list"), hold).status_code, 201)
+        checkout = client.post(reverse("ticket_checkout"), {"items": [hold]}, format="json")
+        self.assertEqual(checkout.status_code, 429)
+        self.assertEqual(client.post(reverse("hold-list"), hold).status_code, 429)
+        # Only taking seats is limited
+        self.assertEqual(client.get(reverse("hold-list")).status_code, 200)
+
+    def test_token_endpoint_is_throttled_before_checking_passwords(self):
+        User.objects.create_user(username="fan", email="fan@example.com", password="secret-1")
+        credentials = {"email": "fan@example.com", "password": "wrong"}
+
+        self.assertEqual(APIClient().post("/api/token/", credentials).status_code, 401)
+        with mock.patch("django.contrib.auth.hashers.check_password") as check_password:
+            throttled = APIClient().post("/api/token/", credentials)
+        self.assertEqual(throttled.status_code, 429)
+        self.assertEqual(throttled["Retry-After"], "60")
+        check_password.assert_not_called()
+
+    @override_settings(RATE_LIMITS={"ENABLED": False})
+    def test_limits_can_be_turned_off(self):
+        for _ in range(3):
+            self.assertEqual(self.purchase(self.buyers[0]).status_code, 201)
+
+    def test_stores_refill_and_evict_buckets(self):
+        local = LocalBucketStore({"SHARDS": 1, "MAX_KEYS": 2})
+        stores = (local, CacheBucketStore({"CACHE_ALIAS": "default"}))
+        caches["default"].delete("rate-limit-test")
+        for store in stores:
+            self.assertEqual(store.take("rate-limit-test", 10, 2, 100.0), 0)
+            self.assertEqual(store.take("rate-limit-test", 10, 2, 100.0), 0)
+            self.assertEqual(store.take("rate-limit-test", 10, 2, 100.0), 10)
+            self.assertEqual(store.take("rate-limit-test", 10, 2, 105.0), 5)
+            self.assertEqual(store.take("rate-limit-test", 10, 2, 110.0), 0)
+
+        # Full buckets and the least recently used past MAX_KEYS are dropped
+        _, buckets = local._shards[0]  # pylint: disable=protected-access
+        local.take("a", 10, 2, 200.0)
+        self.assertEqual(list(buckets), ["a"])
+        local.take("b", 10, 2, 200.0)
+        local.take("c", 10, 2, 200.0)
+        self.assertEqual(list(buckets), ["b", "c"])
+
+    def test_cache_store_hands_out_each_token_once_under_concurrency(self):
+        store = CacheBucketStore({"CACHE_ALIAS": "default"})
+        caches["default"].delete("rate-limit-race")
+        get = store.cache.get
+
+        def slow_get(*args, **kwargs):
+            value = get(*args, **kwargs)
+            time.sleep(0.005)  # Widen the gap between reading and writing
+            return value
+
+        barrier = threading.Barrier(10)
+        waits = []
+
+        def take():
+            barrier.wait()
+            waits.append(store.take("rate-limit-race", 10, 3, 100.0))
+
+        with mock.patch.object(store.cache, "get", slow_get):
+            threads = [threading.Thread(target=take) for _ in range(10)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(waits.count(0), 3)
+
+
+class InventoryBucketTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        organizer = User.objects.create_user(
+            username="org", email="org@example.com", role="organizer"
+        )
+        cls.buyer = User.objects.create_user(username="buyer", email="buyer@example.com")
+        cls.ticket = Ticket.objects.create(
+            event=make_event(organizer),
+            ticket_type="General Admission",
+            price=Decimal("10.00"),
+            quantity_available=10,
+            quantity_sold=1,
+        )
+
+    def test_rebalance_splits_remaining_stock(self):
+        ticket = rebalance_buckets(self.ticket, 4)
+
+        self.assertEqual(
+            list(ticket.buckets.order_by("index").values_list("quantity_available", flat=True)),
+            [3, 2, 2, 2],
+        )
+        self.assertEqual(ticket.quantity_remaining, 9)
+
+    def test_purchase_falls_back_to_buckets_with_stock(self):
+        ticket = rebalance_buckets(self.ticket, 3)
+        for _ in range(3):
+            purchase_tickets(self.buyer, ticket, 3)
+
+        with self.assertRaises(InsufficientInventory):
+            purchase_tickets(self.buyer, ticket, 1)
+        self.assertEqual(Ticket.objects.with_remaining().get(pk=ticket.pk).quantity_remaining, 0)
+
+    def test_unsharding_folds_bucket_sales_into_ticket(self):
+        ticket = rebalance_buckets(self.ticket, 2)
+        purchase_tickets(self.buyer, ticket, 2)
+
+        ticket = rebalance_buckets(ticket, 0)
+
+        self.assertEqual(ticket.quantity_sold, 3)
+        self.assertFalse(ticket.buckets.exists())
+        self.assertEqual(ticket.quantity_remaining, 7)
+
+
+class SalesRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.organizer = User.objects.create_user(
+            username="org", email="org@example.com", role="organizer"
+        )
+        cls.buyer = User.objects.create_user(username="buyer", email="buyer@example.com")
+        cls.event = make_event(cls.organizer)
+        cls.other_event = make_event(cls.organizer, event_name="Festival")
+        cls.ticket = Ticket.objects.create(
+            event=cls.event, ticket_type="VIP", price=Decimal("25.00"), quantity_available=10
+        )
+        cls.other_ticket = Ticket.objects.create(
+            event=cls.other_event, ticket_type="GA", price=Decimal("5.00"), quantity_available=10
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.organizer)
+
+    def test_purchases_update_rollup(self):
+        purchase_tickets(self.buyer, self.ticket, 2)
+        purchase_tickets(self.buyer, self.ticket, 1)
+        purchase_tickets(self.buyer, self.other_ticket, 4)
+
+        rollup = SalesRollup.objects.get(ticket=self.ticket)
+        self.assertEqual(rollup.tickets_sold, 3)
+        self.assertEqual(rollup.sales, Decimal("75.00"))
+        self.assertEqual(verify_sales_rollup(), [])
+
+        response = self.client.get("/api/analytics/")
+        self.assertEqual(response.data["total_tickets_sold"], 7)
+        self.assertEqual(response.data["total_sales"], "95.00")
+
+        response = self.client.get(f"/api/analytics/?event={self.event.pk}")
+        self.assertEqual(response.data["total_tickets_sold"], 3)
+        self.assertEqual(response.data["number_of_events"], 1)
+
+        response = self.client.get("/api/analytics/?date_from=2999-01-01")
+        self.assertEqual(response.data["total_tickets_sold"], 0)
+
+    def test_analytics_are_scoped_to_organizer(self):
+        purchase_tickets(self.buyer, self.ticket, 2)
+        rival = User.objects.create_user(
+            username="rival", email="rival@example.com", role="organizer"
+        )
+        self.client.force_authenticate(rival)
+
+        response = self.client.get("/api/analytics/")
+
+        self.assertEqual(response.data["total_tickets_sold"], 0)
+        self.assertEqual(response.data["number_of_events"], 0)
+
+    def test_breakdown_groups_by_event_type_and_period(self):
+        purchase_tickets(self.buyer, self.ticket, 2)
+        purchase_tickets(self.buyer, self.other_ticket, 4)
+
+        for interval in ("hour", "day", "week"):
+            response = self.client.get(f"/api/analytics/breakdown/?interval={interval}")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(sum(row["tickets_sold"] for row in response.data["series"]), 6)
+
+        self.assertEqual(
+            [(row["event_name"], row["tickets_sold"]) for row in response.data["by_event"]],
+            [("Concert", 2), ("Festival", 4)],
+        )
+        self.assertEqual(
+            [(row["ticket_type"], row["sales"]) for row in response.data["by_ticket_type"]],
+            [("GA", "20.00"), ("VIP", "50.00")],
+        )
+
+    def test_rebuild_reconciles_rollup(self):
+        purchase_tickets(self.buyer, self.ticket, 2)
+        SalesRollup.objects.update(tickets_sold=99)
+        self.assertEqual(len(verify_sales_rollup()), 1)
+
+        call_command("rebuild_sales_rollup", stdout=StringIO())
+
+        self.assertEqual(verify_sales_rollup(), [])
+
+
+class GenerateDataTests(TestCase):
+    def generate(self, **options):
+        args = [
+            "--organizers=2", "--events=3", "--tiers=2", "--users=5", "--purchases=40", "--seed=1"
+        ]
+        call_command("generate_data", *args, stdout=StringIO(), **options)
+
+    def test_generated_data_is_consistent(self):
+        self.generate()
+
+        self.assertEqual(User.objects.filter(role="organizer").count(), 2)
+        self.assertEqual(Event.objects.count(), 6)
+        self.assertEqual(Purchase.objects.count(), 40)
+        self.assertEqual(
+            sum(Ticket.objects.values_list("quantity_sold", flat=True)),
+            sum(Purchase.objects.values_list("quantity", flat=True)),
+        )
+        self.assertEqual(verify_sales_rollup(), [])
+        self.assertTrue(
+            self.client.login(email="loadtest-user0@example.com", password="loadtest-password")
+        )
+
+    def test_same_seed_gives_same_data(self):
+        self.generate()
+        first = list(
+            Purchase.objects.order_by("id").values_list("ticket__event__event_name", "quantity")
+        )
+        self.generate(prefix="again-")
+        second = list(
+            Purchase.objects.filter(user__username__startswith="again-")
+            .order_by("id")
+            .values_list("ticket__event__event_name", "quantity")
+        )
+
+        self.assertEqual(first, second)
+        with self.assertRaises(CommandError):
+            self.generate(prefix="again-")
+
+
+@override_settings(BROWSE_CACHE=NO_BROWSE_CACHE)
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        organizer = User.objects.create_user(
+            username="org", email="org@example.com", role="organizer"
+        )
+        cls.buyer = User.objects.create_user(username="buyer", email="buyer@example.com")
+        # Few distinct dates and times so the id tie-breaker matters
+        cls.events = [
+            make_event(
+                organizer,
+                event_name=f"Event {i}",
+                date=datetime.date(2030, 1, 1 + i % 3),
+                time=datetime.time(18 + i % 2),
+            )
+            for i in range(11)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def walk(self, url, key):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(row["id"] for row in response.data["results"])
+            url = response.data[key]
+        return ids, response
+
+    def test_pages_follow_date_time_id_order(self):
+        expected = [
+            event.pk
+            for event in sorted(self.events, key=lambda e: (e.date, e.time, e.pk))
+        ]
+
+        forward, last_page = self.walk("/api/browse/events/?page_size=4", "next")
+        self.assertEqual(forward, expected)
+
+        # Walking back returns each page in forward order
+        pages = []
+        url = last_page.data["previous"]
+        while url:
+            response = self.client.get(url)
+            pages.insert(0, [row["id"] for row in response.data["results"]])
+            url = response.data["previous"]
+        self.assertEqual(sum(pages, []), expected[:8])
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get("/api/browse/events/?cursor=bogus")
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(BROWSE_CACHE=NO_BROWSE_CACHE)
+class EventSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        organizer = User.objects.create_user(
+            username="org", email="org@example.com", role="organizer"
+        )
+        cls.buyer = User.objects.create_user(username="buyer", email="buyer@example.com")
+        cls.jazz = make_event(organizer, event_name="Jazz Night", location="Mandalay")
+        cls.rock = make_event(
+            organizer, event_name="Rock Festival", description="Jazz fusion openers"
+        )
+        cls.expo = make_event(organizer, event_name="Tech Expo", location="Naypyidaw")
+
+    def search(self, query, page_size=20):
+        client = APIClient()
+        client.force_authenticate(self.buyer)
+        ids = []
+        url = f"/api/browse/events/?search={query}&page_size={page_size}"
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(row["id"] for row in response.data["results"])
+            url = response.data["next"]
+        return ids
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual(self.search("jazz"), [self.jazz.pk, self.rock.pk])
+        # Pages follow the rank order too
+        self.assertEqual(self.search("jazz", page_size=1), [self.jazz.pk, self.rock.pk])
+
+    def test_prefix_and_location_matching(self):
+        self.assertEqual(self.search("festi"), [self.rock.pk])
+        self.assertEqual(self.search("naypyi"), [self.expo.pk])
+
+    def test_typo_tolerance(self):
+        self.assertEqual(self.search("festivl"), [self.rock.pk])
+
+    def test_search_sees_updates(self):
+        Event.objects.filter(pk=self.expo.pk).update(event_name="Robotics Expo")
+        self.assertEqual(self.search("robotics"), [self.expo.pk])
+
+
+@override_settings(BROWSE_CACHE=NO_BROWSE_CACHE)
+class EventFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        organizer = User.objects.create_user(
+            username="org", email="org@example.com", role="organizer"
+        )
+        cls.buyer = User.objects.create_user(username="buyer", email="buyer@example.com")
+        today = datetime.date.today()
+        cls.past = make_event(organizer, date=today - datetime.timedelta(days=3))
+        cls.later = make_event(
+            organizer, date=today + datetime.timedelta(days=7), location="Mandalay"
+        )
+        cls.soon = make_event(organizer, date=today + datetime.timedelta(days=1))
+
+    def browse(self, query=""):
+        client = APIClient()
+        client.force_authenticate(self.buyer)
+        response = client.get(f"/api/browse/events/?{query}")
+        self.assertEqual(response.status_code, 200)
+        return [row["id"] for row in response.data["results"]]
+
+    def test_default_lists_upcoming_events_soonest_first(self):
+        self.assertEqual(self.browse(), [self.soon.pk, self.later.pk])
+        # An explicit date range may reach into the past
+        self.assertEqual(
+            self.browse(f"date_from={self.past.date}"),
+            [self.past.pk, self.soon.pk, self.later.pk],
+        )
+
+    def test_past_events_are_found_by_id(self):
+        client = APIClient()
+        client.force_authenticate(self.buyer)
+
+        response = client.get(f"/api/browse/events/{self.past.pk}/")
+        async_response = self.client.get(
+            f"/api/async/browse/events/{self.past.pk}/",
+            headers={"Authorization": f"Bearer {AccessToken.for_user(self.buyer)}"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["id"], self.past.pk)
+        self.assertEqual(async_response.status_code, 200)
+
+    def test_date_filters(self):
+        self.assertEqual(self.browse("upcoming=true"), [self.soon.pk, self.later.pk])
+        self.assertEqual(self.browse("upcoming=false"), [self.past.pk])
+        self.assertEqual(
+            self.browse(f"date_from={self.soon.date}&date_to={self.soon.date}"),
+            [self.soon.pk],
+        )
+
+    def test_location_filters_ignore_case(self):
+        self.assertEqual(self.browse("location=yANGON"), [self.soon.pk])
+        self.assertEqual(self.browse("location=yANGON&upcoming=false"), [self.past.pk])
+        self.assertEqual(self.browse("location=yang"), [])
+        self.assertEqual(self.browse("location_prefix=MAND"), [self.later.pk])
+
+    def assertUsesIndex(self, queryset, index_name):
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                # Tiny test tables would otherwise always be scanned
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_filters_use_event_indexes(self):
+        events = Event.objects.order_by("date", "time", "id")
+        for query, index_name in [
+            ({"upcoming": "true"}, "event_date_time_id_idx"),
+            ({"date_from": "2030-01-01", "date_to": "2030-02-01"}, "event_date_time_id_idx"),
+            ({"location": "Yangon", "upcoming": "true"}, "event_location_date_idx"),
+            ({"location_prefix": "yan"}, "event_location_date_idx"),
+        ]:
+            with self.subTest(query=query):
+                queryset = EventFilter(query, queryset=events).qs
+                self.assertUsesIndex(queryset, index_name)
+
+
+class EventImportTests(TestCase):
+    CSV = (
+        "event_name,description,date,time,location,ticket_type,price,quantity_available\n"
+        "Jazz Night,Live jazz,2030-05-01,20:00,Yangon,General,25.00,300\n"
+        "Jazz Night,Live jazz,2030-05-01,20:00,Yangon,VIP,80.00,40\n"
+        "Broken,Bad date,2030-13-01,20:00,Yangon,General,10.00,10\n"
+        "Talk,Free talk,2030-05-02,18:30,Mandalay,,,\n"
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organizer = User.objects.create_user(
+            username="org", email="org@example.com", role="organizer"
+        )
+
+    def test_csv_upload_groups_tiers_and_reports_bad_rows(self):
+        client = APIClient()
+        client.force_authenticate(self.organizer)
+        upload = SimpleUploadedFile("lineup.csv", self.CSV.encode(), "text/csv")
+        response = client.post(
+            reverse("event-bulk-import"), {"file": upload}, format="multipart"
+        )
+
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data["created_events"], 2)
+        self.assertEqual(response.data["created_tickets"], 2)
+        self.assertEqual(response.data["failed_rows"], 1)
+        self.assertEqual(response.data["errors"][0]["line"], 4)
+        self.assertIn("date", response.data["errors"][0]["errors"])
+        jazz = Event.objects.get(event_name="Jazz Night", organizer=self.organizer)
+        self.assertEqual(
+            sorted(jazz.tickets.values_list("ticket_type", "quantity_available")),
+            [("General", 300), ("VIP", 40)],
+        )
+
+    def upload(self, content, **data):
+        client = APIClient()
+        client.force_authenticate(self.organizer)
+        upload = SimpleUploadedFile("lineup.csv", content, "text/csv")
+        return client.post(
+            reverse("event-bulk-import"), {"file": upload, **data}, format="multipart"
+        )
+
+    def test_unreadable_files_are_reported_not_500(self):
+        bad_encoding = self.CSV.encode() + "Café,Latin-1,2030-05-03,20:00,Yangon,,,\n".encode(
+            "latin-1"
+        )
+        response = self.upload(bad_encoding, batch_size=1)
+
+        self.assertEqual(response.status_code, 201, response.data)
+        # Jazz Night was written; Talk, still being read, may be missing tiers
+        self.assertEqual(response.data["created_events"], 1)
+        self.assertEqual(response.data["failed_rows"], 2)
+        error = response.data["errors"][-1]
+        self.assertEqual(error["line"], 5)
+        self.assertIn("Could not read the file", error["errors"]["non_field_errors"][0])
+
+        huge_field = self.CSV + f'Huge,"{"x" * 200_000}",2030-05-03,20:00,Yangon,,,\n'
+        response = self.upload(huge_field.encode())
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data["created_events"], 1)
+        self.assertEqual(response.data["errors"][-1]["line"], 5)
+
+    def test_admission_rate_is_imported(self):
+        content = (
+            "event_name,description,date,time,location,admission_rate\n"
+            "Jazz Night,Live jazz,2030-05-01,20:00,Yangon,25\n"
+            "Talk,Free talk,2030-05-02,18:30,Mandalay,\n"
+            "Broken,Bad rate,2030-05-03,18:30,Mandalay,-1\n"
+        )
+        response = self.upload(content.encode())
+        jsonl = self.upload(
+            b'{"event_name": "Show", "description": "Stand-up", "date": "2030-06-01",'
+            b' "time": "19:00", "location": "Yangon", "admission_rate": 40}\n',
+            format="jsonl",
+        )
+
+        self.assertEqual(response.data["created_events"], 2)
+        self.assertIn("admission_rate", response.data["errors"][0]["errors"])
+        self.assertEqual(jsonl.data["created_events"], 1)
+        self.assertEqual(
+            dict(Event.objects.values_list("event_name", "admission_rate")),
+            {"Jazz Night": 25, "Talk": None, "Show": 40},
+        )
+
+    def test_command_imports_json_lines_in_batches(self):
+        ticket = {"ticket_type": "General", "price": "15.00", "quantity_available": 50}
+        err = StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "e.jsonl")
+            with open(path, "w", encoding="utf-8") as lines:
+                for i in range(5):
+                    lines.write(json.dumps({
+                        "event_name": f"Show {i}",
+                        "description": "Stand-up",
+                        "date": "2030-06-01",
+                        "time": "19:00",
+                        "location": "Yangon",
+                        "tickets": [ticket],
+                    }) + "\n")
+                lines.write("{not json}\n")
+
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                call_command(
+                    "import_events", path, organizer="org", batch_size=2,
+                    stdout=StringIO(), stderr=err,
+                )
+
+        self.assertEqual(Event.objects.filter(organizer=self.organizer).count(), 5)
+        self.assertEqual(Ticket.objects.filter(event__organizer=self.organizer).count(), 5)
+        self.assertIn("Line 6", err.getvalue())
+        # One browse cache invalidation per written batch
+        self.assertEqual(len(callbacks), 3)
+
+
+@override_settings(BROWSE_CACHE=NO_BROWSE_CACHE, RATE_LIMITS=NO_RATE_LIMITS)
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        organizer = User.objects.create_user(
+            username="org", email="org@example.com", role="organizer"
+        )
+        cls.buyer = User.objects.create_user(username="buyer", email="buyer@example.com")
+        cls.events = [
+            make_event(organizer, date=datetime.date(2030, 1, 1 + i)) for i in range(3)
+        ]
+        cls.ticket = Ticket.objects.create(
+            event=cls.events[0],
+            ticket_type="General Admission",
+            price=Decimal("10.00"),
+            quantity_available=5,
+        )
+        cls.auth = {"Authorization": f"Bearer {AccessToken.for_user(cls.buyer)}"}
+
+    async def test_browse_matches_the_sync_endpoint(self):
+        sync_client = APIClient()
+        sync_client.force_authenticate(self.buyer)
+        for sync_url, async_url in [
+            ("/api/browse/events/?page_size=2", "/api/async/browse/events/?page_size=2"),
+            ("/api/browse/events/?location=YANGON", "/api/async/browse/events/?location=YANGON"),
+            (
+                f"/api/browse/events/{self.events[0].pk}/",
+                f"/api/async/browse/events/{self.events[0].pk}/",
+            ),
+        ]:
+            expected = await sync_to_async(sync_client.get)(sync_url)
+            response = await self.async_client.get(async_url, headers=self.auth)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            if "next" in data:
+                # Cursor links point at their own endpoint
+                self.assertEqual(data["next"] is None, expected.data["next"] is None)
+                data = data["results"]
+                expected_data = json.loads(json.dumps(expected.data["results"]))
+            else:
+                expected_data = json.loads(json.dumps(expected.data))
+            self.assertEqual(data, expected_data)
+
+    async def test_browse_requires_a_token(self):
+        response = await self.async_client.get("/api/async/browse/events/")
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get(
+            "/api/async/browse/events/999999/", headers=self.auth
+        )
+        self.assertEqual(response.status_code, 404)
+
+    async def test_purchase(self):
+        url = "/api/async/tickets/purchase/"
+        body = {"ticket_id": self.ticket.pk, "quantity": 3}
+
+        response = await self.async_client.post(
+            url, body, content_type="application/json",
+            headers={**self.auth, "Idempotency-Key": "a1"},
+        )
+        replay = await self.async_client.post(
+            url, body, content_type="application/json",
+            headers={**self.auth, "Idempotency-Key": "a1"},
+        )
+        sold_out = await self.async_client.post(
+            url, body, content_type="application/json", headers=self.auth
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {"ticket_id": self.ticket.pk, "quantity": 3})
+        self.assertEqual(replay["Idempotent-Replayed"], "true")
+        self.assertEqual(sold_out.status_code, 400)
+        self.assertEqual(await Purchase.objects.acount(), 1)
+
+
+@override_settings(
+    LIVE_UPDATES={"INTERVAL": 0.05, "KEEPALIVE": 5}, RATE_LIMITS=NO_RATE_LIMITS
+)
+class LiveAvailabilityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        organizer = User.objects.create_user(
+            username="org", email="org@example.com", role="organizer"
+        )
+        cls.buyer = User.objects.create_user(username="buyer", email="buyer@example.com")
+        cls.event = make_event(organizer)
+        cls.ticket = Ticket.objects.create(
+            event=cls.event,
+            ticket_type="General Admission",
+            price=Decimal("10.00"),
+            quantity_available=10,
+        )
+
+    def stream_url(self, event_id):
+        token = AccessToken.for_user(self.buyer)
+        return f"/api/browse/events/{event_id}/live/?access_token={token}"
+
+    def buy(self, quantity):
+        with self.captureOnCommitCallbacks(execute=True):
+            purchase_tickets(self.buyer, self.ticket, quantity)
+
+    def remaining(self, chunk):
+        data = chunk.decode() if isinstance(chunk, bytes) else chunk
+        payload = json.loads(data.split("data: ", 1)[1])
+        return [ticket["quantity_remaining"] for ticket in payload["tickets"]]
+
+    async def test_stream_pushes_committed_purchases(self):
+        response = await self.async_client.get(self.stream_url(self.event.pk))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        chunks = aiter(response.streaming_content)
+        await anext(chunks)  # Reconnect delay
+
+        self.assertEqual(self.remaining(await anext(chunks)), [10])
+        await sync_to_async(self.buy)(3)
+        self.assertEqual(self.remaining(await anext(chunks)), [7])
+
+        # A client disconnect cancels the task reading the stream
+        reader = asyncio.ensure_future(anext(chunks))
+        await asyncio.sleep(0)
+        reader.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await reader
+        self.assertEqual(live_publisher.subscriber_count(), 0)
+
+    @override_settings(LIVE_UPDATES={"INTERVAL": 0.5})
+    async def test_bursts_are_coalesced(self):
+        subscribers = [live_publisher.subscribe(self.event.pk) for _ in range(50)]
+        await subscribers[0].next(timeout=1)
+
+        for _ in range(5):
+            await sync_to_async(self.buy)(1)
+        updates = [await subscriber.next(timeout=1) for subscriber in subscribers]
+
+        # One query for all subscribers and the whole burst, after the first read
+        self.assertEqual(subscribers[0].channel.refreshes, 2)
+        self.assertEqual({self.remaining(format_event(*update))[0] for update in updates}, {5})
+        for subscriber in subscribers:
+            live_publisher.unsubscribe(subscriber)
+
+    async def test_failed_reads_are_retried(self):
+        fetch = live.fetch_availability
+        calls = []
+
+        async def flaky_fetch(event_id):
+            calls.append(event_id)
+            if len(calls) == 1:
+                raise OperationalError("connection lost")
+            return await fetch(event_id)
+
+        with mock.patch.object(live, "fetch_availability", flaky_fetch):
+            with self.assertLogs("core.live", "ERROR"):
+                subscriber = live_publisher.subscribe(self.event.pk)
+                update = await subscriber.next(timeout=1)
+            live_publisher.unsubscribe(subscriber)
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(self.remaining(format_event(*update)), [10])
+
+    async def test_unknown_event(self):
+        response = await self.async_client.get(self.stream_url(999999))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_streams_need_a_token(self):
+        response = await self.async_client.get(f"/api/browse/events/{self.event.pk}/live/")
+        self.assertEqual(response.status_code, 401)
+
+        response = await self.async_client.get(
+            f"/api/browse/events/{self.event.pk}/live/?access_token=forged"
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_streams_are_not_served_under_wsgi(self):
+        # WSGI would never send a byte of the endless stream
+        response = self.client.get(self.stream_url(self.event.pk))
+        self.assertEqual(response.status_code, 501)
+
+    @override_settings(
+        RATE_LIMITS={
+            "STORE": "core.throttling.LocalBucketStore",
+            "POLICIES": {"live": {"RATE": "1/min", "BURST": 1, "KEY": "ip"}},
+        }
+    )
+    async def test_opening_streams_is_rate_limited(self):
+        self.assertEqual((await self.async_client.get(self.stream_url(999999))).status_code, 404)
+        response = await self.async_client.get(self.stream_url(999999))
+        self.assertEqual(response.status_code, 429)
+
+
+@override_settings(BROWSE_CACHE=NO_BROWSE_CACHE)
+class ProjectionTests(TestCase):
+    """
+    The fast path must render exactly the bytes of the serializers it replaces.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        organizer = User.objects.create_user(
+            username="orgé", email="org@example.com", role="organizer"
+        )
+        cls.buyer = User.objects.create_user(username="buyer", email="buyer@example.com")
+        cls.events = [
+            make_event(organizer, event_name="Café \u2028 night", description='"Quoted"\n'),
+            make_event(organizer, date=datetime.date(2030, 2, 1)),  # No tickets
+        ]
+        ga = Ticket.objects.create(
+            event=cls.events[0], ticket_type="GA", price=Decimal("10.5"), quantity_available=50
+        )
+        vip = Ticket.objects.create(
+            event=cls.events[0], ticket_type="VIP", price=Decimal("99.99"), quantity_available=20
+        )
+        purchase_tickets(cls.buyer, ga, 2)
+        purchase_tickets(cls.buyer, vip, 1)
+        rebalance_buckets(vip, 3)
+
+    def assertSameBytes(self, serializer_data, projection_data):
+        self.assertEqual(
+            FastJSONRenderer().render(projection_data), JSONRenderer().render(serializer_data)
+        )
+
+    def test_events(self):
+        projection = EventProjection()
+        queryset = Event.objects.order_by("date", "time", "id")
+        self.assertSameBytes(
+            EventSerializer(queryset.with_tickets(), many=True).data,
+            projection.serialize(projection.values(queryset)),
+        )
+
+    def test_purchases(self):
+        projection = PurchaseProjection()
+        queryset = Purchase.objects.order_by("-purchase_time", "id")
+        self.assertSameBytes(
+            PurchaseSerializer(queryset, many=True).data,
+            projection.serialize(projection.values(queryset)),
+        )
+
+    def test_endpoints(self):
+        client = APIClient()
+        client.force_authenticate(self.buyer)
+
+        pages, url = [], "/api/browse/events/?page_size=1"
+        while url:
+            response = client.get(url)
+            pages += response.data["results"]
+            url = response.data["next"]
+        detail = client.get(f"/api/browse/events/{self.events[0].pk}/")
+        history = client.get("/api/purchases/history/")
+
+        self.assertEqual([event["id"] for event in pages], [event.pk for event in self.events])
+        self.assertSameBytes(EventSerializer(self.events[0]).data, detail.data)
+        self.assertEqual(len(history.data["results"]), 2)
+        self.assertEqual(client.get("/api/browse/events/abc/").status_code, 404)
+
+    def test_renderer_falls_back_for_what_orjson_does_not_cover(self):
+        data = {"amount": Decimal("1.50"), "at": timezone.now(), 1: [None, True]}
+        for media_type in (None, "application/json; indent=4"):
+            self.assertEqual(
+                FastJSONRenderer().render(data, media_type),
+                JSONRenderer().render(data, media_type),
+            )
+
+
+@override_settings(BROWSE_CACHE=NO_BROWSE_CACHE)
+class QueryCountTests(TestCase):
+    """
+    Every read endpoint must run the same number of queries whatever the
+    number of rows it returns.
+    """
+    sizes = (10, 10_000)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organizer = User.objects.create_user(
+            username="org", email="org@example.com", role="organizer"
+        )
+        cls.buyer = User.objects.create_user(username="buyer", email="buyer@example.com")
+
+    def seed(self, count):
+        Purchase.objects.all().delete()
+        Event.objects.all().delete()
+        events = Event.objects.bulk_create(
+            Event(
+                organizer=self.organizer,
+                event_name=f"Event {i}",
+                description="",
+                date=datetime.date(2030, 1, 1),
+                time=datetime.time(20, 0),
+                location="Yangon",
+            )
+            for i in range(count)
+        )
+        tickets = Ticket.objects.bulk_create(
+            Ticket(event=event, ticket_type=tier, price=Decimal("10.00"), quantity_available=100)
+            for event in events
+            for tier in ("General Admission", "VIP")
+        )
+        Purchase.objects.bulk_create(
+            Purchase(user=self.buyer, ticket=ticket, quantity=1, total_price=ticket.price)
+            for ticket in tickets[::2]
+        )
+        # One sharded tier so bucket sums are covered as well
+        rebalance_buckets(tickets[0], 4)
+        return events[0]
+
+    def count_queries(self, user, url_for):
+        counts = []
+        client = APIClient()
+        client.force_authenticate(user)
+        for size in self.sizes:
+            event = self.seed(size)
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url_for(event))
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(queries))
+        return counts
+
+    def assertConstantQueries(self, user, url_for):
+        counts = self.count_queries(user, url_for)
+        self.assertEqual(len(set(counts)), 1, f"Query counts grew with data: {counts}")
+
+    def test_browse_events(self):
+        self.assertConstantQueries(self.buyer, lambda event: "/api/browse/events/")
+
+    def test_browse_event_detail(self):
+        self.assertConstantQueries(
+            self.buyer, lambda event: f"/api/browse/events/{event.pk}/"
+        )
+
+    def test_organizer_events(self):
+        self.assertConstantQueries(self.organizer, lambda event: "/api/events/")
+
+    def test_organizer_event_detail(self):
+        self.assertConstantQueries(
+            self.organizer, lambda event: f"/api/events/{event.pk}/"
+        )
+
+    def test_organizer_tickets(self):
+        self.assertConstantQueries(
+            self.organizer, lambda event: f"/api/events/{event.pk}/tickets/"
+        )
+
+    def test_purchase_history(self):
+        self.assertConstantQueries(self.buyer, lambda event: "/api/purchases/history/")
+
+    def test_analytics(self):
+        self.assertConstantQueries(self.organizer, lambda event: "/api/analytics/")
+
+
+@override_settings(BROWSE_CACHE=NO_BROWSE_CACHE)
+class InstrumentationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        organizer = User.objects.create_user(
+            username="org", email="org@example.com", role="organizer"
+        )
+        cls.organizer = organizer
+        cls.buyer = User.objects.create_user(username="buyer", email="buyer@example.com")
+        cls.event = make_event(organizer)
+
+    def setUp(self):
+        metrics.clear()
+
+    def series(self, histogram, view, method="GET"):
+        # [bucket counts..., +Inf count, sum, count]
+        return histogram._series[(view, method)]  # pylint: disable=protected-access
+
+    def test_requests_are_recorded_per_route(self):
+        client = APIClient()
+        client.force_authenticate(self.buyer)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(f"/api/browse/events/{self.event.pk}/")
+        query_count = len(queries)
+        client.get("/api/browse/events/")
+
+        self.assertEqual(response.status_code, 200)
+        view = "api/browse/events/(?P<pk>[^/.]+)/$"
+        self.assertEqual(self.series(metrics.duration, view)[-1], 1)
+        self.assertEqual(self.series(metrics.queries, view)[-2], query_count)
+        self.assertGreater(self.series(metrics.db_duration, view)[-2], 0)
+        self.assertGreater(self.series(metrics.serialization_duration, view)[-2], 0)
+        self.assertGreater(self.series(metrics.render_duration, view)[-2], 0)
+        self.assertEqual(self.series(metrics.response_size, view)[-2], len(response.content))
+
+        exposition = self.client.get("/metrics").content.decode()
+        self.assertIn("# TYPE http_request_duration_seconds histogram", exposition)
+        self.assertIn(
+            'http_request_db_queries_count{view="api/browse/events/$",method="GET"} 1', exposition
+        )
+        self.assertIn(
+            f'http_response_size_bytes_bucket{{view="{view}",method="GET",le="+Inf"}} 1',
+            exposition,
+        )
+
+    def test_serializer_views_record_serialization(self):
+        client = APIClient()
+        client.force_authenticate(self.organizer)
+        response = client.get("/api/events/")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(self.series(metrics.serialization_duration, "api/events/$")[-2], 0)
+
+    async def test_async_view_queries_are_counted(self):
+        response = await self.async_client.get(
+            "/api/async/browse/events/",
+            headers={"Authorization": f"Bearer {AccessToken.for_user(self.buyer)}"},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        view = "api/async/browse/events/"
+        self.assertGreater(self.series(metrics.queries, view)[-2], 0)
+        # Timed in the serializer's data, run in a worker thread
+        self.assertGreater(self.series(metrics.serialization_duration, view)[-2], 0)
+
+    def test_repeated_sql_is_logged_as_n_plus_one(self):
+        def view(request):
+            for _ in range(5):
+                list(Event.objects.filter(pk=self.event.pk))
+            return HttpResponse()
+
+        middleware = InstrumentationMiddleware(view)
+        with self.assertLogs("core.instrumentation", "DEBUG") as logs:
+            middleware(RequestFactory().get("/anywhere/"))
+
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("Possible N+1 in GET unmatched: 5 runs of SELECT", logs.output[0])
+        self.assertEqual(self.series(metrics.queries, "unmatched")[-2], 5)
+
+    def test_connection_pool_statistics_are_exported(self):
+        pool = mock.Mock()
+        pool.get_stats.return_value = {"pool_size": 4, "pool_available": 3, "requests_num": 12}
+
+        with mock.patch("core.instrumentation.connection_pools", return_value=[("default", pool)]):
+            exposition = self.client.get("/metrics").content.decode()
+
+        self.assertIn("# TYPE db_pool_connections gauge", exposition)
+        self.assertIn('db_pool_idle_connections{alias="default"} 3', exposition)
+        self.assertIn('db_pool_requests_total{alias="default"} 12', exposition)
+        self.assertIn('db_pool_connections_lost_total{alias="default"} 0', exposition)
+
+    def test_metrics_endpoint_is_restricted(self):
+        self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="10.0.0.1").status_code, 403)
+
+    @override_settings(INSTRUMENTATION={"ENABLED": False})
+    def test_disabled_middleware_drops_out(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            InstrumentationMiddleware(lambda request: HttpResponse())
+
+        self.client.get("/api/browse/events/")
+        self.assertEqual(metrics.duration._series, {})  # pylint: disable=protected-access
+
+
+@override_settings(BROWSE_CACHE=NO_BROWSE_CACHE)
+class ConditionalRequestTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.organizer = User.objects.create_user(
+            username="org", email="org@example.com", role="organizer"
+        )
+        cls.buyer = User.objects.create_user(username="buyer", email="buyer@example.com")
+        cls.event = make_event(cls.organizer)
+        cls.ticket = Ticket.objects.create(
+            event=cls.event, ticket_type="GA", price=Decimal("10.00"), quantity_available=10
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+        self.url = f"/api/browse/events/{self.event.pk}/"
+
+    def test_unchanged_event_is_not_modified(self):
+        first = self.client.get(self.url)
+
+        with self.assertNumQueries(1):
+            by_etag = self.client.get(self.url, headers={"If-None-Match": first["ETag"]})
+
+        self.assertTrue(first["ETag"].startswith('W/"'))
+        self.assertEqual(by_etag.status_code, 304)
+        self.assertEqual(by_etag["ETag"], first["ETag"])
+
+    def test_no_last_modified_for_stock_that_changes_within_a_second(self):
+        first = self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            purchase_tickets(self.buyer, self.ticket, 1)
+        # Without Last-Modified no date, however late, gets a 304 with stale stock
+        response = self.client.get(
+            self.url, headers={"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"}
+        )
+
+        self.assertNotIn("Last-Modified", first)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["tickets"][0]["quantity_remaining"], 9)
+
+    def test_sales_and_ticket_edits_change_the_validators(self):
+        first = self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            purchase_tickets(self.buyer, self.ticket, 1)
+        after_sale = self.client.get(self.url, headers={"If-None-Match": first["ETag"]})
+        self.ticket.price = Decimal("12.00")
+        self.ticket.save(update_fields=["price"])
+        after_edit = self.client.get(self.url, headers={"If-None-Match": after_sale["ETag"]})
+
+        self.assertEqual(after_sale.status_code, 200)
+        self.assertEqual(after_sale.data["tickets"][0]["quantity_remaining"], 9)
+        self.assertEqual(after_edit.status_code, 200)
+        self.assertEqual(after_edit.data["tickets"][0]["price"], "12.00")
+
+    def test_organizer_endpoint(self):
+        self.client.force_authenticate(self.organizer)
+        url = f"/api/events/{self.event.pk}/"
+        first = self.client.get(url)
+        again = self.client.get(url, headers={"If-None-Match": first["ETag"]})
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(self.client.get("/api/events/999999/").status_code, 404)
+
+    @override_settings(BROWSE_CACHE={"ALIAS": "browse", "STALENESS": 2})
+    def test_browse_cache_hit_answers_304_without_queries(self):
+        caches["browse"].clear()
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):
+            again = self.client.get(self.url, headers={"If-None-Match": first["ETag"]})
+
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again["X-Cache"], "HIT")
+
+
+@override_settings(BROWSE_CACHE={"ALIAS": "browse", "STALENESS": 0})
+class BrowseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        organizer = User.objects.create_user(
+            username="org", email="org@example.com", role="organizer"
+        )
+        cls.buyer = User.objects.create_user(username="buyer", email="buyer@example.com")
+        cls.event = make_event(organizer)
+        cls.ticket = Ticket.objects.create(
+            event=cls.event, ticket_type="GA", price=Decimal("10.00"), quantity_available=10
+        )
+
+    def setUp(self):
+        caches["browse"].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+        self.url = f"/api/browse/events/{self.event.pk}/"
+
+    def get(self, url=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url or self.url)
+        return response, len(queries)
+
+    def test_repeated_reads_are_served_from_cache(self):
+        first, _ = self.get()
+        second, queries = self.get()
+
+        self.assertEqual(first["X-Cache"], "MISS")
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(queries, 0)
+        self.assertEqual(second.data, first.data)
+
+    def test_ticket_changes_invalidate(self):
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            Ticket.objects.get(pk=self.ticket.pk).save()
+
+        response, _ = self.get()
+        self.assertEqual(response["X-Cache"], "MISS")
+
+    def test_purchases_refresh_stock_within_tolerance(self):
+        self.get("/api/browse/events/")
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            purchase_tickets(self.buyer, self.ticket, 3)
+
+        response, _ = self.get()
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["tickets"][0]["quantity_remaining"], 7)
+        response, _ = self.get("/api/browse/events/")
+        self.assertEqual(response["X-Cache"], "MISS")
+
+        with override_settings(BROWSE_CACHE={"ALIAS": "browse", "STALENESS": 60}):
+            with self.captureOnCommitCallbacks(execute=True):
+                purchase_tickets(self.buyer, self.ticket, 1)
+            response, _ = self.get()
+        self.assertEqual(response["X-Cache"], "HIT")
+
+    def test_sales_while_an_entry_is_built_make_it_stale(self):
+        set_entry = browse_cache.set
+
+        def sold_then_set(*args, **kwargs):
+            # The sale commits after the view read the stock, before it is cached
+            browse_cache.mark_sold([self.event.pk])
+            set_entry(*args, **kwargs)
+
+        with mock.patch.object(browse_cache, "set", sold_then_set):
+            self.get()
+        response, _ = self.get()
+
+        self.assertEqual(response["X-Cache"], "MISS")
+
+    def test_counters(self):
+        before = browse_cache.stats()
+        self.get()
+        self.get()
+        after = browse_cache.stats()
+
+        self.assertEqual(after["hits"] - before["hits"], 1)
+        self.assertEqual(after["misses"] - before["misses"], 1)
+
+
+class ConcurrentPurchaseTests(TransactionTestCase):
+    buyers = 20
+    attempts_per_buyer = 5
+
+    def test_concurrent_buyers_never_oversell(self):
+        organizer = User.objects.create_user(
+            username="org", email="org@example.com", role="organizer"
+        )
+        ticket = Ticket.objects.create(
+            event=make_event(organizer),
+            ticket_type="General Admission",
+            price=Decimal("10.00"),
+            quantity_available=50,
+        )
+        users = [
+            User.objects.create_user(username=f"buyer{i}", email=f"buyer{i}@example.com")
+            for i in range(self.buyers)
+        ]
+        barrier = threading.Barrier(self.buyers)
+
+        def buy(user):
+            barrier.wait()
+            try:
+                for _ in range(self.attempts_per_buyer):
+                    try:
+                        purchase_tickets(user, ticket, 1)
+                    except InsufficientInventory:
+                        pass
+                    except OperationalError:
+                        # SQLite reports write contention instead of waiting
+                        pass
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        ticket.refresh_from_db()
+        sold = sum(Purchase.objects.values_list("quantity", flat=True))
+        self.assertLessEqual(ticket.quantity_sold, ticket.quantity_available)
+        self.assertEqual(ticket.quantity_sold, sold)
+
+
+@override_settings(READ_REPLICAS={"ALIASES": ["replica"]})
+class ReplicaRoutingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.buyer = User.objects.create_user(username="buyer", email="buyer@example.com")
+
+    def setUp(self):
+        caches["default"].clear()  # Pins
+        self.router = ReplicaRouter()
+
+    def route(self, state):
+        token = current_route.set(state)
+        self.addCleanup(current_route.reset, token)
+
+    def test_reads_outside_a_request_use_the_primary(self):
+        self.assertEqual(self.router.db_for_read(Event), PRIMARY)
+
+    def test_reads_after_a_write_use_the_primary(self):
+        state = RouteState()
+        state.read_db = "replica"
+        self.route(state)
+        self.assertEqual(self.router.db_for_read(Event), "replica")
+
+        self.assertEqual(self.router.db_for_write(Purchase), PRIMARY)
+
+        self.assertTrue(state.wrote)
+        self.assertEqual(self.router.db_for_read(Event), PRIMARY)
+
+    def test_choose_skips_pinned_users_and_lagging_replicas(self):
+        with mock.patch.object(replicas, "healthy", return_value=["replica"]):
+            self.assertEqual(replicas.choose(self.buyer), "replica")
+            replicas.pin(self.buyer)
+            self.assertEqual(replicas.choose(self.buyer), PRIMARY)
+
+        caches["default"].clear()
+        with mock.patch.object(replicas, "healthy", return_value=[]):
+            self.assertEqual(replicas.choose(self.buyer), PRIMARY)
+
+    def test_writes_in_a_request_pin_the_user(self):
+        ticket = Ticket.objects.create(
+            event=make_event(User.objects.create_user(username="org", role="organizer")),
+            ticket_type="General Admission",
+            price=Decimal("10.00"),
+            quantity_available=5,
+        )
+        client = APIClient()
+        client.force_authenticate(self.buyer)
+
+        with override_settings(RATE_LIMITS=NO_RATE_LIMITS):
+            response = client.post(
+                reverse("ticket_purchase"), {"ticket_id": ticket.pk, "quantity": 1}
+            )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(replicas.pinned(self.buyer))
+
+    def test_middleware_is_not_used_without_replicas(self):
+        with override_settings(READ_REPLICAS={"ALIASES": []}):
+            with self.assertRaises(MiddlewareNotUsed):
+                ReplicaMiddleware(lambda request: HttpResponse())
+
+
+# Needs a second, separate test database named "replica"; with a mirror every
+# read would see the primary's rows
+SEPARATE_REPLICA = "replica" in settings.DATABASES and not settings.DATABASES["replica"].get(
+    "TEST", {}
+).get("MIRROR")
+
+
+@skipUnless(SEPARATE_REPLICA, "no separate replica database")
+@override_settings(
+    READ_REPLICAS={"ALIASES": ["replica"], "MAX_LAG": 5},
+    BROWSE_CACHE=NO_BROWSE_CACHE,
+    RATE_LIMITS=NO_RATE_LIMITS,
+)
+class ReplicaReadTests(TransactionTestCase):
+    databases = {"default", "replica"} if SEPARATE_REPLICA else {"default"}
+
+    def setUp(self):
+        replicas.reset()
+        caches["default"].clear()
+        organizer = User.objects.create_user(username="org", role="organizer")
+        self.buyer = User.objects.create_user(username="buyer", email="buyer@example.com")
+        self.event = make_event(organizer)
+        self.ticket = Ticket.objects.create(
+            event=self.event,
+            ticket_type="General Admission",
+            price=Decimal("10.00"),
+            quantity_available=5,
+        )
+        # "Replicate" the rows, with a name that tells the databases apart
+        for obj in (organizer, self.buyer, self.event, self.ticket):
+            obj.save(using="replica")
+        Event.objects.using("replica").filter(pk=self.event.pk).update(event_name="Replica")
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def heartbeat(self, lag):
+        now = timezone.now()
+        ReplicationHeartbeat.objects.create(pk=1, beat=now)
+        ReplicationHeartbeat.objects.using("replica").create(
+            pk=1, beat=now - datetime.timedelta(seconds=lag)
+        )
+
+    def event_name(self):
+        response = self.client.get(f"/api/browse/events/{self.event.pk}/")
+        self.assertEqual(response.status_code, 200)
+        return response.json()["event_name"]
+
+    def test_reads_use_a_caught_up_replica(self):
+        self.heartbeat(lag=1)
+        self.assertEqual(self.event_name(), "Replica")
+
+    def test_lagging_replica_falls_back_to_the_primary(self):
+        self.heartbeat(lag=60)
+        with self.assertLogs("core.replicas", "WARNING"):
+            self.assertEqual(self.event_name(), "Concert")
+
+    @override_settings(BROWSE_CACHE={"ALIAS": "browse"})
+    def test_browse_cache_is_filled_from_the_primary(self):
+        caches["browse"].clear()
+        self.heartbeat(lag=0)
+
+        self.assertEqual(self.event_name(), "Concert")
+
+    def test_history_after_a_purchase_reads_the_primary(self):
+        self.heartbeat(lag=0)
+        self.assertEqual(self.client.get("/api/purchases/history/").json()["results"], [])
+
+        response = self.client.post(
+            reverse("ticket_purchase"), {"ticket_id": self.ticket.pk, "quantity": 1}
+        )
+        self.assertEqual(response.status_code, 201)
+
+        history = self.client.get("/api/purchases/history/").json()["results"]
+        self.assertEqual(len(history), 1)
+        self.assertFalse(Purchase.objects.using("replica").exists())
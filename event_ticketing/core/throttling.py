@@ -0,0 +1,180 @@
+"""
+Token-bucket rate limiting for expensive endpoints.
+
+Each policy in RATE_LIMITS["POLICIES"] gives a refill RATE in DRF's
+"<count>/<period>" notation, a BURST (the bucket size) and what a bucket
+belongs to: "ip", or "user", which is the user id of a valid access token and
+the client IP without one. Limits are checked in initial(), before the
+request is authenticated, so throttled requests cost neither a user lookup
+nor a password hash. Throttled requests get a 429 with Retry-After.
+
+A bucket is kept as a single timestamp (GCRA): the time at which it would be
+full again. LocalBucketStore keeps them in process, sharded by key so
+requests for different clients do not contend for one lock, and drops full
+buckets as it goes; CacheBucketStore shares them between workers through a
+Django cache (use Redis in production), updating each bucket under a lock
+taken with the cache's atomic add().
+
+Client IPs come from DRF's get_ident(), which trusts X-Forwarded-For only as
+far as REST_FRAMEWORK["NUM_PROXIES"] says; with it unset, any client could
+pick a new IP, and bucket, per request.
+"""
+import math
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .stores import StoreBacked
+
+DEFAULTS = {
+    "ENABLED": True,
+    "STORE": "core.throttling.CacheBucketStore",
+    "CACHE_ALIAS": "default",
+    "SHARDS": 16,  # LocalBucketStore locks
+    "MAX_KEYS": 100_000,  # Buckets a LocalBucketStore keeps per process
+    "POLICIES": {},
+}
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """
+    Seconds between two tokens for a rate like "10/min".
+    """
+    count, period = rate.split("/")
+    return PERIODS[period[0]] / int(count)
+
+
+class LocalBucketStore:  # pylint: disable=too-few-public-methods
+    """
+    In-process store. Buckets are not shared between workers.
+    """
+
+    def __init__(self, config):
+        self._shards = [(threading.Lock(), OrderedDict()) for _ in range(config["SHARDS"])]
+        self.max_keys = max(1, config["MAX_KEYS"] // config["SHARDS"])
+
+    def take(self, key, interval, burst, now):
+        lock, buckets = self._shards[zlib.crc32(key.encode()) % len(self._shards)]
+        with lock:
+            full_at = max(buckets.get(key, now), now) + interval
+            wait = full_at - now - burst * interval
+            if wait > 0:
+                return wait
+            buckets[key] = full_at
+            buckets.move_to_end(key)
+            # Least recently used first; a full bucket is the same as none
+            while buckets:
+                oldest, oldest_full_at = next(iter(buckets.items()))
+                if oldest_full_at > now and len(buckets) <= self.max_keys:
+                    break
+                del buckets[oldest]
+            return 0
+
+
+class CacheBucketStore:  # pylint: disable=too-few-public-methods
+    """
+    Store backed by a Django cache, shared by every worker using it.
+
+    Concurrent requests for one bucket take turns: each holds a lock key,
+    claimed with add(), while it reads and writes the bucket. A request that
+    cannot get the lock within LOCK_ATTEMPTS tries is throttled.
+    """
+
+    LOCK_TIMEOUT = 1  # Seconds; the lock of a worker that died expires
+    LOCK_ATTEMPTS = 50
+    LOCK_WAIT = 0.002  # Seconds between two tries
+
+    def __init__(self, config):
+        self.cache = caches[config["CACHE_ALIAS"]]
+
+    def take(self, key, interval, burst, now):
+        lock = f"{key}:lock"
+        for _ in range(self.LOCK_ATTEMPTS):
+            if self.cache.add(lock, True, self.LOCK_TIMEOUT):
+                break
+            time.sleep(self.LOCK_WAIT)
+        else:
+            return interval
+        try:
+            full_at = max(self.cache.get(key, now), now) + interval
+            wait = full_at - now - burst * interval
+            if wait > 0:
+                return wait
+            self.cache.set(key, full_at, math.ceil(full_at - now))
+            return 0
+        finally:
+            self.cache.delete(lock)
+
+
+class RateLimiter(StoreBacked):
+    setting = "RATE_LIMITS"
+    defaults = DEFAULTS
+    jwt = JWTAuthentication()
+    ip = BaseThrottle()
+
+    def client(self, request, scope):
+        # Client identity without a database query
+        if scope == "user":
+            header = self.jwt.get_header(request)
+            raw_token = self.jwt.get_raw_token(header) if header else None
+            if raw_token is not None:
+                try:
+                    token = self.jwt.get_validated_token(raw_token)
+                    return f"user:{token[jwt_settings.USER_ID_CLAIM]}"
+                except (InvalidToken, TokenError, KeyError):
+                    pass  # Authentication rejects it later
+        # X-Forwarded-For is only trusted as far as DRF's NUM_PROXIES says
+        return f"ip:{self.ip.get_ident(request)}"
+
+    def check(self, policy_name, request):
+        """
+        Take a token from the request's bucket for the policy, or raise
+        Throttled. Policies missing from the settings do not limit anything.
+        """
+        config = self.config
+        policy = config["POLICIES"].get(policy_name)
+        if not config["ENABLED"] or policy is None:
+            return
+        key = f"rate-limit:{policy_name}:{self.client(request, policy.get('KEY', 'ip'))}"
+        wait = self.store.take(
+            key, parse_rate(policy["RATE"]), policy.get("BURST", 1), self.clock()
+        )
+        if wait > 0:
+            raise Throttled(wait=math.ceil(wait))
+
+
+rate_limiter = RateLimiter()
+
+
+@receiver(setting_changed)
+def reset_rate_limiter(setting, **kwargs):
+    if setting == "RATE_LIMITS":
+        rate_limiter.reset()
+
+
+class RateLimitMixin:
+    """
+    Apply the RATE_LIMITS policy named by `rate_limit_policy` before the
+    request is authenticated.
+    """
+
+    rate_limit_policy = None
+
+    def get_rate_limit_policy(self):
+        return self.rate_limit_policy
+
+    def initial(self, request, *args, **kwargs):
+        rate_limiter.check(self.get_rate_limit_policy(), request)
+        super().initial(request, *args, **kwargs)
@@ -1,17 +1,30 @@
 # In accounts/urls.py (or events/urls.py)
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from .async_views import (
+    AsyncEventDetailView,
+    AsyncEventListView,
+    AsyncTicketPurchaseView,
+    EventAvailabilityStreamView,
+)
 from .views import (
+    AnalyticsBreakdownView,
     AnalyticsView,
+    BrowseCacheStatsView,
+    CheckoutView,
     EventUserViewSet,
     EventViewSet,
+    HoldViewSet,
     PurchaseHistoryView,
+    QueueJoinView,
+    QueueStatusView,
     TicketPurchaseView,
     TicketViewSet,
 )  # Import other views as needed
 
 router = DefaultRouter()
 router.register(r"events", EventViewSet)
+router.register(r"tickets/holds", HoldViewSet, basename="hold")
 
 # Router for user event Browse (read-only)
 user_event_router = DefaultRouter()
@@ -39,8 +52,38 @@ urlpatterns = [
     ),
     # User URLs
     path("", include(user_event_router.urls)),  # User event Browse
+    path(
+        "browse/cache/stats/",
+        BrowseCacheStatsView.as_view(),
+        name="browse_cache_stats",
+    ),
+    path("queue/join/", QueueJoinView.as_view(), name="queue_join"),
+    path("queue/status/", QueueStatusView.as_view(), name="queue_status"),
     path("tickets/purchase/", TicketPurchaseView.as_view(), name="ticket_purchase"),
+    path("tickets/checkout/", CheckoutView.as_view(), name="ticket_checkout"),
     path("purchases/history/", PurchaseHistoryView.as_view(), name="purchase_history"),
+    # Async (ASGI) versions of the browse and purchase endpoints
+    path("async/browse/events/", AsyncEventListView.as_view(), name="async_event_list"),
+    path(
+        "async/browse/events/<int:pk>/",
+        AsyncEventDetailView.as_view(),
+        name="async_event_detail",
+    ),
+    path(
+        "browse/events/<int:pk>/live/",
+        EventAvailabilityStreamView.as_view(),
+        name="event_availability_stream",
+    ),
+    path(
+        "async/tickets/purchase/",
+        AsyncTicketPurchaseView.as_view(),
+        name="async_ticket_purchase",
+    ),
     # Analytics URL
     path("analytics/", AnalyticsView.as_view(), name="analytics"),
+    path(
+        "analytics/breakdown/",
+        AnalyticsBreakdownView.as_view(),
+        name="analytics_breakdown",
+    ),
 ]
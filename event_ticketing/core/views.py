@@ -1,31 +1,77 @@
 # In accounts/views.py (or events/views.py)
-from rest_framework import viewsets, generics, filters, status
+import codecs
+
+from rest_framework import mixins, serializers, viewsets, generics, status
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from drf_spectacular.utils import extend_schema
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+from drf_spectacular.utils import OpenApiParameter, extend_schema
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Event, Purchase, Ticket
-from django.db.models import Sum
+from django.conf import settings
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from .admission import TOKEN_HEADER, WaitingRoomMixin, waiting_room
+from .analytics import (
+    filter_rollups,
+    sales_by_event,
+    sales_by_ticket_type,
+    sales_series,
+    sales_totals,
+)
+from .cache import BrowseCacheMixin, browse_cache
+from .conditional import ConditionalRetrieveMixin
+from .imports import detect_format, import_events
+from .models import Event, Hold, Purchase, SalesRollup, Ticket
+from .projections import EventProjection, ProjectionMixin, PurchaseProjection
+from .pagination import (
+    EventKeysetPagination,
+    PurchaseKeysetPagination,
+    get_pagination_class,
+)
 from .serializers import (
     EventSerializer,
     EventCreateUpdateSerializer,
+    EventImportReportSerializer,
+    EventImportUploadSerializer,
+    HoldSerializer,
+    QueueJoinSerializer,
+    QueueStatusSerializer,
     PurchaseSerializer,
     TicketPurchaseSerializer,
     TicketSerializer,
     TicketCreateUpdateSerializer,
     AnalyticsSerializer,
+    CheckoutSerializer,
+    AnalyticsBreakdownSerializer,
+    AnalyticsBreakdownFilterSerializer,
+    AnalyticsFilterSerializer,
+)
+from .filters import EventFilter
+from .idempotency import IDEMPOTENCY_HEADER, IdempotencyMixin
+from .instrumentation import (
+    TimedCreateModelMixin,
+    TimedListModelMixin,
+    TimedModelViewSet,
+    TimedRetrieveModelMixin,
+    serializing,
 )
-from .permissions import (
-    IsOrganizer,
-    IsOrganizerOrReadOnly,
-)  # Import the custom permission
+from .search import EventSearchFilter, search_terms
+from .replicas import ReplicaReadMixin
+from .services import HoldExpired, confirm_hold, rebalance_buckets, release_hold
+from .throttling import RateLimitMixin
+from .permissions import IsOrganizer  # Import the custom permission
+
+# DRF viewsets are built from many small mixins
+# pylint: disable=too-many-ancestors
 
 
 @extend_schema(tags=["Event Management (Organizer)"])
-class EventViewSet(viewsets.ModelViewSet):
+class EventViewSet(ConditionalRetrieveMixin, TimedModelViewSet):
 
-    queryset = Event.objects.all()
+    queryset = Event.objects.with_tickets()
     permission_classes = [
         IsOrganizer,
     ]  # Only organizers can manage events
@@ -33,6 +79,8 @@ class EventViewSet(viewsets.ModelViewSet):
     def get_serializer_class(self):
         if self.action in ["create", "update", "partial_update"]:
             return EventCreateUpdateSerializer
+        if self.action == "bulk_import":
+            return EventImportUploadSerializer
         return EventSerializer
 
     def get_queryset(self):
@@ -43,10 +91,38 @@ class EventViewSet(viewsets.ModelViewSet):
         # Set the organizer of the event to the logged-in user
         serializer.save(organizer=self.request.user)
 
+    @extend_schema(
+        request=EventImportUploadSerializer, responses=EventImportReportSerializer
+    )
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        parser_classes=[MultiPartParser],
+    )
+    def bulk_import(self, request):
+        # Create events with their ticket tiers from a CSV or JSON-lines file.
+        # Invalid rows are reported and skipped, valid ones are still created
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.validated_data["file"]
+        file_format = serializer.validated_data.get("format") or detect_format(upload.name)
+
+        report = import_events(
+            codecs.iterdecode(upload, "utf-8-sig"),  # Streams the spooled upload
+            organizer=request.user,
+            file_format=file_format,
+            batch_size=serializer.validated_data.get("batch_size", 500),
+        )
+        response_status = status.HTTP_201_CREATED if report.events else status.HTTP_200_OK
+        with serializing():
+            data = EventImportReportSerializer(report.as_dict()).data
+        return Response(data, status=response_status)
+
 
 @extend_schema(tags=["Ticket Management (Organizer)"])
-class TicketViewSet(viewsets.ModelViewSet):
-    queryset = Ticket.objects.all()
+class TicketViewSet(TimedModelViewSet):
+    queryset = Ticket.objects.with_remaining()
     permission_classes = [IsOrganizer]  # Only organizers can manage tickets
 
     def get_serializer_class(self):
@@ -74,7 +150,10 @@ class TicketViewSet(viewsets.ModelViewSet):
         get_object_or_404(
             Event, pk=event_id, organizer=self.request.user
         )  # Verify organizer
-        serializer.save()
+        ticket = serializer.save()
+        if ticket.bucket_count:
+            # Re-split the new stock level across the tier's inventory buckets
+            rebalance_buckets(ticket)
 
     def perform_destroy(self, instance):
         event_id = self.kwargs.get("event_pk")
@@ -85,64 +164,266 @@ class TicketViewSet(viewsets.ModelViewSet):
 
 
 @extend_schema(tags=["Event Browsing & Ticket Purchase (User)"])
-class EventUserViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Event.objects.all()
-    serializer_class = EventSerializer
+class EventUserViewSet(
+    ReplicaReadMixin,
+    BrowseCacheMixin,
+    ConditionalRetrieveMixin,
+    ProjectionMixin,
+    viewsets.ReadOnlyModelViewSet,
+):
+    # Soonest first; EventFilter leaves out past events unless asked for them
+    queryset = Event.objects.with_tickets().order_by("date", "time", "id")
+    serializer_class = EventSerializer  # Schema; responses are built by the projection
+    projection = EventProjection()
     permission_classes = [IsAuthenticated]  # Require authentication for Browse
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
-    filterset_fields = ["date", "location"]  # Filter by date and location
-    search_fields = ["event_name"]  # Search by event name
+    filter_backends = [DjangoFilterBackend, EventSearchFilter]  # ?search= is ranked full-text
+    filterset_class = EventFilter  # Filter by date range, upcoming and location
+
+    @property
+    def keyset_ordering(self):
+        # Search results are paged in rank order instead of by date
+        if search_terms(self.request.query_params.get(api_settings.SEARCH_PARAM, "")):
+            return ("-search_rank", "id")
+        return None
+
+    @property
+    def pagination_class(self):
+        return get_pagination_class(settings.EVENT_PAGINATION, EventKeysetPagination)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action == "list":
+            queryset = EventFilter.upcoming_by_default(queryset, self.request.query_params)
+        return queryset
 
 
 @extend_schema(tags=["Event Browsing & Ticket Purchase (User)"])
-class TicketPurchaseView(generics.CreateAPIView):
+class BrowseCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]  # Only staff can see cache statistics
+
+    def get(self, request, *args, **kwargs):
+        # Hit and miss counters of this worker process
+        return Response(browse_cache.stats(), status=status.HTTP_200_OK)
+
+
+@extend_schema(tags=["Event Browsing & Ticket Purchase (User)"])
+class QueueJoinView(TimedCreateModelMixin, generics.CreateAPIView):
+    serializer_class = QueueJoinSerializer
+    permission_classes = [IsAuthenticated]  # Queue tokens are bound to the buyer
+
+
+@extend_schema(
+    tags=["Event Browsing & Ticket Purchase (User)"],
+    parameters=[
+        OpenApiParameter(TOKEN_HEADER, str, OpenApiParameter.HEADER, required=True)
+    ],
+    responses=QueueStatusSerializer,
+)
+class QueueStatusView(APIView):
+    # Polled by every queued buyer: answered from the token alone, without
+    # authentication or database queries
+    authentication_classes = []
+    permission_classes = []
+
+    def get(self, request, *args, **kwargs):
+        data = waiting_room.status(request.headers.get(TOKEN_HEADER))
+        with serializing():
+            data = QueueStatusSerializer(data).data
+        return Response(data, status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    tags=["Event Browsing & Ticket Purchase (User)"],
+    parameters=[
+        OpenApiParameter(TOKEN_HEADER, str, OpenApiParameter.HEADER),
+        OpenApiParameter(IDEMPOTENCY_HEADER, str, OpenApiParameter.HEADER),
+    ],
+)
+class TicketPurchaseView(
+    RateLimitMixin,
+    WaitingRoomMixin,
+    IdempotencyMixin,
+    TimedCreateModelMixin,
+    generics.CreateAPIView,
+):
     serializer_class = TicketPurchaseSerializer
+    rate_limit_policy = "purchase"
+    permission_classes = [IsAuthenticated]  # Only authenticated users can purchase
+
+    def perform_create(self, serializer):
+        with self.admitted(serializer.validated_data["ticket_id"].event_id):
+            # The save method in the serializer handles the purchase logic
+            serializer.save()
+
+
+@extend_schema(
+    tags=["Event Browsing & Ticket Purchase (User)"],
+    parameters=[
+        OpenApiParameter(TOKEN_HEADER, str, OpenApiParameter.HEADER),
+        OpenApiParameter(IDEMPOTENCY_HEADER, str, OpenApiParameter.HEADER),
+    ],
+)
+class CheckoutView(
+    RateLimitMixin,
+    WaitingRoomMixin,
+    IdempotencyMixin,
+    TimedCreateModelMixin,
+    generics.CreateAPIView,
+):
+    serializer_class = CheckoutSerializer
+    rate_limit_policy = "purchase"  # Shares the purchase endpoint's buckets
     permission_classes = [IsAuthenticated]  # Only authenticated users can purchase
 
     def perform_create(self, serializer):
-        # The save method in the serializer handles the purchase logic
-        serializer.save()
+        # A queue token admits to one event, so a cart must not span others
+        items = serializer.validated_data["items"]
+        with self.admitted(*{item["ticket"].event_id for item in items}):
+            serializer.save()
 
 
 @extend_schema(tags=["Event Browsing & Ticket Purchase (User)"])
-class PurchaseHistoryView(generics.ListAPIView):
-    serializer_class = PurchaseSerializer
+class HoldViewSet(
+    RateLimitMixin,
+    WaitingRoomMixin,
+    TimedCreateModelMixin,
+    TimedListModelMixin,
+    TimedRetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    serializer_class = HoldSerializer
+    permission_classes = [IsAuthenticated]  # Only authenticated users can hold seats
+
+    # Taking a hold is what takes the seats, so only creating one needs an
+    # admission and counts against the purchase limit
+    def requires_admission(self):
+        return self.action == "create"
+
+    def get_rate_limit_policy(self):
+        return "purchase" if self.action == "create" else None
+
+    @extend_schema(
+        parameters=[OpenApiParameter(TOKEN_HEADER, str, OpenApiParameter.HEADER)]
+    )
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        with self.admitted(serializer.validated_data["ticket"].event_id):
+            serializer.save()
+
+    def get_queryset(self):
+        # A user's own holds that have not expired yet
+        return (
+            Hold.objects.filter(user=self.request.user, expires_at__gt=timezone.now())
+            .select_related("ticket__event")
+            .order_by("expires_at", "id")
+        )
+
+    def perform_destroy(self, instance):
+        # Cancelling a hold puts its seats back on sale straight away
+        release_hold(instance)
+
+    @extend_schema(request=None, responses={201: PurchaseSerializer})
+    @action(detail=True, methods=["post"])
+    def confirm(self, request, *args, **kwargs):
+        try:
+            purchase = confirm_hold(self.get_object())
+        except HoldExpired as exc:
+            raise serializers.ValidationError(
+                {api_settings.NON_FIELD_ERRORS_KEY: ["This hold has expired."]}
+            ) from exc
+        with serializing():
+            data = PurchaseSerializer(purchase).data
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
+@extend_schema(tags=["Event Browsing & Ticket Purchase (User)"])
+class PurchaseHistoryView(ReplicaReadMixin, ProjectionMixin, generics.ListAPIView):
+    serializer_class = PurchaseSerializer  # Schema; responses are built by the projection
+    projection = PurchaseProjection()
     permission_classes = [IsAuthenticated]  # Only authenticated users can view history
 
+    @property
+    def pagination_class(self):
+        return get_pagination_class(
+            settings.PURCHASE_HISTORY_PAGINATION, PurchaseKeysetPagination
+        )
+
     def get_queryset(self):
         # Get purchase history for the currently authenticated user
-        return Purchase.objects.filter(user=self.request.user).order_by(
-            "-purchase_time"
+        return (
+            Purchase.objects.filter(user=self.request.user)
+            .select_related("ticket")
+            .prefetch_related("ticket__buckets")
+            .order_by("-purchase_time", "id")
         )
 
 
 @extend_schema(tags=["Analytics"])
-class AnalyticsView(generics.GenericAPIView):
+class AnalyticsView(ReplicaReadMixin, generics.GenericAPIView):
     permission_classes = [IsOrganizer]  # Restrict access
     serializer_class = AnalyticsSerializer
+    filter_serializer_class = AnalyticsFilterSerializer
 
-    def get(self, request, format=None):
-        # Calculate Total Tickets Sold
-        # Sum the 'quantity' field from the Purchase model
-        total_tickets_sold = (
-            Purchase.objects.aggregate(Sum("quantity"))["quantity__sum"] or 0
-        )
+    def get_filters(self):
+        filters = self.filter_serializer_class(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
+        return filters.validated_data
 
-        # Calculate Total Sales
-        # Sum the 'total_price' field from the Purchase model
-        total_sales = (
-            Purchase.objects.aggregate(Sum("total_price"))["total_price__sum"] or 0
+    def get_rollups(self, filters):
+        # Organizers only see sales of their own events. Totals come from the
+        # sales rollup, which every purchase keeps up to date, so the cost does
+        # not grow with the number of purchases
+        return filter_rollups(
+            SalesRollup.objects.filter(organizer=self.request.user),
+            date_from=filters.get("date_from"),
+            date_to=filters.get("date_to"),
+            event=filters.get("event"),
         )
 
+    def get_analytics_data(self, filters):
+        totals = sales_totals(self.get_rollups(filters))
+
         # Calculate Number of Events
-        number_of_events = Event.objects.count()
+        events = Event.objects.filter(organizer=self.request.user)
+        if "event" in filters:
+            events = events.filter(pk=filters["event"])
+        number_of_events = events.count()
 
-        # Prepare data using the serializer
-        analytics_data = {
-            "total_tickets_sold": total_tickets_sold,
-            "total_sales": total_sales,
+        return {
+            "total_tickets_sold": totals["total_tickets_sold"],
+            "total_sales": totals["total_sales"],
             "number_of_events": number_of_events,
         }
-        serializer = AnalyticsSerializer(analytics_data)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+    @extend_schema(parameters=[AnalyticsFilterSerializer])
+    def get(self, request, *args, **kwargs):
+        # Prepare data using the serializer
+        serializer = self.get_serializer(self.get_analytics_data(self.get_filters()))
+        with serializing():
+            data = serializer.data
+        return Response(data, status=status.HTTP_200_OK)
+
+
+@extend_schema(tags=["Analytics"])
+class AnalyticsBreakdownView(AnalyticsView):
+    serializer_class = AnalyticsBreakdownSerializer
+    filter_serializer_class = AnalyticsBreakdownFilterSerializer
+
+    def get_analytics_data(self, filters):
+        rollups = self.get_rollups(filters)
+        data = super().get_analytics_data(filters)
+        data.update(
+            {
+                "interval": filters["interval"],
+                "by_event": sales_by_event(rollups),
+                "by_ticket_type": sales_by_ticket_type(rollups),
+                "series": sales_series(rollups, filters["interval"]),
+            }
+        )
+        return data
+
+    @extend_schema(parameters=[AnalyticsBreakdownFilterSerializer])
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
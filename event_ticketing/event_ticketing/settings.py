@@ -10,12 +10,26 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+# The dicts configuring the core and authentication modules restate those
+# modules' DEFAULTS, so every option is documented here
+# pylint: disable=duplicate-code
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
+def env_int(name, default):
+    value = os.environ.get(name)
+    return default if value in (None, "") else int(value)
+
+
+def env_bool(name, default):
+    value = os.environ.get(name)
+    return default if value in (None, "") else value.lower() in ("1", "true", "yes", "on")
+
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
@@ -66,6 +80,9 @@ SPECTACULAR_SETTINGS = {
 }
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the stack
+    "core.instrumentation.InstrumentationMiddleware",
+    "core.replicas.ReplicaMiddleware",  # Removes itself without read replicas
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -77,11 +94,109 @@ MIDDLEWARE = [
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        # JWTAuthentication with a per-process cache of users
+        "authentication.jwt.CachedJWTAuthentication",
     ],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_RENDERER_CLASSES": [
+        "core.renderers.FastJSONRenderer",  # orjson when installed, same output
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    # Proxies in front of the app that append to X-Forwarded-For. Client IPs
+    # (rate limits) are read that many entries from its end, or from
+    # REMOTE_ADDR with 0; unset, DRF would trust the whole client-sent header
+    "NUM_PROXIES": env_int("NUM_PROXIES", 0),
+}
+
+# Users cached by CachedJWTAuthentication, per worker process. Changes made in
+# another worker are seen after TTL seconds at most
+JWT_USER_CACHE = {
+    "MAX_SIZE": 10_000,
+    "TTL": 60,
+}
+
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Browse responses. LocMemCache evicts least recently used entries past
+    # MAX_ENTRIES; in production point this at a shared Redis instance, e.g.
+    # "django.core.cache.backends.redis.RedisCache", with an allkeys-lru policy
+    "browse": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "browse",
+        "OPTIONS": {"MAX_ENTRIES": 1000},
+    },
 }
 
+BROWSE_CACHE = {
+    "ENABLED": True,
+    "ALIAS": "browse",
+    "TIMEOUT": 300,  # Seconds an entry lives at most
+    "STALENESS": 2,  # Seconds quantity_remaining may lag behind purchases
+}
+
+# Pagination of event browsing and purchase history: "keyset" (cursor over an
+# indexed sort key, constant cost per page), "page", "limit" or None to disable
+EVENT_PAGINATION = "keyset"
+PURCHASE_HISTORY_PAGINATION = "keyset"
+
+# Waiting room in front of the purchase endpoint (see core/admission.py). Turn
+# it on for big on-sales; events can override RATE with admission_rate.
+WAITING_ROOM = {
+    "ENABLED": False,
+    "STORE": "core.admission.CacheQueueStore",  # Or core.admission.LocalQueueStore
+    "CACHE_ALIAS": "default",
+    "RATE": 50,  # Buyers admitted per second and event
+    "ADMISSION_TTL": 300,  # Seconds an admitted buyer has to buy
+}
+
+# Per-view request metrics, served at /metrics (see core/instrumentation.py).
+# Set the "core.instrumentation" logger to DEBUG to log likely N+1 queries
+INSTRUMENTATION = {
+    "ENABLED": True,
+    "N_PLUS_ONE": 5,  # Runs of the same SQL in one request reported as N+1
+    "METRICS_IPS": ("127.0.0.1", "::1"),  # Clients allowed to scrape /metrics
+}
+
+# Token-bucket rate limits, checked before authentication (see
+# core/throttling.py). RATE is the refill rate, BURST the bucket size; KEY is
+# "ip", or "user" for the access token's user (the IP without a token)
+RATE_LIMITS = {
+    "ENABLED": True,
+    "STORE": "core.throttling.CacheBucketStore",  # Or core.throttling.LocalBucketStore
+    "CACHE_ALIAS": "default",
+    "POLICIES": {
+        "purchase": {"RATE": "1/s", "BURST": 10, "KEY": "user"},
+        "token": {"RATE": "10/min", "BURST": 5, "KEY": "ip"},
+        "password_reset": {"RATE": "5/hour", "BURST": 3, "KEY": "ip"},
+        # Opening live availability streams; EventSource reconnects on its own
+        "live": {"RATE": "30/min", "BURST": 10, "KEY": "ip"},
+    },
+}
+
+# Seconds the response to a request with an Idempotency-Key header is kept for
+# retries; purge_idempotency_keys deletes older ones
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+# Seconds after which a key whose request never finished (the worker died) can
+# be claimed by a retry. Keep it above the longest a request may run
+IDEMPOTENCY_KEY_LEASE = 60
+
+# Server-sent availability streams (/api/browse/events/<id>/live/). Only served
+# under ASGI, WSGI gets a 501; the local broker only reaches subscribers of the
+# same worker
+LIVE_UPDATES = {
+    "BROKER": "core.live.LocalBroker",
+    "INTERVAL": 1.0,  # Seconds between two updates of the same event
+    "KEEPALIVE": 15,  # Seconds between keep-alive comments on an idle stream
+}
+
+# Seconds a seat hold lasts before expire_holds gives its seats back
+HOLD_TTL = 600
+
 AUTH_USER_MODEL = "authentication.User"
 
 ROOT_URLCONF = "event_ticketing.urls"
@@ -107,17 +222,72 @@ WSGI_APPLICATION = "event_ticketing.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Connections are reused rather than opened per request: either kept by each
+# thread for DB_CONN_MAX_AGE seconds (checked before reuse with
+# DB_CONN_HEALTH_CHECKS), or with DB_POOL=true taken from a psycopg pool per
+# process. Under ASGI use the pool: requests run on changing threads, so
+# per-thread persistent connections pile up. DB_CONN_MAX_AGE therefore
+# defaults to 60 only when served through wsgi.py, which sets DJANGO_SERVER,
+# and to 0 otherwise. Keep DB_POOL_MAX_SIZE times the number of worker
+# processes below PostgreSQL's max_connections.
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
-        "NAME": "event_ticketing_db",
-        "USER": "postgres",
-        "PASSWORD": "postgres",
-        "HOST": "localhost",
-        "PORT": "5432",
+        "NAME": os.environ.get("DB_NAME", "event_ticketing_db"),
+        "USER": os.environ.get("DB_USER", "postgres"),
+        "PASSWORD": os.environ.get("DB_PASSWORD", "postgres"),
+        "HOST": os.environ.get("DB_HOST", "localhost"),
+        "PORT": os.environ.get("DB_PORT", "5432"),
+        "CONN_MAX_AGE": env_int(
+            "DB_CONN_MAX_AGE", 60 if os.environ.get("DJANGO_SERVER") == "wsgi" else 0
+        ),
+        "CONN_HEALTH_CHECKS": env_bool("DB_CONN_HEALTH_CHECKS", True),
     }
 }
 
+if env_bool("DB_POOL", False):
+    from psycopg_pool import ConnectionPool
+
+    DATABASES["default"]["CONN_MAX_AGE"] = 0  # Connections go back to the pool instead
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": env_int("DB_POOL_MIN_SIZE", 2),
+            "max_size": env_int("DB_POOL_MAX_SIZE", 10),
+            # Seconds a request waits for a free connection before failing
+            "timeout": env_int("DB_POOL_TIMEOUT", 10),
+            # Seconds before idle connections above min_size are closed
+            "max_idle": env_int("DB_POOL_MAX_IDLE", 300),
+            # Seconds before a connection is replaced, however busy
+            "max_lifetime": env_int("DB_POOL_MAX_LIFETIME", 3600),
+            # Health check of a connection before it is handed out
+            "check": ConnectionPool.check_connection,
+        }
+    }
+
+# Read replicas (see core/replicas.py): DB_REPLICA_HOSTS is a comma separated
+# list of hosts with the same database, credentials and connection settings
+# as the primary, streaming from it. Browsing, purchase history and analytics
+# read from them, except for users who just wrote and while they lag
+for number, host in enumerate(filter(None, os.environ.get("DB_REPLICA_HOSTS", "").split(","))):
+    DATABASES[f"replica_{number}"] = {
+        **DATABASES["default"],
+        "HOST": host.strip(),
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["core.replicas.ReplicaRouter"]
+
+READ_REPLICAS = {
+    "ALIASES": [alias for alias in DATABASES if alias.startswith("replica_")],
+    "STICKY_SECONDS": 10,  # Seconds a user who wrote keeps reading from the primary
+    "MAX_LAG": 5,  # Seconds a replica may be behind before reads skip it
+    "CHECK_INTERVAL": 2,  # Seconds between two lag checks per process
+    # Pins of users who just wrote. Must be shared by all workers: point it at
+    # Redis in production, a LocMemCache only works with a single process
+    "CACHE_ALIAS": "default",
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -163,3 +333,14 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # For development, I will the console backend to print emails to the console instead of actually sending them
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 FRONTEND_URL = "http://localhost:3000"  # Replace with actual frontend URL
+
+# Outbound email queue, delivered by the send_queued_email worker
+EMAIL_QUEUE = {
+    "BATCH_SIZE": 100,  # Emails claimed per pass
+    "RATE": 10,  # Emails sent per second and worker
+    "MAX_ATTEMPTS": 6,
+    "BACKOFF": 30,  # Seconds before the first retry, doubled for each later one
+    "MAX_BACKOFF": 3600,
+    "LEASE": 300,  # Seconds a claimed batch is reserved for its worker
+    "RETENTION": 7 * 24 * 3600,  # Seconds sent, skipped and failed emails are kept
+}
@@ -19,10 +19,13 @@ from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 from django.contrib import admin
 from django.urls import path, include
 
+from core.instrumentation import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/", include("authentication.urls")),
     path("api/", include("core.urls")),
+    path("metrics", metrics_view, name="metrics"),  # Prometheus scrape endpoint
     # Spectacular URLs
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
     
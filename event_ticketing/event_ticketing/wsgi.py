@@ -12,5 +12,7 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'event_ticketing.settings')
+# Picks the DB_CONN_MAX_AGE default, see DATABASES
+os.environ.setdefault('DJANGO_SERVER', 'wsgi')
 
 application = get_wsgi_application()